@@ -9,11 +9,13 @@ Expone la funcionalidad del asistente a través de endpoints REST.
 import json
 import time
 import sqlite3
+from collections import deque
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from helpers.llm_search import (
     procesar_consulta_completa,
     obtener_vista_previa_db,
+    filas_a_registros,
     llm_cache
 )
 from helpers.error_handler import ErrorHandler, DatosError
@@ -27,7 +29,7 @@ CORS(app)  # Permitir solicitudes de diferentes orígenes
 logger = Logger.get_logger()
 
 # Importar configuración centralizada
-from config import DB_PATH
+from config import DB_PATH, MAX_HISTORY_SIZE
 
 # Configuración
 DEBUG = True
@@ -61,8 +63,9 @@ except Exception as e:
     record_count = 0
 
 # Historial de conversación para mantener contexto
-historial_consultas = []
-historial_respuestas = []
+# (deque acotada: al superar MAX_HISTORY_SIZE se descarta el intercambio más antiguo)
+historial_consultas = deque(maxlen=MAX_HISTORY_SIZE)
+historial_respuestas = deque(maxlen=MAX_HISTORY_SIZE)
 
 # Variable para evitar procesamiento duplicado de solicitudes
 last_request_id = None
@@ -119,7 +122,7 @@ def cache_clear():
 @app.route('/api/query', methods=['POST'])
 def query():
     """Endpoint principal para procesar consultas"""
-    global last_request_id, historial_consultas, historial_respuestas
+    global last_request_id
 
     # Iniciar temporizador para medir tiempo de respuesta
     tiempo_inicio = time.time()
@@ -178,8 +181,8 @@ def query():
             contexto = {
                 "consulta_anterior": historial_consultas[-1],
                 "respuesta_anterior": historial_respuestas[-1],
-                "historial_consultas": historial_consultas,
-                "historial_respuestas": historial_respuestas
+                "historial_consultas": list(historial_consultas),
+                "historial_respuestas": list(historial_respuestas)
             }
             log_metrica("consulta_con_contexto", 1, {"historial_length": len(historial_consultas)})
 
@@ -190,17 +193,12 @@ def query():
         # Extraer la respuesta y otros datos del resultado
         respuesta = resultado_procesamiento["respuesta"]
         estrategia = resultado_procesamiento.get("estrategia", {})
-        resultado_sql = resultado_procesamiento.get("resultado_sql", {"total": 0, "registros": []})
+        resultado_sql = resultado_procesamiento.get("resultado_sql", {"total": 0, "columnas": [], "filas": []})
 
         # Actualizar historial
         historial_consultas.append(query_text)
         historial_respuestas.append(respuesta)
 
-        # Limitar el historial a los últimos 10 elementos
-        if len(historial_consultas) > 10:
-            historial_consultas = historial_consultas[-10:]
-            historial_respuestas = historial_respuestas[-10:]
-
         # Preparar resultado para la API
         result = {
             "query": query_text,
@@ -209,7 +207,7 @@ def query():
             "parameters": estrategia,
             "search_result": {
                 "total": resultado_sql.get("total", 0),
-                "records": resultado_sql.get("registros", [])[:5] if resultado_sql.get("total", 0) > 5 else resultado_sql.get("registros", [])
+                "records": filas_a_registros(resultado_sql, 5)
             }
         }
 
@@ -245,21 +243,19 @@ def query():
 @app.route('/api/reset', methods=['POST'])
 def reset_context():
     """Endpoint para reiniciar el contexto de la sesión"""
-    global historial_consultas, historial_respuestas
-
     # Registrar la acción
     logger.info("API: Reiniciando contexto de conversación")
     log_metrica("contexto_reiniciado", 1, {"historial_length": len(historial_consultas)})
 
     # Guardar historial anterior para el log
     historial_anterior = {
-        "consultas": historial_consultas.copy(),
-        "respuestas": historial_respuestas.copy()
+        "consultas": list(historial_consultas),
+        "respuestas": list(historial_respuestas)
     }
 
     # Reiniciar historial
-    historial_consultas = []
-    historial_respuestas = []
+    historial_consultas.clear()
+    historial_respuestas.clear()
 
     return jsonify({
         "status": "success",
@@ -281,8 +277,8 @@ def get_context():
         })
 
     return jsonify({
-        "historial_consultas": historial_consultas,
-        "historial_respuestas": historial_respuestas,
+        "historial_consultas": list(historial_consultas),
+        "historial_respuestas": list(historial_respuestas),
         "total_interacciones": len(historial_consultas)
     })
 
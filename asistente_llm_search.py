@@ -10,15 +10,15 @@ de razonamiento del LLM para realizar búsquedas más flexibles y precisas.
 import time
 import random
 import os
+from collections import deque
 from colorama import init, Fore, Style
-import google.generativeai as genai
 from config import (
-    GOOGLE_API_KEY,
     DB_PATH,
-    EXCEL_PATH
+    EXCEL_PATH,
+    MAX_HISTORY_SIZE
 )
 from helpers.agenda_real_mapper import cargar_agenda_real
-from helpers.sqlite_adapter import crear_base_datos
+from helpers.sqlite_adapter import crear_base_datos, asegurar_indices_busqueda
 from helpers.llm_search import procesar_consulta_completa
 from helpers.semantic_cache import semantic_cache
 from helpers.error_handler import ErrorHandler
@@ -30,12 +30,10 @@ init()
 # Obtener instancia del logger
 logger = Logger.get_logger()
 
-# Configurar clave de API
-genai.configure(api_key=GOOGLE_API_KEY)
-
 # Variables globales para mantener el contexto de la conversación
-historial_consultas = []
-historial_respuestas = []
+# (deque acotada: al superar MAX_HISTORY_SIZE se descarta el intercambio más antiguo)
+historial_consultas = deque(maxlen=MAX_HISTORY_SIZE)
+historial_respuestas = deque(maxlen=MAX_HISTORY_SIZE)
 
 # Función para simular la escritura humana (efecto de tipeo)
 def escribir_con_efecto(texto, velocidad_min=0.01, velocidad_max=0.03, end="\n"):
@@ -61,7 +59,7 @@ def mensaje_asistente(texto):
     time.sleep(0.2)
 
 # Función para procesar una consulta completa
-def procesar_consulta_avanzada(consulta, debug=False, contexto=None):
+def procesar_consulta_avanzada(consulta, debug=False, contexto=None, al_generar=None):
     """
     Procesa una consulta utilizando el enfoque avanzado con LLM.
 
@@ -69,6 +67,8 @@ def procesar_consulta_avanzada(consulta, debug=False, contexto=None):
         consulta (str): Consulta del usuario
         debug (bool): Activar modo de depuración
         contexto (dict, optional): Contexto de la conversación anterior
+        al_generar (callable, optional): Función que recibe los fragmentos de la
+            respuesta a medida que el LLM la genera
 
     Returns:
         dict: Resultado del procesamiento
@@ -88,7 +88,7 @@ def procesar_consulta_avanzada(consulta, debug=False, contexto=None):
                 print(f"\n{Fore.YELLOW}DEBUG: Usando contexto de conversación anterior{Style.RESET_ALL}")
 
         # Llamar a la función centralizada (sin pasar instancia de caché)
-        resultado = procesar_consulta_completa(consulta, contexto, DB_PATH, debug, 1)
+        resultado = procesar_consulta_completa(consulta, contexto, DB_PATH, debug, 1, al_generar)
 
         # Calcular tiempo de ejecución
         tiempo_ejecucion = time.time() - inicio
@@ -186,6 +186,11 @@ def modo_interactivo():
             logger.info(f"Base de datos encontrada en {DB_PATH}")
             print(f"{Fore.GREEN}✅ Base de datos SQLite ya existe en {DB_PATH}{Style.RESET_ALL}")
 
+            # Añadir índices de búsqueda a bases de datos creadas con versiones anteriores
+            resultado_indices = asegurar_indices_busqueda(DB_PATH)
+            if resultado_indices["error"]:
+                logger.warning(f"No se pudieron crear los índices de búsqueda: {resultado_indices['error']}")
+
         # Mostrar estadísticas del caché semántico
         cache_stats = semantic_cache.get_stats()
         logger.info(f"Estadísticas del caché semántico: {cache_stats}")
@@ -317,25 +322,31 @@ def modo_interactivo():
                     contexto = {
                         "consulta_anterior": historial_consultas[-1],
                         "respuesta_anterior": historial_respuestas[-1],
-                        "historial_consultas": historial_consultas,
-                        "historial_respuestas": historial_respuestas
+                        "historial_consultas": list(historial_consultas),
+                        "historial_respuestas": list(historial_respuestas)
                     }
                     if debug_mode:
                         print(f"\n{Fore.CYAN}🔄 Usando contexto de conversación anterior ({len(historial_consultas)} consultas previas){Style.RESET_ALL}")
 
+                # Mostrar la respuesta a medida que el LLM la genera
+                fragmentos_mostrados = []
+
+                def mostrar_fragmento(fragmento):
+                    if not fragmentos_mostrados:
+                        print(f"\n{Fore.BLUE}🤖 Asistente:{Style.RESET_ALL}")
+                    fragmentos_mostrados.append(fragmento)
+                    print(fragmento, end="", flush=True)
+
                 # Procesar la consulta con contexto
-                resultado = procesar_consulta_avanzada(consulta, debug_mode, contexto)
+                resultado = procesar_consulta_avanzada(consulta, debug_mode, contexto, mostrar_fragmento)
                 consultas_procesadas += 1
+                if fragmentos_mostrados:
+                    print()
 
                 # Actualizar historial para mantener contexto
                 historial_consultas.append(consulta)
                 historial_respuestas.append(resultado["respuesta"])
 
-                # Limitar el historial a los últimos 10 elementos para evitar que crezca demasiado
-                if len(historial_consultas) > 10:
-                    historial_consultas = historial_consultas[-10:]
-                    historial_respuestas = historial_respuestas[-10:]
-
                 # Calcular tiempo de ejecución
                 fin = time.time()
                 tiempo_ejecucion = fin - inicio
@@ -349,8 +360,10 @@ def modo_interactivo():
                 if stats['hits'] > 0:
                     print(f"{Fore.CYAN}💡 Caché semántico: {stats['hit_rate']} de aciertos{Style.RESET_ALL}")
 
-                # Mostrar respuesta
-                mensaje_asistente(resultado["respuesta"])
+                # Mostrar respuesta, salvo que ya se mostrara en streaming; si la
+                # generación falló a mitad, se muestra la respuesta de respaldo
+                if not fragmentos_mostrados or resultado.get("error"):
+                    mensaje_asistente(resultado["respuesta"])
 
             except KeyboardInterrupt:
                 logger.info("Usuario interrumpió la ejecución con Ctrl+C")
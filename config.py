@@ -21,6 +21,10 @@ DB_TABLE = "contactos"
 DB_INDICES = ["nombre_completo", "zona", "funcion"]
 DB_PREVIEW_LIMIT = 20
 DB_EXAMPLE_LIMIT = 3
+DB_PREVIEW_TTL = 300  # Segundos que se reutiliza la vista previa de la base de datos
+DB_CACHE_SIZE_KB = 65536  # Caché de páginas de cada conexión de lectura (KB)
+DB_MMAP_SIZE = 256 * 1024 * 1024  # Bytes de la base de datos leídos mediante mmap
+DB_STATEMENT_CACHE_SIZE = 256  # Sentencias preparadas que conserva cada conexión de lectura
 
 # Configuración de modelos LLM
 LLM_PRIMARY_MODEL = "gemini-2.0-flash"
@@ -30,6 +34,10 @@ LLM_TOP_P = 0.95
 LLM_TOP_K = 40
 LLM_MAX_TOKENS = 2048
 LLM_FALLBACK_MAX_TOKENS = 1024
+LLM_TRANSPORT = "grpc"  # Transporte del cliente de Gemini ("grpc" o "rest"); el cliente se configura una sola vez
+LLM_FALLBACK_RATE = 5  # Fallbacks por segundo permitidos al modelo alternativo (cubeta de tokens)
+LLM_FALLBACK_BURST = 10  # Ráfaga máxima de fallbacks
+LLM_MAX_CONCURRENT_REQUESTS = 4  # Llamadas simultáneas a Gemini desde llamar_llm_async (límite de RPM del plan gratuito)
 
 # Configuración de seguridad para LLM
 LLM_SAFETY_SETTINGS = [
@@ -51,9 +59,32 @@ LLM_SAFETY_SETTINGS = [
     }
 ]
 
+# Configuración de seguridad para las respuestas en lenguaje natural (más permisiva)
+LLM_RESPONSE_SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    }
+]
+
 # Límites y umbrales
 MAX_RESULTS_DISPLAY = 50
+SQL_MAX_FILAS = MAX_RESULTS_DISPLAY * 4  # Filas máximas leídas de una consulta generada por el LLM
+SQL_FETCH_BATCH = 1000  # Tamaño de lote para cursor.fetchmany
 MAX_HISTORY_SIZE = 10
+MAX_HISTORY_TURNS = 5  # Intercambios anteriores (consulta y respuesta) incluidos en los prompts
 MAX_REFINEMENTS = 2
 
 # Configuración del caché
@@ -61,6 +92,35 @@ SEMANTIC_CACHE_ENABLED = True  # Cambiar a False para desactivar el caché semá
 SEMANTIC_CACHE_MAX_SIZE = 1000
 SEMANTIC_CACHE_FILE = os.path.join(DATA_DIR, "semantic_cache.json")
 
+# Caché por similitud de embeddings (requiere sentence-transformers y faiss-cpu)
+EMBEDDING_CACHE_ENABLED = True  # Se desactiva solo si las dependencias no están instaladas
+EMBEDDING_CACHE_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+EMBEDDING_CACHE_INDEX_FILE = os.path.join(DATA_DIR, "embedding_cache.faiss")
+EMBEDDING_CACHE_THRESHOLD = 0.92  # Similitud coseno mínima
+EMBEDDING_CACHE_TTL = 86400  # Segundos (1 día)
+
+# Configuración del caché de resultados SQL
+SQL_CACHE_ENABLED = True  # Cambiar a False para volver a ejecutar siempre las consultas SQL
+SQL_CACHE_MAX_SIZE = 200
+SQL_CACHE_TTL = 3600  # Segundos; además se invalida si cambia la base de datos
+
+# Caché de respuestas en lenguaje natural (SQLite)
+RESPONSE_CACHE_ENABLED = os.environ.get("AGENDA_RESPONSE_CACHE", "1") != "0"  # AGENDA_RESPONSE_CACHE=0 lo desactiva para depurar
+RESPONSE_CACHE_FILE = os.path.join(DATA_DIR, "response_cache.db")
+RESPONSE_CACHE_MAX_SIZE = 5000
+RESPONSE_CACHE_TTL = 86400  # Segundos (1 día)
+
+# Caché de contexto de Gemini (CachedContent) para las instrucciones fijas de los prompts
+LLM_CONTEXT_CACHE_ENABLED = False  # Los bloques actuales no alcanzan el mínimo de tokens de Gemini
+LLM_CONTEXT_CACHE_TTL = 3600  # Segundos
+LLM_CONTEXT_CACHE_MIN_TOKENS = 4096  # Tamaño mínimo de un CachedContent para el modelo principal
+
+# Ruta rápida por patrones (consultas resueltas sin llamar al LLM)
+FAST_PATH_ENABLED = True  # Cambiar a False para enviar siempre las consultas al LLM
+
+# Evaluación y respuesta en una sola llamada al LLM cuando no cabe refinamiento
+LLM_COMBINED_EVAL_RESPONSE = True  # Cambiar a False para usar siempre dos llamadas
+
 # Mapeo de atributos (para normalización)
 ATTRIBUTE_MAPPING = {
     "telefono": ["telefono", "celular", "teléfono", "móvil", "movil", "numero", "número", "contacto"],
@@ -4,6 +4,8 @@ Módulo para mapear y adaptar la estructura de la agenda real al formato esperad
 
 import pandas as pd
 import os
+from helpers.nombres import nombre_natural
+from helpers.sqlite_adapter import normalizar_nombre_columna
 
 def cargar_agenda_real(ruta_excel):
     """
@@ -29,8 +31,8 @@ def cargar_agenda_real(ruta_excel):
                 "error": f"El archivo {ruta_excel} no existe"
             }
 
-        # Cargar el archivo Excel
-        df = pd.read_excel(ruta_excel)
+        # Cargar el archivo Excel (openpyxl lo lee en modo de solo lectura)
+        df = pd.read_excel(ruta_excel, engine="openpyxl")
 
         # Verificar que hay datos
         if df.empty:
@@ -74,9 +76,16 @@ def cargar_agenda_real(ruta_excel):
         # Obtener todos los encabezados del Excel
         todos_encabezados = df.columns.tolist()
 
-        # Crear registros adaptados
+        # Normalizar una sola vez el nombre de cada campo para la base de datos
+        # (sin espacios ni caracteres especiales, todo minúsculas)
+        campos_db = {encabezado: normalizar_nombre_columna(encabezado) for encabezado in todos_encabezados}
+
+        # Crear registros adaptados; las filas se recorren como tuplas, que es
+        # mucho más rápido que construir una Series por fila con iterrows()
         registros = []
-        for _, row in df.iterrows():
+        for valores in df.itertuples(index=False, name=None):
+            row = dict(zip(todos_encabezados, valores))
+
             # Construir nombre completo (formato: APELLIDO PATERNO APELLIDO MATERNO NOMBRE)
             nombre_completo = " ".join([
                 str(row["APELLIDO PATERNO"]) if pd.notna(row["APELLIDO PATERNO"]) else "",
@@ -96,22 +105,13 @@ def cargar_agenda_real(ruta_excel):
             registro = {
                 # Campos básicos para compatibilidad
                 "nombre_completo": nombre_completo,
-                "nombre_alternativo": nombre_alternativo
+                "nombre_alternativo": nombre_alternativo,
+                # Nombre ya formateado para mostrar ([Nombre(s)] [Apellido Paterno] [Apellido Materno])
+                "nombre_natural": nombre_natural({"nombre_alternativo": nombre_alternativo})
             }
 
             # Añadir todos los campos originales del Excel
-            for encabezado in todos_encabezados:
-                # Normalizar el nombre del campo para la base de datos (sin espacios ni caracteres especiales, todo minúsculas)
-                campo_db = encabezado.lower()
-                # Reemplazar caracteres especiales
-                for char in [" ", ".", "(", ")", "\n", "=", "-", "/", "\\", ":", ";", ",", "'", '"', "?", "¿", "!", "¡", "%", "&", "$", "#", "@", "+", "*"]:
-                    campo_db = campo_db.replace(char, "_")
-                # Eliminar guiones bajos múltiples
-                while "__" in campo_db:
-                    campo_db = campo_db.replace("__", "_")
-                # Eliminar guiones bajos al inicio y final
-                campo_db = campo_db.strip("_")
-
+            for encabezado, campo_db in campos_db.items():
                 # Añadir el valor al registro
                 if pd.notna(row[encabezado]):
                     registro[campo_db] = str(row[encabezado])
@@ -123,22 +123,12 @@ def cargar_agenda_real(ruta_excel):
         # Crear esquema dinámico basado en los encabezados del Excel
         esquema = {
             "nombre_completo": {"tipo_datos": "texto", "categoria": "nombre"},
-            "nombre_alternativo": {"tipo_datos": "texto", "categoria": "nombre"}
+            "nombre_alternativo": {"tipo_datos": "texto", "categoria": "nombre"},
+            "nombre_natural": {"tipo_datos": "texto", "categoria": "nombre"}
         }
 
         # Añadir todos los campos originales al esquema
-        for encabezado in todos_encabezados:
-            # Normalizar el nombre del campo para la base de datos (sin espacios ni caracteres especiales, todo minúsculas)
-            campo_db = encabezado.lower()
-            # Reemplazar caracteres especiales
-            for char in [" ", ".", "(", ")", "\n", "=", "-", "/", "\\", ":", ";", ",", "'", '"', "?", "¿", "!", "¡", "%", "&", "$", "#", "@", "+", "*"]:
-                campo_db = campo_db.replace(char, "_")
-            # Eliminar guiones bajos múltiples
-            while "__" in campo_db:
-                campo_db = campo_db.replace("__", "_")
-            # Eliminar guiones bajos al inicio y final
-            campo_db = campo_db.strip("_")
-
+        for encabezado, campo_db in campos_db.items():
             # Determinar el tipo de datos y categoría
             tipo_datos = "texto"
             categoria = "desconocido"
@@ -65,18 +65,35 @@ class BaseCache:
             print("DEBUG: No se especificó archivo de caché")
             return False
         
+        # Preparar datos para guardar
+        cache_data = self._prepare_data_for_save()
+        if not self._escribir_snapshot(cache_data):
+            return False
+        
+        self.last_save_time = time.time()
+        return True
+    
+    def _escribir_snapshot(self, cache_data: Dict[str, Any]) -> bool:
+        """
+        Escribe los datos del caché en disco de forma atómica: primero en un
+        archivo temporal y después reemplazando el archivo del caché, para que
+        una interrupción a mitad de la escritura no deje un archivo corrupto.
+        
+        Args:
+            cache_data (dict): Datos preparados con _prepare_data_for_save
+            
+        Returns:
+            bool: True si se guardó correctamente, False en caso contrario
+        """
         try:
             # Asegurarse de que el directorio existe
             os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
             
-            # Preparar datos para guardar
-            cache_data = self._prepare_data_for_save()
-            
-            # Guardar en archivo
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
+            # Guardar en archivo temporal y reemplazar
+            temporal = self.cache_file + ".tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
                 json.dump(cache_data, f, ensure_ascii=False, indent=2)
-            
-            self.last_save_time = time.time()
+            os.replace(temporal, self.cache_file)
             
             print(f"DEBUG: Caché guardado en disco: {self.cache_file}")
             return True
@@ -110,7 +127,7 @@ class BaseCache:
     
     def clear(self) -> None:
         """Limpia el caché."""
-        self.cache = {}
+        self.cache.clear()
         self.hits = 0
         self.misses = 0
         if self.cache_file and os.path.exists(self.cache_file):
@@ -294,7 +294,8 @@ class SmartLLMCache(BaseCache):
                 "respuesta": value["respuesta"],
                 "resultado_sql": {
                     "total": value["resultado_sql"]["total"],
-                    "registros": value["resultado_sql"]["registros"]
+                    "columnas": value["resultado_sql"]["columnas"],
+                    "filas": value["resultado_sql"]["filas"]
                 }
             }
 
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Conexiones de lectura a la base de datos de la agenda.
+Este módulo mantiene una conexión de solo lectura por hilo y por archivo,
+para que las consultas no paguen la apertura y configuración de una
+conexión nueva en cada llamada.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Tuple
+from config import DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_STATEMENT_CACHE_SIZE
+
+# Conexiones abiertas por el hilo actual: db_path -> (identidad del archivo, conexión)
+_local = threading.local()
+
+def _identidad_archivo(db_path: str) -> Tuple[int, int]:
+    """
+    Identifica el archivo de la base de datos para detectar si fue reemplazado.
+
+    Args:
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        tuple: (dispositivo, inodo) del archivo
+    """
+    info = os.stat(db_path)
+    return info.st_dev, info.st_ino
+
+def obtener_conexion_lectura(db_path: str) -> sqlite3.Connection:
+    """
+    Obtiene la conexión de solo lectura del hilo actual a una base de datos.
+    La conexión se abre en el primer uso y se vuelve a abrir si el archivo fue
+    reemplazado (crear_base_datos crea la base de datos en un archivo nuevo).
+
+    Args:
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        sqlite3.Connection: Conexión abierta (no debe cerrarse)
+
+    Raises:
+        FileNotFoundError: Si la base de datos no existe
+    """
+    conexiones: Dict[str, Tuple[Tuple[int, int], sqlite3.Connection]] = getattr(_local, "conexiones", None)
+    if conexiones is None:
+        conexiones = _local.conexiones = {}
+
+    identidad = _identidad_archivo(db_path)
+    guardada = conexiones.get(db_path)
+    if guardada is not None:
+        if guardada[0] == identidad:
+            return guardada[1]
+        guardada[1].close()
+
+    # La conexión conserva preparadas las sentencias recientes, para que las
+    # consultas con el mismo texto no se vuelvan a compilar
+    conn = sqlite3.connect(db_path, cached_statements=DB_STATEMENT_CACHE_SIZE)
+    conn.execute("PRAGMA query_only = ON")
+
+    # Normalización de textos (minúsculas y sin acentos) disponible en SQL
+    from helpers.sqlite_adapter import normalizar_texto
+    conn.create_function("normalizar_texto", 1, lambda texto: normalizar_texto(texto) or None, deterministic=True)
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conexiones[db_path] = (identidad, conn)
+    return conn
@@ -10,19 +10,26 @@ y manejar errores de manera consistente.
 import os
 import json
 import time
-from typing import Dict, Any, Optional, Tuple
+from typing import Callable, Dict, Any, Optional, Tuple
 from colorama import Fore, Style
 
-from config import DB_PATH
+from config import DB_PATH, LLM_COMBINED_EVAL_RESPONSE
 from helpers.error_handler import ErrorHandler, SQLError, ConsultaError, DatosError
 from helpers.logger import Logger, log_consulta, log_respuesta, log_metrica, log_error
-from helpers.semantic_cache import semantic_cache
+from helpers.semantic_cache import semantic_cache, embedding_cache
+from helpers.fast_path import resolver_consulta_rapida
+from helpers.fingerprint import estrategia_fingerprint
 from helpers.llm_search import (
     analizar_consulta,
     generar_sql_desde_estrategia,
     ejecutar_consulta_llm,
     evaluar_resultados,
-    generar_respuesta_desde_resultados
+    generar_respuesta_desde_resultados,
+    generar_respuesta_stream,
+    evaluar_y_responder,
+    generar_respuesta_directa,
+    filas_a_registros,
+    serializar_json
 )
 
 # Obtener instancia del logger
@@ -111,7 +118,44 @@ def _analizar_consulta_con_manejo_errores(consulta: str, contexto: Optional[Dict
         log_error("Error al analizar consulta", e, {"consulta": consulta})
         return {}, error_info
 
-def _verificar_cache_semantico(estrategia: Dict[str, Any], consulta: str, tiempo_inicio: float, debug: bool = False) -> Optional[Dict[str, Any]]:
+def _resolver_ruta_rapida(consulta: str, db_path: str, debug: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Intenta resolver la consulta con la ruta rápida por patrones, sin llamar al LLM.
+
+    Args:
+        consulta (str): Consulta del usuario
+        db_path (str): Ruta a la base de datos
+        debug (bool): Activar modo de depuración
+
+    Returns:
+        dict: {"estrategia": ..., "consulta_sql": ..., "resultado_sql": ...} si algún
+            patrón aplica y encuentra resultados, None si no
+    """
+    try:
+        ruta_rapida = resolver_consulta_rapida(consulta, db_path)
+        if ruta_rapida:
+            # Si el patrón no encuentra nada, dejar que el LLM interprete la consulta;
+            # si encuentra resultados, se devuelven para no repetir la consulta al ejecutarla
+            consulta_sql = ruta_rapida["consulta_sql"]
+            resultado = ejecutar_consulta_llm(consulta_sql["consulta"], consulta_sql["parametros"], db_path)
+            if resultado["error"] or resultado["total"] == 0:
+                logger.info(f"La ruta rápida no obtuvo resultados para '{consulta}'. Se usará el LLM.")
+                return None
+            ruta_rapida["resultado_sql"] = resultado
+    except Exception as e:
+        # Cualquier fallo en la ruta rápida se resuelve con el flujo normal del LLM
+        log_error("Error en la ruta rápida", e, {"consulta": consulta})
+        return None
+
+    if ruta_rapida:
+        logger.info(f"Consulta resuelta por ruta rápida: '{consulta}'")
+        log_metrica("ruta_rapida_hit", 1, {"consulta": consulta})
+        if debug:
+            print(f"DEBUG: Consulta resuelta por ruta rápida: {ruta_rapida['estrategia']['explicacion']}")
+
+    return ruta_rapida
+
+def _verificar_cache_semantico(estrategia: Dict[str, Any], consulta: str, tiempo_inicio: float, debug: bool = False, clave_canonica: bool = False) -> Optional[Dict[str, Any]]:
     """
     Verifica si hay un resultado en el caché semántico.
 
@@ -120,6 +164,8 @@ def _verificar_cache_semantico(estrategia: Dict[str, Any], consulta: str, tiempo
         consulta (str): Consulta original
         tiempo_inicio (float): Tiempo de inicio del procesamiento
         debug (bool): Activar modo de depuración
+        clave_canonica (bool): La clave semántica viene de la ruta rápida y no
+            necesita normalizarse con el LLM
 
     Returns:
         dict: Resultado del caché si existe, None si no existe
@@ -130,7 +176,7 @@ def _verificar_cache_semantico(estrategia: Dict[str, Any], consulta: str, tiempo
         return None
 
     # Verificar si hay un resultado en el caché semántico
-    resultado_cache = semantic_cache.get(estrategia["clave_semantica"])
+    resultado_cache = semantic_cache.get(estrategia["clave_semantica"], clave_canonica)
     if resultado_cache:
         if debug:
             print(f"DEBUG: ¡Resultado encontrado en caché semántico con clave: {estrategia['clave_semantica']}!")
@@ -156,7 +202,7 @@ def _verificar_cache_semantico(estrategia: Dict[str, Any], consulta: str, tiempo
 
 # Función eliminada para simplificar el sistema de caché
 
-def _generar_sql_con_manejo_errores(estrategia: Dict[str, Any], consulta: str, db_path: str, debug: bool = False) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+def _generar_sql_con_manejo_errores(estrategia: Dict[str, Any], consulta: str, db_path: str, debug: bool = False, estrategia_json: Optional[str] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
     """
     Genera una consulta SQL a partir de la estrategia y maneja posibles errores.
 
@@ -165,6 +211,7 @@ def _generar_sql_con_manejo_errores(estrategia: Dict[str, Any], consulta: str, d
         consulta (str): Consulta original
         db_path (str): Ruta a la base de datos
         debug (bool): Activar modo de depuración
+        estrategia_json (str, optional): Estrategia ya serializada
 
     Returns:
         tuple: (consulta_sql, error_info)
@@ -176,7 +223,7 @@ def _generar_sql_con_manejo_errores(estrategia: Dict[str, Any], consulta: str, d
         logger.info(f"Generando SQL para consulta: '{consulta}'")
 
         # Generar SQL
-        consulta_sql = generar_sql_desde_estrategia(estrategia, db_path)
+        consulta_sql = generar_sql_desde_estrategia(estrategia, db_path, estrategia_json)
 
         # Registrar SQL generado
         if "consulta" in consulta_sql:
@@ -209,7 +256,7 @@ def _generar_sql_con_manejo_errores(estrategia: Dict[str, Any], consulta: str, d
         log_error("Error al generar SQL", e, {"estrategia": estrategia})
         return {}, error_info
 
-def _ejecutar_sql_con_manejo_errores(consulta_sql: Dict[str, Any], consulta: str, estrategia: Dict[str, Any], db_path: str, debug: bool = False) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+def _ejecutar_sql_con_manejo_errores(consulta_sql: Dict[str, Any], consulta: str, estrategia: Dict[str, Any], db_path: str, debug: bool = False, resultado_sql: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
     """
     Ejecuta una consulta SQL y maneja posibles errores.
 
@@ -219,6 +266,8 @@ def _ejecutar_sql_con_manejo_errores(consulta_sql: Dict[str, Any], consulta: str
         estrategia (dict): Estrategia de búsqueda
         db_path (str): Ruta a la base de datos
         debug (bool): Activar modo de depuración
+        resultado_sql (dict, optional): Resultado ya obtenido (por la ruta rápida);
+            si se indica, la consulta no se vuelve a ejecutar
 
     Returns:
         tuple: (resultado_sql, error_info)
@@ -226,19 +275,20 @@ def _ejecutar_sql_con_manejo_errores(consulta_sql: Dict[str, Any], consulta: str
             - error_info: Información de error si ocurrió alguno, None si no hubo errores
     """
     try:
-        # Registrar inicio de ejecución SQL
-        logger.info(f"Ejecutando SQL: {consulta_sql['consulta']}")
+        if resultado_sql is None:
+            # Registrar inicio de ejecución SQL
+            logger.info(f"Ejecutando SQL: {consulta_sql['consulta']}")
 
-        # Ejecutar SQL
-        resultado_sql = ejecutar_consulta_llm(consulta_sql["consulta"], consulta_sql["parametros"], db_path)
+            # Ejecutar SQL
+            resultado_sql = ejecutar_consulta_llm(consulta_sql["consulta"], consulta_sql["parametros"], db_path)
 
         # Registrar resultados obtenidos
         if "total" in resultado_sql:
             logger.info(f"Resultados encontrados: {resultado_sql['total']}")
             if resultado_sql["total"] > 0:
                 # Registrar primer resultado como muestra
-                if "registros" in resultado_sql and resultado_sql["registros"]:
-                    primer_registro = resultado_sql["registros"][0]
+                if resultado_sql.get("filas"):
+                    primer_registro = filas_a_registros(resultado_sql, 1)[0]
                     logger.info(f"Muestra de resultado: {json.dumps(primer_registro, ensure_ascii=False)}")
             else:
                 logger.warning(f"No se encontraron resultados para la consulta: '{consulta}'")
@@ -256,9 +306,9 @@ def _ejecutar_sql_con_manejo_errores(consulta_sql: Dict[str, Any], consulta: str
             print("DEBUG: Resultados SQL:")
             print(f"Total: {resultado_sql['total']} registros")
             if resultado_sql["total"] > 0 and resultado_sql["total"] <= 3:
-                print(json.dumps(resultado_sql["registros"], indent=2, ensure_ascii=False))
+                print(json.dumps(filas_a_registros(resultado_sql), indent=2, ensure_ascii=False))
             elif resultado_sql["total"] > 3:
-                print(json.dumps(resultado_sql["registros"][:3], indent=2, ensure_ascii=False))
+                print(json.dumps(filas_a_registros(resultado_sql, 3), indent=2, ensure_ascii=False))
                 print(f"... y {resultado_sql['total'] - 3} más")
 
         # Registrar métrica de resultados encontrados
@@ -276,7 +326,7 @@ def _ejecutar_sql_con_manejo_errores(consulta_sql: Dict[str, Any], consulta: str
         })
         return {}, error_info
 
-def _evaluar_resultados_con_manejo_errores(consulta: str, resultado_sql: Dict[str, Any], estrategia: Dict[str, Any], db_path: str, debug: bool = False) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+def _evaluar_resultados_con_manejo_errores(consulta: str, resultado_sql: Dict[str, Any], estrategia: Dict[str, Any], db_path: str, debug: bool = False, estrategia_json: Optional[str] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
     """
     Evalúa los resultados de una consulta SQL y maneja posibles errores.
 
@@ -286,6 +336,7 @@ def _evaluar_resultados_con_manejo_errores(consulta: str, resultado_sql: Dict[st
         estrategia (dict): Estrategia de búsqueda
         db_path (str): Ruta a la base de datos
         debug (bool): Activar modo de depuración
+        estrategia_json (str, optional): Estrategia ya serializada
 
     Returns:
         tuple: (evaluacion, error_info)
@@ -297,7 +348,7 @@ def _evaluar_resultados_con_manejo_errores(consulta: str, resultado_sql: Dict[st
         logger.info(f"Evaluando resultados para consulta: '{consulta}'")
 
         # Evaluar resultados
-        evaluacion = evaluar_resultados(consulta, resultado_sql, estrategia, db_path)
+        evaluacion = evaluar_resultados(consulta, resultado_sql, estrategia, db_path, estrategia_json)
 
         # Registrar resultado de la evaluación
         if "satisfactorio" in evaluacion:
@@ -399,7 +450,7 @@ def _intentar_refinamiento_automatico(consulta: str, contexto: Optional[Dict[str
 
     return None
 
-def _generar_respuesta_con_manejo_errores(consulta: str, resultado_sql: Dict[str, Any], estrategia: Dict[str, Any], evaluacion: Dict[str, Any], db_path: str, debug: bool = False) -> Tuple[str, Optional[Dict[str, Any]]]:
+def _generar_respuesta_con_manejo_errores(consulta: str, resultado_sql: Dict[str, Any], estrategia: Dict[str, Any], evaluacion: Dict[str, Any], db_path: str, debug: bool = False, estrategia_json: Optional[str] = None, huella: Optional[str] = None, al_generar: Optional[Callable[[str], None]] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
     """
     Genera una respuesta natural a partir de los resultados y maneja posibles errores.
 
@@ -410,6 +461,10 @@ def _generar_respuesta_con_manejo_errores(consulta: str, resultado_sql: Dict[str
         evaluacion (dict): Evaluación de los resultados
         db_path (str): Ruta a la base de datos
         debug (bool): Activar modo de depuración
+        estrategia_json (str, optional): Estrategia ya serializada
+        huella (str, optional): Huella de la estrategia (estrategia_fingerprint)
+        al_generar (callable, optional): Si se indica, la respuesta se genera en
+            streaming y se le pasa cada fragmento a medida que llega
 
     Returns:
         tuple: (respuesta, error_info)
@@ -420,8 +475,15 @@ def _generar_respuesta_con_manejo_errores(consulta: str, resultado_sql: Dict[str
         # Registrar inicio de generación de respuesta
         logger.info(f"Generando respuesta para consulta: '{consulta}'")
 
-        # Generar respuesta
-        respuesta = generar_respuesta_desde_resultados(consulta, resultado_sql, estrategia, evaluacion, db_path)
+        # Generar respuesta, entregando los fragmentos a medida que llegan si se pidió streaming
+        if al_generar is None:
+            respuesta = generar_respuesta_desde_resultados(consulta, resultado_sql, estrategia, evaluacion, db_path, estrategia_json, huella)
+        else:
+            fragmentos = []
+            for fragmento in generar_respuesta_stream(consulta, resultado_sql, estrategia, evaluacion, db_path, estrategia_json, huella):
+                al_generar(fragmento)
+                fragmentos.append(fragmento)
+            respuesta = "".join(fragmentos).strip()
 
         # Registrar respuesta generada (versión resumida para el log)
         respuesta_resumida = respuesta[:100] + "..." if len(respuesta) > 100 else respuesta
@@ -444,7 +506,7 @@ def _generar_respuesta_con_manejo_errores(consulta: str, resultado_sql: Dict[str
             # Intentar generar una respuesta básica pero informativa basada en los datos
             try:
                 # Obtener el primer resultado
-                primer_resultado = resultado_sql["registros"][0]
+                primer_resultado = filas_a_registros(resultado_sql, 1)[0]
 
                 # Determinar qué tipo de información se solicitó
                 if "tipo_consulta" in estrategia and estrategia["tipo_consulta"] == "informacion":
@@ -491,7 +553,52 @@ def _generar_respuesta_con_manejo_errores(consulta: str, resultado_sql: Dict[str
 
         return respuesta, error_info
 
-def _guardar_en_cache(estrategia: Dict[str, Any], resultado: Dict[str, Any], debug: bool = False) -> None:
+def _evaluar_y_responder_con_manejo_errores(consulta: str, resultado_sql: Dict[str, Any], estrategia: Dict[str, Any], db_path: str, debug: bool = False, estrategia_json: Optional[str] = None, huella: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    Evalúa los resultados y genera la respuesta en una sola llamada al LLM.
+
+    Args:
+        consulta (str): Consulta original
+        resultado_sql (dict): Resultado de la ejecución SQL
+        estrategia (dict): Estrategia de búsqueda
+        db_path (str): Ruta a la base de datos
+        debug (bool): Activar modo de depuración
+        estrategia_json (str, optional): Estrategia ya serializada
+        huella (str, optional): Huella de la estrategia (estrategia_fingerprint)
+
+    Returns:
+        tuple: (evaluacion, respuesta), o None si falló y deben usarse las dos llamadas separadas
+    """
+    try:
+        logger.info(f"Evaluando resultados y generando respuesta para consulta: '{consulta}'")
+
+        combinado = evaluar_y_responder(consulta, resultado_sql, estrategia, db_path, estrategia_json, huella)
+        evaluacion = combinado["evaluacion"]
+        respuesta = combinado["respuesta"]
+
+        logger.info(f"Evaluación: {'Satisfactoria' if evaluacion.get('satisfactorio') else 'No satisfactoria'}")
+        respuesta_resumida = respuesta[:100] + "..." if len(respuesta) > 100 else respuesta
+        logger.info(f"Respuesta generada: {respuesta_resumida}")
+
+        log_metrica("longitud_respuesta", len(respuesta), {
+            "tipo_consulta": estrategia.get("tipo_consulta", "general"),
+            "resultados": resultado_sql["total"]
+        })
+
+        if debug:
+            print("DEBUG: Evaluación de resultados (llamada combinada):")
+            print(json.dumps(evaluacion, indent=2, ensure_ascii=False))
+
+        return evaluacion, respuesta
+
+    except Exception as e:
+        # No es un error para el usuario: se repite con evaluación y respuesta por separado
+        logger.warning(f"Falló la evaluación y respuesta combinadas, se usarán dos llamadas: {str(e)}")
+        if debug:
+            print(f"{Fore.YELLOW}DEBUG: Falló la llamada combinada: {str(e)}{Style.RESET_ALL}")
+        return None
+
+def _guardar_en_cache(estrategia: Dict[str, Any], resultado: Dict[str, Any], debug: bool = False, clave_canonica: bool = False) -> None:
     """
     Guarda el resultado en el caché semántico.
 
@@ -499,11 +606,13 @@ def _guardar_en_cache(estrategia: Dict[str, Any], resultado: Dict[str, Any], deb
         estrategia (dict): Estrategia de búsqueda
         resultado (dict): Resultado completo del procesamiento
         debug (bool): Activar modo de depuración
+        clave_canonica (bool): La clave semántica viene de la ruta rápida y no
+            necesita normalizarse con el LLM
     """
     # Guardar en caché semántico si hay clave semántica
     if "clave_semantica" in estrategia:
         logger.info(f"Guardando resultado en caché semántico con clave: {estrategia['clave_semantica']}")
-        semantic_cache.set(estrategia["clave_semantica"], resultado)
+        semantic_cache.set(estrategia["clave_semantica"], resultado, clave_canonica)
 
         # Verificar que se guardó correctamente
         semantic_cache_stats = semantic_cache.get_stats()
@@ -514,7 +623,7 @@ def _guardar_en_cache(estrategia: Dict[str, Any], resultado: Dict[str, Any], deb
     else:
         logger.warning("No se pudo guardar en caché: no hay clave semántica en la estrategia")
 
-def procesar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None, db_path: str = DB_PATH, debug: bool = False, max_refinamientos: int = 1) -> Dict[str, Any]:
+def procesar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None, db_path: str = DB_PATH, debug: bool = False, max_refinamientos: int = 1, al_generar: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
     """
     Procesa una consulta completa utilizando el flujo de 5 pasos con refinamiento automático.
 
@@ -535,6 +644,10 @@ def procesar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None,
         db_path (str): Ruta a la base de datos SQLite
         debug (bool): Activar modo de depuración para mostrar información detallada
         max_refinamientos (int): Número máximo de refinamientos automáticos a intentar
+        al_generar (callable, optional): Función que recibe los fragmentos de la
+            respuesta del LLM a medida que se generan. Solo se llama cuando la
+            respuesta se genera con el LLM; las respuestas del caché, las
+            directas y las refinadas solo se devuelven en el resultado
 
     Returns:
         dict: Resultado completo del procesamiento con todos los pasos intermedios
@@ -552,36 +665,66 @@ def procesar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None,
             error_db["consulta"] = consulta
             return error_db
 
-        # Paso 1: Analizar la consulta y generar una estrategia de búsqueda
-        estrategia, error_analisis = _analizar_consulta_con_manejo_errores(consulta, contexto, db_path, debug)
-        if error_analisis:
-            return {
-                "error": error_analisis["mensaje"],
-                "respuesta": ErrorHandler.get_user_message(error_analisis),
-                "consulta": consulta
-            }
+        # Paso 1: Intentar la ruta rápida por patrones; si no aplica, analizar
+        # la consulta con el LLM y generar una estrategia de búsqueda
+        ruta_rapida = _resolver_ruta_rapida(consulta, db_path, debug)
+        if ruta_rapida:
+            estrategia = ruta_rapida["estrategia"]
+        else:
+            estrategia, error_analisis = _analizar_consulta_con_manejo_errores(consulta, contexto, db_path, debug)
+            if error_analisis:
+                return {
+                    "error": error_analisis["mensaje"],
+                    "respuesta": ErrorHandler.get_user_message(error_analisis),
+                    "consulta": consulta
+                }
+
+        # Serializar la estrategia y calcular su huella una sola vez para todos
+        # los prompts y capas de caché
+        estrategia_json = serializar_json(estrategia)
+        huella = estrategia_fingerprint(estrategia)
 
         if debug:
             print("DEBUG: Estrategia de búsqueda:")
-            print(json.dumps(estrategia, indent=2, ensure_ascii=False))
+            print(estrategia_json)
 
         # Paso 2: Verificar caché semántico
-        resultado_cache_semantico = _verificar_cache_semantico(estrategia, consulta, tiempo_inicio, debug)
+        resultado_cache_semantico = _verificar_cache_semantico(estrategia, consulta, tiempo_inicio, debug, ruta_rapida is not None)
         if resultado_cache_semantico:
             return resultado_cache_semantico
 
-        # Paso 4: Generar consulta SQL
-        consulta_sql, error_sql = _generar_sql_con_manejo_errores(estrategia, consulta, db_path, debug)
-        if error_sql:
+        # Paso 3: Verificar caché por similitud (paráfrasis con la misma estrategia)
+        respuesta_similar = embedding_cache.get(consulta, huella)
+        if respuesta_similar is not None:
+            logger.info(f"¡Acierto en caché por similitud! Consulta: '{consulta}'")
+            log_metrica("embedding_cache_hit", 1, {"consulta": consulta})
+            log_respuesta(consulta, respuesta_similar, time.time() - tiempo_inicio, True)
             return {
-                "error": error_sql["mensaje"],
-                "respuesta": ErrorHandler.get_user_message(error_sql),
                 "consulta": consulta,
-                "estrategia": estrategia
+                "estrategia": estrategia,
+                "respuesta": respuesta_similar,
+                "from_embedding_cache": True,
+                "error": None
             }
 
-        # Paso 5: Ejecutar consulta SQL
-        resultado_sql, error_ejecucion = _ejecutar_sql_con_manejo_errores(consulta_sql, consulta, estrategia, db_path, debug)
+        # Paso 4: Generar consulta SQL (la ruta rápida ya la trae generada)
+        if ruta_rapida:
+            consulta_sql = ruta_rapida["consulta_sql"]
+        else:
+            consulta_sql, error_sql = _generar_sql_con_manejo_errores(estrategia, consulta, db_path, debug, estrategia_json)
+            if error_sql:
+                return {
+                    "error": error_sql["mensaje"],
+                    "respuesta": ErrorHandler.get_user_message(error_sql),
+                    "consulta": consulta,
+                    "estrategia": estrategia
+                }
+
+        # Paso 5: Ejecutar consulta SQL (la ruta rápida ya trae el resultado)
+        resultado_sql, error_ejecucion = _ejecutar_sql_con_manejo_errores(
+            consulta_sql, consulta, estrategia, db_path, debug,
+            ruta_rapida["resultado_sql"] if ruta_rapida else None
+        )
         if error_ejecucion:
             return {
                 "error": error_ejecucion["mensaje"],
@@ -591,21 +734,55 @@ def procesar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None,
                 "consulta_sql": consulta_sql
             }
 
-        # Paso 6: Evaluar resultados
-        evaluacion, _ = _evaluar_resultados_con_manejo_errores(consulta, resultado_sql, estrategia, db_path, debug)
-
-        # Paso 7: Intentar refinamiento automático si es necesario
-        resultado_refinado = _intentar_refinamiento_automatico(
-            consulta, contexto, estrategia, evaluacion, resultado_sql,
-            db_path, debug, max_refinamientos
-        )
-        if resultado_refinado:
-            return resultado_refinado
-
-        # Paso 8: Generar respuesta natural
-        respuesta, error_respuesta = _generar_respuesta_con_manejo_errores(
-            consulta, resultado_sql, estrategia, evaluacion, db_path, debug
-        )
+        # Pasos 6 y 8 en una sola llamada: el refinamiento solo se intenta cuando no
+        # hay resultados y quedan intentos, así que en otro caso la evaluación no
+        # cambia el flujo y puede pedirse junto con la respuesta
+        combinado = None
+        evaluacion = None
+
+        # Casos triviales (sin resultados o un único dato solicitado): respuesta local sin LLM
+        respuesta_directa = generar_respuesta_directa(consulta, resultado_sql, estrategia, max_refinamientos)
+        if respuesta_directa is not None:
+            logger.info(f"Respuesta generada sin LLM: {respuesta_directa}")
+            log_metrica("respuesta_directa", 1, {"consulta": consulta, "resultados": resultado_sql["total"]})
+            combinado = (
+                {
+                    "satisfactorio": resultado_sql["total"] > 0,
+                    "evaluacion": "Caso trivial resuelto sin evaluación del LLM."
+                },
+                respuesta_directa
+            )
+        elif resultado_sql["total"] > 0 or max_refinamientos <= 0:
+            if al_generar is not None:
+                # En streaming la respuesta se emite sin esperar a una evaluación
+                # del LLM, que aquí no puede dar lugar a un refinamiento
+                evaluacion = {
+                    "satisfactorio": resultado_sql["total"] > 0,
+                    "evaluacion": "Respuesta generada en streaming sin evaluación del LLM."
+                }
+            elif LLM_COMBINED_EVAL_RESPONSE:
+                combinado = _evaluar_y_responder_con_manejo_errores(consulta, resultado_sql, estrategia, db_path, debug, estrategia_json, huella)
+
+        if combinado is not None:
+            evaluacion, respuesta = combinado
+            error_respuesta = None
+        else:
+            if evaluacion is None:
+                # Paso 6: Evaluar resultados
+                evaluacion, _ = _evaluar_resultados_con_manejo_errores(consulta, resultado_sql, estrategia, db_path, debug, estrategia_json)
+
+                # Paso 7: Intentar refinamiento automático si es necesario
+                resultado_refinado = _intentar_refinamiento_automatico(
+                    consulta, contexto, estrategia, evaluacion, resultado_sql,
+                    db_path, debug, max_refinamientos
+                )
+                if resultado_refinado:
+                    return resultado_refinado
+
+            # Paso 8: Generar respuesta natural
+            respuesta, error_respuesta = _generar_respuesta_con_manejo_errores(
+                consulta, resultado_sql, estrategia, evaluacion, db_path, debug, estrategia_json, huella, al_generar
+            )
         if error_respuesta:
             return {
                 "error": error_respuesta["mensaje"],
@@ -629,7 +806,8 @@ def procesar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None,
         }
 
         # Paso 9: Guardar en caché
-        _guardar_en_cache(estrategia, resultado, debug)
+        _guardar_en_cache(estrategia, resultado, debug, ruta_rapida is not None)
+        embedding_cache.set(consulta, huella, respuesta)
 
         # Registrar respuesta final
         tiempo_ejecucion = time.time() - tiempo_inicio
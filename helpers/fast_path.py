@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ruta rápida basada en patrones para el asistente de agenda.
+Este módulo reconoce consultas con una forma muy concreta ("teléfono de X",
+"docentes de la zona N", "cuántos directores hay") y genera directamente la
+estrategia y la consulta SQL, sin llamar al LLM para analizar la consulta
+ni para generar el SQL.
+"""
+
+import re
+from typing import Dict, Any, List, Optional
+from config import DB_PATH, DB_TABLE, FAST_PATH_ENABLED
+from helpers.conexion_db import obtener_conexion_lectura
+from helpers.sqlite_adapter import normalizar_texto
+from helpers.nombres import SUFIJO_NORMALIZADO
+
+# Expresión para los roles reconocidos por la ruta rápida
+_ROL = r"(?P<rol>subdirector(?:es|as?)?|director(?:es|as?)?|docentes?|maestr[oa]s?|profesor(?:es|as?)?|veladore?s?)"
+
+# Patrones de consulta (se aplican sobre el texto normalizado, completo)
+_PATRON_CONTACTO = re.compile(
+    r"(?:(?:cual es|dame|dime|me das|me pasas|busca)\s+)?(?:(?:el|la|su)\s+)?"
+    r"(?P<atributo>telefono|celular|numero|correo(?: electronico)?|email|direccion|domicilio)"
+    r"\s+de\s+(?P<nombre>[a-z ]+)"
+)
+_PATRON_LISTADO = re.compile(
+    r"(?:(?:dame|dime|muestra(?:me)?|lista(?:me)?|quienes son)\s+)?(?:(?:todos|todas)\s+)?(?:(?:los|las)\s+)?"
+    + _ROL + r"\s+(?:de|en)\s+la\s+zona\s+(?P<zona>\d+)"
+)
+_PATRON_CONTEO = re.compile(
+    r"cuant[oa]s\s+" + _ROL + r"\s+hay(?:\s+en\s+la\s+zona\s+(?P<zona>\d+))?"
+)
+
+# Signos de puntuación que se ignoran al normalizar la consulta
+_SIGNOS = re.compile(r"[¿?¡!.,;:]")
+
+# Palabras que indican una consulta de seguimiento en lugar de un nombre
+_PRONOMBRES = frozenset([
+    "el", "ella", "ellos", "ellas", "su", "sus", "lo", "le", "usted",
+    "este", "esta", "estos", "estas", "ese", "esa", "esos", "esas",
+    "aquel", "aquella", "aquellos", "aquellas", "otro", "otra",
+    "tambien", "tampoco", "ademas"
+])
+
+# Columnas (prefijos normalizados) de cada atributo de contacto
+_COLUMNAS_ATRIBUTO = {
+    "telefono": ["telefono_celular", "telefono_particular"],
+    "correo": ["direccion_de_correo"],
+    "direccion": ["domicilio_particular"]
+}
+
+# Filtro de cada rol: (prefijo normalizado de la columna, valor)
+_FILTROS_ROL = {
+    "docentes": ("funcion_especifica", "DOCENTE FRENTE A GRUPO"),
+    "directores": ("j_jefe", "D"),
+    "subdirectores": ("j_jefe", "SD"),
+    "veladores": ("funcion_especifica", "VELADOR")
+}
+
+def _normalizar(texto: str) -> str:
+    """
+    Normaliza un texto: minúsculas, sin acentos, sin signos y con espacios simples.
+
+    Args:
+        texto (str): Texto a normalizar
+
+    Returns:
+        str: Texto normalizado
+    """
+    return normalizar_texto(_SIGNOS.sub(" ", texto))
+
+def _canonizar_rol(rol: str) -> str:
+    """
+    Convierte una variante de rol ("maestra", "director") a su clave canónica.
+
+    Args:
+        rol (str): Rol reconocido por el patrón
+
+    Returns:
+        str: Clave de _FILTROS_ROL
+    """
+    if rol.startswith("subdirector"):
+        return "subdirectores"
+    if rol.startswith("director"):
+        return "directores"
+    if rol.startswith("velador"):
+        return "veladores"
+    return "docentes"
+
+def _canonizar_atributo(atributo: str) -> str:
+    """
+    Convierte una variante de atributo de contacto a su clave canónica.
+
+    Args:
+        atributo (str): Atributo reconocido por el patrón
+
+    Returns:
+        str: Clave de _COLUMNAS_ATRIBUTO
+    """
+    if atributo in ("telefono", "celular", "numero"):
+        return "telefono"
+    if atributo.startswith("correo") or atributo == "email":
+        return "correo"
+    return "direccion"
+
+def _obtener_esquema(db_path: str) -> Dict[str, Any]:
+    """
+    Obtiene las columnas de la tabla de contactos y si existe la tabla de texto completo.
+
+    Args:
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        dict: Columnas por nombre normalizado y disponibilidad de FTS
+    """
+    cursor = obtener_conexion_lectura(db_path).cursor()
+    cursor.execute(f"PRAGMA table_info({DB_TABLE})")
+    columnas = {_normalizar(info[1]): info[1] for info in cursor.fetchall()}
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'contactos_fts'")
+    fts_disponible = cursor.fetchone() is not None
+    cursor.close()
+    return {"columnas": columnas, "fts": fts_disponible}
+
+def _buscar_columnas(columnas: Dict[str, str], prefijos: List[str]) -> List[str]:
+    """
+    Busca las columnas reales cuyo nombre normalizado empieza por alguno de los prefijos.
+
+    Args:
+        columnas (dict): Nombre normalizado -> nombre real de la columna
+        prefijos (list): Prefijos normalizados a buscar
+
+    Returns:
+        list: Nombres reales de las columnas encontradas, en el orden de los prefijos
+    """
+    encontradas = []
+    for prefijo in prefijos:
+        for normalizada, real in columnas.items():
+            if normalizada.startswith(prefijo) and real not in encontradas:
+                encontradas.append(real)
+                break
+    return encontradas
+
+def _consulta_contacto(coincidencia: re.Match, esquema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Genera la estrategia y el SQL para "teléfono/correo/dirección de <nombre>".
+
+    Args:
+        coincidencia (re.Match): Coincidencia del patrón de contacto
+        esquema (dict): Esquema de la base de datos
+
+    Returns:
+        dict: Estrategia y consulta SQL, o None si no se puede resolver con confianza
+    """
+    tokens = coincidencia.group("nombre").split()
+    if not tokens or not _PRONOMBRES.isdisjoint(tokens) or len("".join(tokens)) < 3:
+        return None
+
+    atributo = _canonizar_atributo(coincidencia.group("atributo"))
+    columnas = esquema["columnas"]
+    columnas_atributo = _buscar_columnas(columnas, _COLUMNAS_ATRIBUTO[atributo])
+    if not columnas_atributo or "nombre_completo" not in columnas:
+        return None
+
+    # Todas las palabras del nombre deben aparecer, en cualquier orden y sin
+    # distinguir acentos (los tokens ya están normalizados)
+    if esquema["fts"]:
+        condicion = "id IN (SELECT rowid FROM contactos_fts WHERE contactos_fts MATCH ?)"
+        parametros = [" AND ".join(f'"{t}"' for t in tokens)]
+    elif "nombre_completo" + SUFIJO_NORMALIZADO in columnas:
+        condicion = " AND ".join(f"INSTR(nombre_completo{SUFIJO_NORMALIZADO}, ?) > 0" for _ in tokens)
+        parametros = list(tokens)
+    else:
+        return None
+
+    campos = ", ".join(f'"{col}"' for col in _buscar_columnas(columnas, ["nombre_natural"]) + columnas_atributo)
+    nombre = " ".join(tokens)
+
+    return {
+        "estrategia": {
+            "tipo_consulta": "informacion",
+            "nombres_posibles": [nombre],
+            "atributos_solicitados": columnas_atributo,
+            "condiciones": [],
+            "explicacion": f"Consulta de {atributo} de una persona resuelta por patrón",
+            # Clave canónica: el orden de las palabras del nombre no importa
+            "clave_semantica": f"persona:{'_'.join(sorted(tokens))}:{atributo}"
+        },
+        "consulta_sql": {
+            "consulta": f"SELECT id, nombre_completo, {campos} FROM {DB_TABLE} WHERE {condicion} ORDER BY nombre_completo",
+            "parametros": parametros,
+            "explicacion": f"Búsqueda de {atributo} por nombre (ruta rápida)"
+        }
+    }
+
+def _filtros_rol_zona(rol: str, zona: Optional[str], columnas: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Construye las condiciones SQL para filtrar por rol y, opcionalmente, por zona.
+
+    Args:
+        rol (str): Rol canónico
+        zona (str, optional): Número de zona
+        columnas (dict): Nombre normalizado -> nombre real de la columna
+
+    Returns:
+        dict: Condiciones, parámetros y columnas usadas, o None si faltan columnas
+    """
+    prefijo, valor = _FILTROS_ROL[rol]
+    columnas_rol = _buscar_columnas(columnas, [prefijo])
+    if not columnas_rol:
+        return None
+
+    condiciones = [f'"{columnas_rol[0]}" = ?']
+    parametros = [valor]
+    if zona is not None:
+        if "zona" not in columnas:
+            return None
+        condiciones.append('"zona" = ?')
+        parametros.append(zona)
+
+    return {
+        "where": " AND ".join(condiciones),
+        "parametros": parametros,
+        "condiciones": [{"campo": columnas_rol[0], "operador": "=", "valor": valor}]
+                       + ([{"campo": "zona", "operador": "=", "valor": zona}] if zona is not None else [])
+    }
+
+def _consulta_listado(coincidencia: re.Match, esquema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Genera la estrategia y el SQL para "<rol> de la zona <N>".
+
+    Args:
+        coincidencia (re.Match): Coincidencia del patrón de listado
+        esquema (dict): Esquema de la base de datos
+
+    Returns:
+        dict: Estrategia y consulta SQL, o None si no se puede resolver con confianza
+    """
+    rol = _canonizar_rol(coincidencia.group("rol"))
+    zona = coincidencia.group("zona")
+    columnas = esquema["columnas"]
+    filtros = _filtros_rol_zona(rol, zona, columnas)
+    if filtros is None or "nombre_completo" not in columnas:
+        return None
+
+    campos = ["id", "nombre_completo"] + _buscar_columnas(columnas, ["nombre_natural", "funcion_especifica", "nombre_del_c_t", "zona"])
+    campos_sql = ", ".join(f'"{col}"' for col in campos)
+
+    return {
+        "estrategia": {
+            "tipo_consulta": "filtrado",
+            "nombres_posibles": [],
+            "atributos_solicitados": [],
+            "condiciones": filtros["condiciones"],
+            "explicacion": f"Listado de {rol} de la zona {zona} resuelto por patrón",
+            "clave_semantica": f"listado:zona_{zona}:{rol}"
+        },
+        "consulta_sql": {
+            "consulta": f"SELECT {campos_sql} FROM {DB_TABLE} WHERE {filtros['where']} ORDER BY nombre_completo",
+            "parametros": filtros["parametros"],
+            "explicacion": f"Listado de {rol} por zona (ruta rápida)"
+        }
+    }
+
+def _consulta_conteo(coincidencia: re.Match, esquema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Genera la estrategia y el SQL para "cuántos <rol> hay [en la zona <N>]".
+
+    Args:
+        coincidencia (re.Match): Coincidencia del patrón de conteo
+        esquema (dict): Esquema de la base de datos
+
+    Returns:
+        dict: Estrategia y consulta SQL, o None si no se puede resolver con confianza
+    """
+    rol = _canonizar_rol(coincidencia.group("rol"))
+    zona = coincidencia.group("zona")
+    filtros = _filtros_rol_zona(rol, zona, esquema["columnas"])
+    if filtros is None:
+        return None
+
+    clave = f"conteo:zona_{zona}:{rol}" if zona else f"conteo:funcion:{rol}"
+
+    return {
+        "estrategia": {
+            "tipo_consulta": "conteo",
+            "nombres_posibles": [],
+            "atributos_solicitados": [],
+            "condiciones": filtros["condiciones"],
+            "explicacion": f"Conteo de {rol}" + (f" de la zona {zona}" if zona else "") + " resuelto por patrón",
+            "clave_semantica": clave
+        },
+        "consulta_sql": {
+            "consulta": f"SELECT COUNT(*) AS total FROM {DB_TABLE} WHERE {filtros['where']}",
+            "parametros": filtros["parametros"],
+            "explicacion": f"Conteo de {rol} (ruta rápida)"
+        }
+    }
+
+# Patrones en orden de prioridad y la función que genera su consulta
+_REGLAS = [
+    (_PATRON_CONTEO, _consulta_conteo),
+    (_PATRON_LISTADO, _consulta_listado),
+    (_PATRON_CONTACTO, _consulta_contacto)
+]
+
+def resolver_consulta_rapida(consulta: str, db_path: str = DB_PATH) -> Optional[Dict[str, Any]]:
+    """
+    Intenta resolver la consulta con un patrón conocido, sin llamar al LLM.
+
+    Solo se aceptan coincidencias de la consulta completa; cualquier consulta
+    que no encaje exactamente en un patrón sigue el flujo normal del LLM.
+
+    Args:
+        consulta (str): Consulta del usuario
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        dict: {"estrategia": ..., "consulta_sql": ...} o None si ningún patrón aplica
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+
+    texto = _normalizar(consulta)
+    for patron, generar in _REGLAS:
+        coincidencia = patron.fullmatch(texto)
+        if coincidencia:
+            return generar(coincidencia, _obtener_esquema(db_path))
+
+    return None
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Huella de las estrategias de búsqueda para el asistente de agenda.
+Este módulo calcula una huella canónica de la intención de búsqueda de una
+estrategia, compartida por las capas de caché (respuestas y similitud de
+embeddings) para reconocer dos consultas que buscan lo mismo aunque el LLM
+haya redactado la estrategia de forma distinta.
+"""
+
+import hashlib
+from typing import Dict, Any
+import orjson
+
+def estrategia_fingerprint(estrategia: Dict[str, Any]) -> str:
+    """
+    Calcula la huella de la intención de búsqueda de una estrategia,
+    ignorando la explicación en prosa y el historial de la conversación.
+
+    Args:
+        estrategia (dict): Estrategia de búsqueda
+
+    Returns:
+        str: Hash BLAKE2b (128 bits) de los campos que definen la búsqueda
+    """
+    intencion = {
+        "tipo_consulta": estrategia.get("tipo_consulta"),
+        "nombres_posibles": sorted(str(n).lower() for n in estrategia.get("nombres_posibles") or []),
+        "atributos_solicitados": sorted(str(a).lower() for a in estrategia.get("atributos_solicitados") or []),
+        "condiciones": estrategia.get("condiciones") or []
+    }
+    datos = orjson.dumps(intencion, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str)
+    return hashlib.blake2b(datos, digest_size=16).hexdigest()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Caché de contexto de Gemini para el asistente de agenda.
+Este módulo registra en Gemini (CachedContent) los bloques de instrucciones
+fijas de los prompts, para que el modelo no tenga que procesarlos de nuevo
+en cada llamada mientras el caché siga vigente.
+"""
+
+import datetime
+import functools
+import hashlib
+import time
+from typing import Any, Optional
+import google.generativeai as genai
+from helpers.base_cache import BaseCache
+from config import (
+    LLM_PRIMARY_MODEL,
+    LLM_CONTEXT_CACHE_ENABLED,
+    LLM_CONTEXT_CACHE_TTL,
+    LLM_CONTEXT_CACHE_MIN_TOKENS
+)
+
+# Margen antes de la expiración a partir del cual se renueva el TTL
+MARGEN_RENOVACION = 300  # 5 minutos
+
+# Estimación de caracteres por token para descartar bloques demasiado cortos
+# sin consultar a Gemini
+CARACTERES_POR_TOKEN = 4
+
+class GeminiContextCache(BaseCache):
+    """
+    Registro en memoria de los CachedContent creados en Gemini.
+    Cada entrada corresponde a un bloque de instrucciones de sistema. Los bloques
+    por debajo de LLM_CONTEXT_CACHE_MIN_TOKENS no se registran; si Gemini no
+    permite crear el caché por otro motivo, se recuerda el fallo y las llamadas
+    siguen usando system_instruction normalmente.
+    """
+
+    def __init__(self, ttl: int = LLM_CONTEXT_CACHE_TTL):
+        """
+        Inicializa el caché de contexto.
+
+        Args:
+            ttl (int): Tiempo de vida de los CachedContent en segundos
+        """
+        super().__init__(10, None, ttl)
+
+        # Bandera para indicar si el caché está habilitado
+        self.enabled = LLM_CONTEXT_CACHE_ENABLED
+
+        # Bloques cuyo registro falló, con la hora del fallo
+        self.fallidos = {}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def generar_clave(system_instruction: str) -> str:
+        """
+        Genera la clave de un bloque de instrucciones.
+
+        Los bloques son constantes de módulo, por lo que el hash se calcula
+        una sola vez por bloque y se reutiliza en las llamadas siguientes.
+
+        Args:
+            system_instruction (str): Instrucciones de sistema
+
+        Returns:
+            str: Hash SHA-256 del bloque
+        """
+        return hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+
+    def obtener(self, system_instruction: str) -> Optional[Any]:
+        """
+        Obtiene el CachedContent de un bloque de instrucciones, creándolo o
+        renovándolo si es necesario.
+
+        Args:
+            system_instruction (str): Instrucciones de sistema a cachear
+
+        Returns:
+            CachedContent: Caché de Gemini, o None si no está disponible
+        """
+        if not self.enabled:
+            return None
+
+        # Gemini rechaza los bloques por debajo del mínimo de tokens del modelo:
+        # no se intenta crearlos para no pagar una llamada fallida
+        if len(system_instruction) // CARACTERES_POR_TOKEN < LLM_CONTEXT_CACHE_MIN_TOKENS:
+            return None
+
+        clave = self.generar_clave(system_instruction)
+        ahora = time.time()
+
+        # No reintentar un registro fallido hasta que pase el TTL
+        if clave in self.fallidos and ahora - self.fallidos[clave] < self.ttl:
+            self.misses += 1
+            return None
+
+        entry = self.cache.get(clave)
+        if entry is not None:
+            restante = entry["expira"] - ahora
+            if restante > MARGEN_RENOVACION:
+                self.hits += 1
+                return entry["data"]
+
+            # Próximo a expirar: renovar el TTL en Gemini
+            if restante > 0:
+                try:
+                    entry["data"].update(ttl=datetime.timedelta(seconds=self.ttl))
+                    entry["expira"] = ahora + self.ttl
+                    self.hits += 1
+                    return entry["data"]
+                except Exception as e:
+                    print(f"No se pudo renovar el caché de contexto: {e}")
+
+            del self.cache[clave]
+
+        self.misses += 1
+        try:
+            cached_content = genai.caching.CachedContent.create(
+                model=f"models/{LLM_PRIMARY_MODEL}",
+                display_name=f"agenda-{clave[:16]}",
+                system_instruction=system_instruction,
+                ttl=datetime.timedelta(seconds=self.ttl)
+            )
+        except Exception as e:
+            print(f"No se pudo crear el caché de contexto, se usará system_instruction: {e}")
+            self.fallidos[clave] = ahora
+            return None
+
+        self.cache[clave] = {
+            "data": cached_content,
+            "timestamp": ahora,
+            "expira": ahora + self.ttl
+        }
+        return cached_content
+
+    def invalidar(self, cached_content: Any) -> None:
+        """
+        Elimina del registro un CachedContent que ya no existe en Gemini
+        (por ejemplo, tras un error NotFound), para que se vuelva a crear.
+
+        Args:
+            cached_content: CachedContent a invalidar
+        """
+        for clave, entry in list(self.cache.items()):
+            if entry["data"] is cached_content:
+                del self.cache[clave]
+
+# Instancia global del caché
+context_cache = GeminiContextCache()
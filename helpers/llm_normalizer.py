@@ -9,13 +9,8 @@ del caché semántico.
 """
 
 from typing import Dict
-import google.generativeai as genai
-from config import GOOGLE_API_KEY
 from helpers.llm_utils import llamar_llm
 
-# Configurar API key explícitamente
-genai.configure(api_key=GOOGLE_API_KEY)
-
 # Caché de normalización (clave original -> clave normalizada)
 normalizacion_cache: Dict[str, str] = {}
 
@@ -3,140 +3,55 @@ Módulo para búsqueda avanzada utilizando LLM.
 Implementa funciones para analizar consultas, generar SQL y evaluar resultados.
 """
 
-import json
+import heapq
+import os
 import sqlite3
-from typing import Dict, List, Any, Optional
-import google.generativeai as genai
+import time
+from typing import Callable, Dict, List, Any, Iterator, Optional, Tuple
+import orjson
 from config import (
-    GOOGLE_API_KEY,
     DB_PATH,
     DB_TABLE,
     DB_PREVIEW_LIMIT,
     DB_EXAMPLE_LIMIT,
-    MAX_RESULTS_DISPLAY
+    MAX_RESULTS_DISPLAY,
+    MAX_HISTORY_TURNS,
+    SQL_MAX_FILAS,
+    SQL_FETCH_BATCH,
+    DB_PREVIEW_TTL,
+    LLM_RESPONSE_SAFETY_SETTINGS,
+    ATTRIBUTE_MAPPING
 )
-from helpers.llm_utils import llamar_llm, parsear_respuesta_json
-
-# Configurar API
-genai.configure(api_key=GOOGLE_API_KEY)
-
-def analizar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None, db_path: str = DB_PATH) -> Dict[str, Any]:
+from helpers.llm_utils import llamar_llm, llamar_llm_stream, parsear_respuesta_json
+from helpers.sql_cache import sql_cache
+from helpers.gemini_context_cache import context_cache
+from helpers.response_cache import response_cache
+from helpers.fingerprint import estrategia_fingerprint
+from helpers.nombres import nombre_natural, COLUMNAS_NOMBRE, COLUMNAS_NORMALIZADAS
+from helpers.conexion_db import obtener_conexion_lectura
+from helpers.sqlite_adapter import normalizar_texto
+from helpers.prompts_const import MAPEO_ROLES, MAPEO_CONCEPTOS
+
+# Opciones de orjson para los bloques JSON incrustados en los prompts
+_ORJSON_OPCIONES = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+
+def serializar_json(obj: Any) -> str:
     """
-    Analiza una consulta en lenguaje natural y genera una estrategia de búsqueda.
+    Serializa un objeto a JSON indentado para incluirlo en un prompt.
+
+    orjson emite UTF-8 sin escapar (equivalente a ensure_ascii=False) y es
+    considerablemente más rápido que json.dumps con indentación.
 
     Args:
-        consulta (str): Consulta del usuario
-        contexto (dict, optional): Contexto de la consulta anterior
-        db_path (str): Ruta a la base de datos SQLite
+        obj: Objeto a serializar
 
     Returns:
-        dict: Estrategia de búsqueda con información sobre nombres, atributos, etc.
-    """
-    # Obtener vista previa de la base de datos
-    vista_previa = obtener_vista_previa_db(db_path)
-
-    # Preparar información de contexto si existe
-    contexto_texto = ""
-    if contexto:
-        contexto_texto = f"""
-        CONTEXTO DE LA CONSULTA ANTERIOR:
-        - Consulta anterior: "{contexto.get('consulta_anterior', '')}"
-        - Respuesta anterior: "{contexto.get('respuesta_anterior', '')}"
-
-        Resultados anteriores:
-        {json.dumps(contexto.get('resultados_anteriores', []), indent=2, ensure_ascii=False)}
-
-        IMPORTANTE SOBRE EL CONTEXTO:
-        1. Si la consulta actual parece ser una pregunta de seguimiento (por ejemplo, usa pronombres como "su", "él", "ella" o es muy corta),
-           utiliza el contexto anterior para determinar a qué persona se refiere.
-        2. Si la consulta actual pide información que ya se proporcionó en respuestas anteriores, DEBES usar esa información.
-        3. Mantén CONSISTENCIA con las respuestas anteriores. Si antes dijiste que una persona tiene cierta información,
-           no puedes decir ahora que no la tiene.
-        4. Analiza la respuesta anterior para extraer información relevante que pueda ser útil para la consulta actual.
-        5. Si la consulta actual es sobre un atributo específico (como dirección, teléfono, etc.) y ese atributo
-           aparece en la respuesta anterior, DEBES usar esa información.
-        """
-
-    # Preparar información de la base de datos
-    db_info = f"""
-    INFORMACIÓN DE LA BASE DE DATOS:
-    - Total de registros: {vista_previa.get('total_registros', 'N/A')}
-    - Columnas disponibles: {', '.join(vista_previa.get('columnas', []))}
-
-    Nombres únicos en la base de datos (muestra):
-    {json.dumps(vista_previa.get('nombres_unicos', []), indent=2, ensure_ascii=False)}
-
-    Ejemplos de registros:
-    {json.dumps(vista_previa.get('ejemplos', []), indent=2, ensure_ascii=False)}
-
-    IMPORTANTE:
-    1. Si el usuario menciona un nombre parcial (por ejemplo, solo "Luis") y solo hay una persona con ese nombre en la base de datos, asume que se refiere a esa persona.
-    2. Si hay múltiples personas con ese nombre parcial, considera todas las posibilidades y sugiere preguntar al usuario para aclarar.
-    3. Utiliza la información de la base de datos para entender mejor la estructura y el contenido de los datos.
+        str: JSON indentado con 2 espacios
     """
+    return orjson.dumps(obj, option=_ORJSON_OPCIONES).decode("utf-8")
 
-    # Extraer información de respuestas anteriores si existe
-    info_respuestas_anteriores = ""
-    if contexto and "historial_respuestas" in contexto and len(contexto["historial_respuestas"]) > 0:
-        # Analizar las respuestas anteriores para extraer información relevante
-        info_respuestas_anteriores = f"""
-        INFORMACIÓN EXTRAÍDA DE RESPUESTAS ANTERIORES:
-
-        He analizado las respuestas anteriores y he encontrado la siguiente información relevante:
-        """
-
-        # Buscar patrones comunes en las respuestas anteriores
-        for i, respuesta in enumerate(contexto.get("historial_respuestas", [])):
-            consulta_correspondiente = contexto.get("historial_consultas", [])[i] if i < len(contexto.get("historial_consultas", [])) else ""
-            info_respuestas_anteriores += f"""
-            Consulta: "{consulta_correspondiente}"
-            Respuesta: "{respuesta}"
-            """
-
-    prompt = f"""
-    Analiza esta consulta sobre una agenda de contactos:
-
-    Consulta: {consulta}
-
-    {contexto_texto}
-
-    {info_respuestas_anteriores}
-
-    {db_info}
-
-    MAPEO DE CONCEPTOS A CAMPOS DE LA BASE DE DATOS:
-
-    1. ROLES Y FUNCIONES:
-       - "docentes", "maestros", "profesores" → función_específica = 'DOCENTE FRENTE A GRUPO'
-       - "directores" → función_específica = 'DIRECTOR'
-       - "subdirectores académicos" → función_específica = 'SUBDIRECTOR ACADÉMICO'
-       - "subdirectores de gestión" → función_específica = 'SUBDIRECTOR DE GESTIÓN'
-       - "subdirectores" (genérico) → función_específica IN ('SUBDIRECTOR ACADÉMICO', 'SUBDIRECTOR DE GESTIÓN')
-       - "personal de aula de medios", "encargados de tecnología" → función_específica = 'TICAD'S (AULA DE MEDIOS)'
-       - "veladores", "personal de vigilancia" → función_específica = 'VELADOR'
-       - "ASPE", "personal de apoyo" → función_específica = 'ASPE'
-       - "a qué se dedica", "función", "cargo", "puesto" → función_específica
-
-    2. DATOS DE CONTACTO:
-       - "teléfono", "número", "celular", "móvil" → teléfono_celular, teléfono_particular
-       - "correo", "email", "correo electrónico" → dirección_de_correo_electrónica
-       - "dirección", "domicilio", "dónde vive" → domicilio_particular
-
-    3. DATOS LABORALES:
-       - "centro de trabajo", "escuela", "dónde trabaja" → nombre_del_c_t
-       - "clave del centro de trabajo" → clave_de_c_t_en_el_que_labora
-       - "doble plaza" → el_trabajador_cuenta_con_doble_plaza
-       - "fecha de ingreso", "antigüedad", "cuándo empezó" → fecha_ingreso_a_la_sep
-       - "sector" → sector
-       - "zona" → zona
-
-    4. DATOS ACADÉMICOS:
-       - "estudios", "formación", "preparación" → último_grado_de_estudios
-
-    5. DATOS PERSONALES:
-       - "estado civil", "casado", "soltero" → estado_civil
-       - "CURP" → curp
-       - "RFC" → filiación_o_rfc_con_homonimia
+# Instrucciones estáticas del prompt de analizar_consulta
+_PROMPT_ANALISIS_INSTRUCCIONES = "\n" + MAPEO_CONCEPTOS + """
 
     IMPORTANTE:
     - NO confundas "docentes" con directores o subdirectores. Son roles diferentes.
@@ -175,20 +90,20 @@ def analizar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None,
     Basándote en tu análisis, genera una estrategia de búsqueda en formato JSON:
 
     ```json
-    {{
+    {
       "tipo_consulta": "informacion" | "filtrado" | "conteo",
       "nombres_posibles": ["nombre1", "nombre2", ...],
       "atributos_solicitados": ["atributo1", "atributo2", ...],
       "condiciones": [
-        {{
+        {
           "campo": "campo1",
           "operador": "=",
           "valor": "valor1"
-        }}
+        }
       ],
       "explicacion": "Explicación de tu estrategia de búsqueda",
       "clave_semantica": "tipo:entidad:atributo"
-    }}
+    }
     ```
 
     Donde:
@@ -201,99 +116,13 @@ def analizar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None,
       * Para consultas sobre personas: "persona:nombre_normalizado:atributo" (ej: "persona:luis_perez:telefono")
       * Para listados: "listado:campo:valor" (ej: "listado:zona:109")
       * Para conteos: "conteo:campo:valor" (ej: "conteo:funcion:directores")
-
-    Responde SOLO con el JSON, sin texto adicional.
-    """
-
-    # Usar la función común para llamar al LLM
-    respuesta = llamar_llm(prompt)
-
-    # Usar la función común para parsear la respuesta JSON
-    try:
-        estrategia = parsear_respuesta_json(respuesta)
-        return estrategia
-    except Exception as e:
-        # Si hay un error en el parseo, devolver un objeto con información del error
-        return {
-            "tipo_consulta": "general",
-            "error": str(e),
-            "respuesta_original": respuesta.text
-        }
-
-def generar_sql_desde_estrategia(estrategia: Dict[str, Any], db_path: str = DB_PATH) -> Dict[str, Any]:
-    """
-    Genera una consulta SQL a partir de una estrategia de búsqueda.
-
-    Args:
-        estrategia (dict): Estrategia de búsqueda
-        db_path (str): Ruta a la base de datos SQLite
-
-    Returns:
-        dict: Consulta SQL y parámetros
-    """
-    # Obtener vista previa de la base de datos
-    vista_previa = obtener_vista_previa_db(db_path)
-
-    # Preparar información de la base de datos
-    db_info = f"""
-    INFORMACIÓN DE LA BASE DE DATOS:
-    - Total de registros: {vista_previa.get('total_registros', 'N/A')}
-    - Columnas disponibles: {', '.join(vista_previa.get('columnas', []))}
-
-    Nombres únicos en la base de datos (muestra):
-    {json.dumps(vista_previa.get('nombres_unicos', []), indent=2, ensure_ascii=False)}
-
-    IMPORTANTE:
-    1. Si en la estrategia se menciona un nombre parcial y solo hay una coincidencia en la base de datos, optimiza la consulta para esa persona específica.
-    2. Si hay múltiples coincidencias posibles, diseña la consulta para encontrar todas y ordenarlas por relevancia.
-    3. Utiliza la información de la base de datos para entender mejor la estructura y el contenido de los datos.
     """
 
-    prompt = f"""
-    Basándote en esta estrategia de búsqueda:
-
-    {json.dumps(estrategia, indent=2)}
-
-    {db_info}
-
-    Genera una consulta SQL para buscar en la tabla 'contactos' con los siguientes campos disponibles:
-    {', '.join(vista_previa.get('columnas', []))}
-
+# Instrucciones estáticas del prompt de generar_sql_desde_estrategia
+_PROMPT_SQL_INSTRUCCIONES = """
     IMPORTANTE: Usa SOLO los campos que existen en la tabla. No inventes campos que no existen.
 
-    MAPEO DE CONCEPTOS A CAMPOS DE LA BASE DE DATOS:
-
-    1. ROLES Y FUNCIONES:
-       - "docentes", "maestros", "profesores" → función_específica = 'DOCENTE FRENTE A GRUPO'
-       - "directores" → función_específica = 'DIRECTOR'
-       - "subdirectores académicos" → función_específica = 'SUBDIRECTOR ACADÉMICO'
-       - "subdirectores de gestión" → función_específica = 'SUBDIRECTOR DE GESTIÓN'
-       - "subdirectores" (genérico) → función_específica IN ('SUBDIRECTOR ACADÉMICO', 'SUBDIRECTOR DE GESTIÓN')
-       - "personal de aula de medios", "encargados de tecnología" → función_específica = 'TICAD'S (AULA DE MEDIOS)'
-       - "veladores", "personal de vigilancia" → función_específica = 'VELADOR'
-       - "ASPE", "personal de apoyo" → función_específica = 'ASPE'
-       - "a qué se dedica", "función", "cargo", "puesto" → función_específica
-
-    2. DATOS DE CONTACTO:
-       - "teléfono", "número", "celular", "móvil" → teléfono_celular, teléfono_particular
-       - "correo", "email", "correo electrónico" → dirección_de_correo_electrónica
-       - "dirección", "domicilio", "dónde vive" → domicilio_particular
-
-    3. DATOS LABORALES:
-       - "centro de trabajo", "escuela", "dónde trabaja" → nombre_del_c_t
-       - "clave del centro de trabajo" → clave_de_c_t_en_el_que_labora
-       - "doble plaza" → el_trabajador_cuenta_con_doble_plaza
-       - "fecha de ingreso", "antigüedad", "cuándo empezó" → fecha_ingreso_a_la_sep
-       - "sector" → sector
-       - "zona" → zona
-
-    4. DATOS ACADÉMICOS:
-       - "estudios", "formación", "preparación" → último_grado_de_estudios
-
-    5. DATOS PERSONALES:
-       - "estado civil", "casado", "soltero" → estado_civil
-       - "CURP" → curp
-       - "RFC" → filiación_o_rfc_con_homonimia
+""" + MAPEO_CONCEPTOS + """
 
     IMPORTANTE:
     - NO uses el campo j_jefe_de_sector_s_supervisor_d_director_sd_subdirector para buscar docentes
@@ -319,6 +148,7 @@ def generar_sql_desde_estrategia(estrategia: Dict[str, Any], db_path: str = DB_P
 
     3. SIEMPRE busca en TODOS los campos relacionados con el tipo de información solicitada
        - Para nombres: nombre_s, apellido_paterno, apellido_materno, nombre_completo, nombre_alternativo
+       - Cuando la consulta devuelva personas, incluye nombre_natural en el SELECT (el nombre ya formateado para mostrar)
        - Para teléfonos: teléfono_particular Y teléfono_celular (ambos campos)
        - Para correos: dirección_de_correo_electrónico
 
@@ -395,152 +225,811 @@ def generar_sql_desde_estrategia(estrategia: Dict[str, Any], db_path: str = DB_P
     Formato de respuesta (solo JSON, sin texto adicional):
 
     ```json
-    {{
+    {
       "sql_query": "TU CONSULTA SQL AQUÍ",
       "parameters": ["parámetro1", "parámetro2", ...],
       "explanation": "Explicación de tu estrategia de búsqueda"
-    }}
+    }
     ```
     """
 
-    # Usar la función común para llamar al LLM
-    respuesta = llamar_llm(prompt)
+# Instrucciones estáticas del prompt de evaluar_resultados
+_PROMPT_EVALUACION_INSTRUCCIONES = """
+    IMPORTANTE SOBRE LA ESTRUCTURA DE NOMBRES:
+    - En español, los nombres completos suelen tener la estructura: [Nombre(s)] [Apellido Paterno] [Apellido Materno]
+    - Sin embargo, en esta base de datos están almacenados como: [Apellido Paterno] [Apellido Materno] [Nombre(s)]
+    - Por ejemplo, "Luis Pérez Ibáñez" está almacenado como "PEREZ IBAÑEZ LUIS"
+    - Cuando el usuario busca "Luis", debe encontrar a "PEREZ IBAÑEZ LUIS" porque "Luis" es su nombre
+    - Cuando el usuario busca "Pérez", debe encontrar a "PEREZ IBAÑEZ LUIS" porque "Pérez" es su apellido paterno
 
-    # Usar la función común para parsear la respuesta JSON
-    try:
-        resultado = parsear_respuesta_json(respuesta)
-        return {
-            "consulta": resultado["sql_query"],
-            "parametros": resultado["parameters"],
-            "explicacion": resultado["explanation"]
-        }
-    except Exception as e:
-        # Si hay un error en el parseo, devolver un objeto con información del error
-        return {
-            "error": str(e),
-            "respuesta_original": respuesta.text
-        }
+""" + MAPEO_ROLES + """
 
-def obtener_vista_previa_db(db_path: str = DB_PATH) -> Dict[str, Any]:
-    """
-    Obtiene una vista previa de la base de datos para proporcionar contexto al LLM.
+    IMPORTANTE SOBRE ROLES EDUCATIVOS:
+    - Si la consulta era sobre "docentes" o "maestros" pero los resultados NO muestran personas con función_específica = "DOCENTE FRENTE A GRUPO", la búsqueda NO es correcta
+    - Si la consulta era sobre "directores" pero los resultados NO muestran personas con función_específica = "DIRECTOR", la búsqueda NO es correcta
+    - Si la consulta era sobre "subdirectores" pero los resultados NO muestran personas con función_específica = "SUBDIRECTOR ACADÉMICO" o "SUBDIRECTOR DE GESTIÓN", la búsqueda NO es correcta
+    - Verifica que los campos utilizados en la búsqueda correspondan correctamente a los conceptos mencionados en la consulta
 
-    Args:
-        db_path (str): Ruta a la base de datos SQLite
+    Evalúa estos resultados:
+    1. ¿Son relevantes para la consulta original?
+    2. ¿Hay demasiados resultados o muy pocos?
+    3. ¿Se encontró la información específica que se buscaba?
+    4. ¿Los resultados son precisos y completos?
+    5. ¿Se interpretó correctamente el nombre mencionado en la consulta?
 
-    Returns:
-        dict: Información sobre la estructura y contenido de la base de datos
-    """
-    try:
-        # Conectar a la base de datos
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    IMPORTANTE PARA RESULTADOS VACÍOS:
+    Si no se encontraron resultados (total = 0), DEBES proporcionar una estrategia alternativa detallada:
 
-        # Obtener estructura de la tabla
-        cursor.execute(f"PRAGMA table_info({DB_TABLE})")
-        columnas = [row["name"] for row in cursor.fetchall()]
+    1. Para búsquedas de nombres:
+       - Si el usuario buscó un nombre completo (como "Luis Pérez"), sugiere buscar solo por el nombre o solo por el apellido
+       - Si el usuario buscó solo un nombre (como "Luis"), sugiere buscar variantes como "Luís", "Luiz", etc.
+       - Sugiere buscar en otros campos como nombre_alternativo
+       - Proporciona una nueva estrategia con condiciones de búsqueda más flexibles
 
-        # Obtener conteo total de registros
-        cursor.execute(f"SELECT COUNT(*) as total FROM {DB_TABLE}")
-        total_registros = cursor.fetchone()["total"]
+    2. Para búsquedas de teléfonos/contactos:
+       - Si el usuario buscó el teléfono de alguien, asegúrate de que la estrategia busque tanto en el campo "telefono" como en "celular"
+       - Sugiere buscar variantes del nombre de la persona
+       - Proporciona una nueva estrategia que busque en ambos campos de teléfono
 
-        # Obtener lista de nombres únicos (para referencia rápida)
-        cursor.execute(f"""
-            SELECT DISTINCT nombre_completo
-            FROM {DB_TABLE}
-            ORDER BY nombre_completo
-            LIMIT {DB_PREVIEW_LIMIT}
-        """)
-        nombres_unicos = [row["nombre_completo"] for row in cursor.fetchall()]
+    3. Para búsquedas por función o cargo:
+       - Si el usuario buscó por una función específica (como "director"), sugiere buscar variantes como "directora", "dirección", etc.
+       - Proporciona una nueva estrategia con términos de búsqueda más amplios
 
-        # Obtener algunos ejemplos de registros
-        cursor.execute(f"SELECT * FROM {DB_TABLE} LIMIT {DB_EXAMPLE_LIMIT}")
-        ejemplos = []
-        for row in cursor.fetchall():
-            ejemplo = {}
-            for key in row.keys():
-                ejemplo[key] = row[key]
-            ejemplos.append(ejemplo)
+    4. Para búsquedas por zona o ubicación:
+       - Si el usuario buscó por una zona específica, sugiere verificar si el formato de la zona es correcto
+       - Proporciona una nueva estrategia con búsqueda más flexible para la zona
 
-        conn.close()
+    IMPORTANTE:
+    - Si no se encontraron resultados pero hay nombres similares en la base de datos, sugiere buscar esos nombres.
+    - Si el usuario buscó un nombre parcial (como "Luis") y hay una única persona con ese nombre en la base de datos, sugiere buscar específicamente a esa persona.
+    - Si hay múltiples personas con nombres similares, sugiere preguntar al usuario para aclarar a cuál se refiere.
+    - Considera que el usuario puede referirse a una persona usando solo su nombre, solo su apellido, o cualquier combinación de estos.
 
-        return {
-            "columnas": columnas,
-            "total_registros": total_registros,
-            "nombres_unicos": nombres_unicos,
-            "ejemplos": ejemplos,
-            "error": None
-        }
-    except Exception as e:
-        return {
-            "error": str(e)
-        }
+    PARA CONSULTAS DE LISTADO:
+    - Si la consulta pide listar múltiples registros, evalúa si se han recuperado todos los registros solicitados.
+    - Si la consulta pide un número específico de registros (como "50 números de teléfono"), verifica que se hayan recuperado exactamente ese número si están disponibles.
+    - Si hay demasiados resultados, sugiere formas de filtrarlos o agruparlos para hacerlos más manejables.
 
-def ejecutar_consulta_llm(consulta_sql: str, parametros: List[Any], db_path: str = DB_PATH) -> Dict[str, Any]:
-    """
-    Ejecuta una consulta SQL generada por el LLM.
+    PRIORIZACIÓN DE MENSAJES RECIENTES:
+    - Si la consulta parece ser una aclaración o refinamiento de una consulta anterior, prioriza la precisión y completitud en la respuesta.
+    - Si el usuario ha hecho varias consultas sobre el mismo tema, sugiere proporcionar una respuesta más detallada y completa.
 
-    Args:
-        consulta_sql (str): Consulta SQL a ejecutar
-        parametros (list): Parámetros para la consulta
-        db_path (str): Ruta a la base de datos SQLite
+    Si los resultados no son satisfactorios, DEBES proporcionar una nueva estrategia de búsqueda completa y detallada.
 
-    Returns:
-        dict: Resultados de la consulta
+    Formato de respuesta (solo JSON, sin texto adicional):
+
+    ```json
+    {
+      "satisfactorio": true | false,
+      "evaluacion": "Tu evaluación de los resultados",
+      "refinamiento": {
+        "sugerencia": "Sugerencia para refinar la búsqueda",
+        "nueva_estrategia": {
+          "tipo_consulta": "informacion | filtrado | conteo",
+          "nombres_posibles": ["nombre1", "nombre2", ...],
+          "atributos_solicitados": ["atributo1", "atributo2", ...],
+          "condiciones": [
+            {
+              "campo": "campo1",
+              "operador": "LIKE",
+              "valor": "valor1"
+            }
+          ],
+          "explicacion": "Explicación de la nueva estrategia de búsqueda"
+        }
+      }
+    }
+    ```
     """
-    try:
-        # Conectar a la base de datos
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
 
-        # Ejecutar consulta
-        cursor = conn.cursor()
-        cursor.execute(consulta_sql, parametros)
+# Instrucciones estáticas del prompt de generar_respuesta_desde_resultados
+_PROMPT_RESPUESTA_INSTRUCCIONES = """
+    Eres un asistente de agenda personal que mantiene una conversación continua con el usuario.
 
-        # Obtener resultados
-        rows = cursor.fetchall()
+    IMPORTANTE SOBRE LOS NOMBRES:
+    - Cada resultado incluye el campo nombre_natural, ya en formato [Nombre(s)] [Apellido Paterno] [Apellido Materno]: úsalo tal cual para referirte a las personas.
+    - La muestra de nombres de la base de datos está en formato [Apellido Paterno] [Apellido Materno] [Nombre(s)]; si mencionas alguno, ponlo en orden natural.
 
-        # Convertir a lista de diccionarios
-        registros = []
-        for row in rows:
-            registro = {}
+""" + MAPEO_CONCEPTOS + """
+
+    IMPORTANTE SOBRE ROLES EDUCATIVOS:
+    - Si la consulta era sobre "docentes" o "maestros", asegúrate de mostrar SOLO personas con función_específica = "DOCENTE FRENTE A GRUPO"
+    - Si la consulta era sobre "directores", asegúrate de mostrar SOLO personas con función_específica = "DIRECTOR"
+    - Si la consulta era sobre "subdirectores", asegúrate de mostrar SOLO personas con función_específica = "SUBDIRECTOR ACADÉMICO" o "SUBDIRECTOR DE GESTIÓN"
+
+    INSTRUCCIONES:
+
+    1. Responde basándote en los RESULTADOS OBTENIDOS Y EN EL CONTEXTO ANTERIOR si es relevante.
+    2. Habla de forma natural y conversacional, como lo haría una persona real.
+    3. Mantén un tono amable, servicial y ligeramente informal.
+    4. Si no hay resultados relevantes en la consulta actual PERO la información aparece en respuestas anteriores, USA ESA INFORMACIÓN.
+    5. Si hay múltiples resultados, SOLO MUESTRA LOS MÁS RELEVANTES para la consulta.
+       - Si el usuario pregunta por una persona específica (ej: "teléfono de Luis Pérez"), SOLO muestra información de esa persona exacta.
+       - NUNCA incluyas información de otras personas que solo coincidan parcialmente con el nombre (ej: si buscan "Luis Pérez", no incluyas a "Claudia Pérez").
+       - Solo menciona otras personas si hay ambigüedad real (ej: hay dos "Luis Pérez" diferentes) o si el usuario explícitamente pide listar varias personas.
+    6. NO uses fórmulas repetitivas como "Según los datos..." o "La información indica...".
+    7. NO preguntes "¿Necesitas algo más?" o "¿Te puedo ayudar con algo más?".
+    8. Si la evaluación indica que los resultados no son satisfactorios, busca en el contexto anterior si ya proporcionaste esa información.
+    9. MANTÉN CONSISTENCIA con tus respuestas anteriores. Si antes dijiste que una persona tiene cierta información, no puedes decir ahora que no la tienes.
+
+    IMPORTANTE PARA NOMBRES:
+    - Entiende que "Luis", "Pérez", "Ibáñez", "Luis Pérez", "Pérez Ibáñez" y "Luis Pérez Ibáñez" se refieren a la misma persona.
+    - Si no se encontraron resultados pero hay nombres similares en la base de datos, sugiere buscar esos nombres.
+    - Si hay múltiples personas con nombres similares, pregunta al usuario a cuál se refiere, proporcionando las opciones disponibles.
+
+    INSTRUCCIONES PARA CONSULTAS DE LISTADO:
+    - Si la consulta pide listar múltiples registros (como "dame todos los números de teléfono" o "muestra todos los docentes"),
+      proporciona ABSOLUTAMENTE TODOS los resultados solicitados de manera clara y estructurada.
+    - NUNCA omitas resultados ni digas "entre otros" o "por ejemplo". Muestra TODOS los resultados.
+    - Para listas largas, usa SIEMPRE este formato consistente:
+
+      1. Nombre: Juan Pérez - Teléfono: 123456789
+      2. Nombre: María López - Teléfono: 987654321
+
+    - Sé EXTREMADAMENTE PRECISO con los datos numéricos. Si hay 20 docentes en la zona 109, muestra los 20.
+    - Si la consulta pide "todos" los registros de cierto tipo, proporciona el número total y luego lista TODOS los registros.
+    - Prioriza la precisión y completitud sobre la conversacionalidad para consultas de listado masivo.
+    - EVITA DUPLICAR TEXTO en tus respuestas. Revisa tu respuesta antes de enviarla para asegurarte de que no hay texto duplicado.
+    - Usa un formato CONSISTENTE para todas las entradas de la lista. No cambies el formato a mitad de la lista.
+    """
+
+# Instrucciones estáticas del prompt de evaluar_y_responder: las de la respuesta
+# más una evaluación resumida, con un único JSON como salida
+_PROMPT_EVALUACION_RESPUESTA_INSTRUCCIONES = _PROMPT_RESPUESTA_INSTRUCCIONES + """
+    ADEMÁS DE RESPONDER, EVALÚA LOS RESULTADOS:
+    1. ¿Son relevantes para la consulta original?
+    2. ¿Hay demasiados resultados o muy pocos?
+    3. ¿Se encontró la información específica que se buscaba?
+    4. ¿Los resultados son precisos y completos?
+    5. ¿Se interpretó correctamente el nombre mencionado en la consulta?
+
+    - Si la consulta era sobre "docentes", "directores" o "subdirectores" pero los resultados NO muestran personas con la función_específica correspondiente, la búsqueda NO es correcta.
+    - Si la consulta pide listar múltiples registros, evalúa si se han recuperado todos los registros solicitados.
+    - Si los resultados no son satisfactorios, DEBES proporcionar una nueva estrategia de búsqueda completa y detallada.
+
+    Formato de respuesta (solo JSON, sin texto adicional):
+
+    ```json
+    {
+      "evaluacion": {
+        "satisfactorio": true | false,
+        "evaluacion": "Tu evaluación de los resultados",
+        "refinamiento": {
+          "sugerencia": "Sugerencia para refinar la búsqueda",
+          "nueva_estrategia": {
+            "tipo_consulta": "informacion | filtrado | conteo",
+            "nombres_posibles": ["nombre1", "nombre2", ...],
+            "atributos_solicitados": ["atributo1", "atributo2", ...],
+            "condiciones": [
+              {
+                "campo": "campo1",
+                "operador": "LIKE",
+                "valor": "valor1"
+              }
+            ],
+            "explicacion": "Explicación de la nueva estrategia de búsqueda"
+          }
+        }
+      },
+      "respuesta": "Tu respuesta natural y humana para el usuario (usa \\n para los saltos de línea)"
+    }
+    ```
+    """
+
+def _ventana_historial(historial_consultas: List[str], historial_respuestas: List[str]) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Selecciona los últimos MAX_HISTORY_TURNS intercambios del historial, para
+    que el prompt no crezca sin límite con la duración de la conversación.
+
+    Args:
+        historial_consultas (list): Consultas anteriores
+        historial_respuestas (list): Respuestas anteriores
+
+    Returns:
+        tuple: (pares, omitidos)
+            - pares: Lista de (consulta, respuesta) más recientes
+            - omitidos: Número de intercambios anteriores descartados
+    """
+    omitidos = max(0, len(historial_respuestas) - MAX_HISTORY_TURNS)
+    pares = [
+        (historial_consultas[i] if i < len(historial_consultas) else "", historial_respuestas[i])
+        for i in range(omitidos, len(historial_respuestas))
+    ]
+    return pares, omitidos
+
+def _nota_historial_omitido(omitidos: int, mostrados: int) -> str:
+    """
+    Genera la nota que indica al LLM que el historial se recortó.
+
+    Args:
+        omitidos (int): Intercambios descartados
+        mostrados (int): Intercambios incluidos
+
+    Returns:
+        str: Nota para el prompt, o cadena vacía si no se omitió nada
+    """
+    if not omitidos:
+        return ""
+    return f"""
+        (Se omitieron {omitidos} intercambios anteriores; se muestran los {mostrados} más recientes)
+        """
+
+def analizar_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None, db_path: str = DB_PATH) -> Dict[str, Any]:
+    """
+    Analiza una consulta en lenguaje natural y genera una estrategia de búsqueda.
+
+    Args:
+        consulta (str): Consulta del usuario
+        contexto (dict, optional): Contexto de la consulta anterior
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        dict: Estrategia de búsqueda con información sobre nombres, atributos, etc.
+    """
+    # Obtener vista previa de la base de datos
+    vista_previa = obtener_vista_previa_db(db_path)
+
+    # Preparar información de contexto si existe
+    contexto_texto = ""
+    if contexto:
+        contexto_texto = f"""
+        CONTEXTO DE LA CONSULTA ANTERIOR:
+        - Consulta anterior: "{contexto.get('consulta_anterior', '')}"
+        - Respuesta anterior: "{contexto.get('respuesta_anterior', '')}"
+
+        Resultados anteriores:
+        {serializar_json(contexto.get('resultados_anteriores', []))}
+
+        IMPORTANTE SOBRE EL CONTEXTO:
+        1. Si la consulta actual parece ser una pregunta de seguimiento (por ejemplo, usa pronombres como "su", "él", "ella" o es muy corta),
+           utiliza el contexto anterior para determinar a qué persona se refiere.
+        2. Si la consulta actual pide información que ya se proporcionó en respuestas anteriores, DEBES usar esa información.
+        3. Mantén CONSISTENCIA con las respuestas anteriores. Si antes dijiste que una persona tiene cierta información,
+           no puedes decir ahora que no la tiene.
+        4. Analiza la respuesta anterior para extraer información relevante que pueda ser útil para la consulta actual.
+        5. Si la consulta actual es sobre un atributo específico (como dirección, teléfono, etc.) y ese atributo
+           aparece en la respuesta anterior, DEBES usar esa información.
+        """
+
+    # Preparar información de la base de datos
+    db_info = f"""
+    INFORMACIÓN DE LA BASE DE DATOS:
+    - Total de registros: {vista_previa.get('total_registros', 'N/A')}
+    - Columnas disponibles: {', '.join(vista_previa.get('columnas', []))}
+
+    Nombres únicos en la base de datos (muestra):
+    {vista_previa.get('nombres_unicos_json', '[]')}
+
+    Ejemplos de registros:
+    {vista_previa.get('ejemplos_json', '[]')}
+
+    IMPORTANTE:
+    1. Si el usuario menciona un nombre parcial (por ejemplo, solo "Luis") y solo hay una persona con ese nombre en la base de datos, asume que se refiere a esa persona.
+    2. Si hay múltiples personas con ese nombre parcial, considera todas las posibilidades y sugiere preguntar al usuario para aclarar.
+    3. Utiliza la información de la base de datos para entender mejor la estructura y el contenido de los datos.
+    """
+
+    # Extraer información de respuestas anteriores si existe
+    info_respuestas_anteriores = ""
+    if contexto and "historial_respuestas" in contexto and len(contexto["historial_respuestas"]) > 0:
+        # Analizar las respuestas anteriores para extraer información relevante
+        info_respuestas_anteriores = f"""
+        INFORMACIÓN EXTRAÍDA DE RESPUESTAS ANTERIORES:
+
+        He analizado las respuestas anteriores y he encontrado la siguiente información relevante:
+        """
+
+        # Buscar patrones comunes en las respuestas anteriores (solo las más recientes)
+        pares, omitidos = _ventana_historial(contexto.get("historial_consultas", []), contexto["historial_respuestas"])
+        info_respuestas_anteriores += _nota_historial_omitido(omitidos, len(pares))
+        for consulta_correspondiente, respuesta in pares:
+            info_respuestas_anteriores += f"""
+            Consulta: "{consulta_correspondiente}"
+            Respuesta: "{respuesta}"
+            """
+
+    # Las instrucciones estáticas se envían como instrucciones de sistema para que
+    # sean idénticas entre llamadas y aprovechen el caché de prompts de Gemini
+    prompt = f"""{db_info}
+
+    Analiza esta consulta sobre una agenda de contactos:
+
+    Consulta: {consulta}
+
+    {contexto_texto}
+
+    {info_respuestas_anteriores}
+
+    Responde SOLO con el JSON, sin texto adicional.
+    """
+
+    # Usar la función común para llamar al LLM
+    respuesta = llamar_llm(
+        prompt,
+        system_instruction=_PROMPT_ANALISIS_INSTRUCCIONES,
+        cached_content=context_cache.obtener(_PROMPT_ANALISIS_INSTRUCCIONES)
+    )
+
+    # Leer el texto de la respuesta una sola vez (cada acceso a .text lo vuelve a decodificar)
+    texto_respuesta = respuesta.text
+
+    # Usar la función común para parsear la respuesta JSON
+    try:
+        estrategia = parsear_respuesta_json(texto_respuesta)
+        return estrategia
+    except Exception as e:
+        # Si hay un error en el parseo, devolver un objeto con información del error
+        return {
+            "tipo_consulta": "general",
+            "error": str(e),
+            "respuesta_original": texto_respuesta
+        }
+
+def generar_sql_desde_estrategia(estrategia: Dict[str, Any], db_path: str = DB_PATH, estrategia_json: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Genera una consulta SQL a partir de una estrategia de búsqueda.
+
+    Args:
+        estrategia (dict): Estrategia de búsqueda
+        db_path (str): Ruta a la base de datos SQLite
+        estrategia_json (str, optional): Estrategia ya serializada con serializar_json
+
+    Returns:
+        dict: Consulta SQL y parámetros
+    """
+    # Obtener vista previa de la base de datos
+    vista_previa = obtener_vista_previa_db(db_path)
+
+    # Preparar información de la base de datos
+    db_info = f"""
+    INFORMACIÓN DE LA BASE DE DATOS:
+    - Total de registros: {vista_previa.get('total_registros', 'N/A')}
+    - Columnas disponibles: {', '.join(vista_previa.get('columnas', []))}
+
+    Nombres únicos en la base de datos (muestra):
+    {vista_previa.get('nombres_unicos_json', '[]')}
+
+    IMPORTANTE:
+    1. Si en la estrategia se menciona un nombre parcial y solo hay una coincidencia en la base de datos, optimiza la consulta para esa persona específica.
+    2. Si hay múltiples coincidencias posibles, diseña la consulta para encontrar todas y ordenarlas por relevancia.
+    3. Utiliza la información de la base de datos para entender mejor la estructura y el contenido de los datos.
+    """
+
+    # Si existe el índice de texto completo, pedir búsquedas de nombres con MATCH en lugar de LIKE '%...%'
+    columnas_fts = vista_previa.get('columnas_fts', [])
+    if columnas_fts:
+        db_info += f"""
+    BÚSQUEDA DE NOMBRES CON ÍNDICE DE TEXTO COMPLETO:
+    - Existe la tabla virtual contactos_fts (FTS5) sobre las columnas: {', '.join(columnas_fts)}. Su rowid es el id de contactos.
+    - Para filtrar personas por nombre, prefiere: id IN (SELECT rowid FROM contactos_fts WHERE contactos_fts MATCH 'LUIS AND PEREZ') en lugar de LIKE '%LUIS%PEREZ%'.
+    - MATCH ignora mayúsculas y acentos; usa un asterisco para nombres parciales (por ejemplo 'LUI*').
+    - Mantén el cálculo de relevancia con CASE WHEN y LIKE, pero usa MATCH en el WHERE.
+    """
+
+    # Reutilizar la estrategia serializada si ya se calculó en un paso anterior
+    if estrategia_json is None:
+        estrategia_json = serializar_json(estrategia)
+
+    # Las instrucciones estáticas se envían como instrucciones de sistema para que
+    # sean idénticas entre llamadas y aprovechen el caché de prompts de Gemini
+    prompt = f"""{db_info}
+
+    Genera una consulta SQL para buscar en la tabla 'contactos' con los siguientes campos disponibles:
+    {', '.join(vista_previa.get('columnas', []))}
+
+    Basándote en esta estrategia de búsqueda:
+
+    {estrategia_json}
+
+    Responde SOLO con el JSON en el formato indicado, sin texto adicional.
+    """
+
+    # Usar la función común para llamar al LLM
+    respuesta = llamar_llm(
+        prompt,
+        system_instruction=_PROMPT_SQL_INSTRUCCIONES,
+        cached_content=context_cache.obtener(_PROMPT_SQL_INSTRUCCIONES)
+    )
+
+    # Leer el texto de la respuesta una sola vez (cada acceso a .text lo vuelve a decodificar)
+    texto_respuesta = respuesta.text
+
+    # Usar la función común para parsear la respuesta JSON
+    try:
+        resultado = parsear_respuesta_json(texto_respuesta)
+        return {
+            "consulta": resultado["sql_query"],
+            "parametros": resultado["parameters"],
+            "explicacion": resultado["explanation"]
+        }
+    except Exception as e:
+        # Si hay un error en el parseo, devolver un objeto con información del error
+        return {
+            "error": str(e),
+            "respuesta_original": texto_respuesta
+        }
+
+# Vistas previas ya calculadas: db_path -> (fecha de modificación de la base de datos, expiración, vista previa)
+_vistas_previas = {}
+
+def obtener_vista_previa_db(db_path: str = DB_PATH) -> Dict[str, Any]:
+    """
+    Obtiene una vista previa de la base de datos para proporcionar contexto al LLM.
+
+    La vista previa se reutiliza durante DB_PREVIEW_TTL segundos mientras la
+    base de datos no cambie, en lugar de consultarla en cada paso del flujo.
+
+    Args:
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        dict: Información sobre la estructura y contenido de la base de datos
+    """
+    try:
+        mtime = os.path.getmtime(db_path)
+    except OSError:
+        mtime = None
+
+    ahora = time.time()
+    entrada = _vistas_previas.get(db_path)
+    if entrada is not None and entrada[0] == mtime and entrada[1] > ahora:
+        return entrada[2]
+
+    vista_previa = _consultar_vista_previa_db(db_path)
+
+    # No guardar errores, para reintentar en la siguiente llamada
+    if vista_previa.get("error") is None:
+        _vistas_previas[db_path] = (mtime, ahora + DB_PREVIEW_TTL, vista_previa)
+
+    return vista_previa
+
+def _consultar_vista_previa_db(db_path: str) -> Dict[str, Any]:
+    """
+    Consulta la base de datos para construir la vista previa.
+
+    Args:
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        dict: Información sobre la estructura y contenido de la base de datos
+    """
+    try:
+        # Conectar a la base de datos
+        cursor = obtener_conexion_lectura(db_path).cursor()
+        cursor.row_factory = sqlite3.Row
+
+        # Obtener estructura de la tabla
+        cursor.execute(f"PRAGMA table_info({DB_TABLE})")
+        columnas = [row["name"] for row in cursor.fetchall()]
+
+        # Obtener conteo total de registros
+        cursor.execute(f"SELECT COUNT(*) as total FROM {DB_TABLE}")
+        total_registros = cursor.fetchone()["total"]
+
+        # Obtener lista de nombres únicos (para referencia rápida)
+        cursor.execute(f"""
+            SELECT DISTINCT nombre_completo
+            FROM {DB_TABLE}
+            ORDER BY nombre_completo
+            LIMIT {DB_PREVIEW_LIMIT}
+        """)
+        nombres_unicos = [row["nombre_completo"] for row in cursor.fetchall()]
+
+        # Obtener columnas de la tabla de texto completo, si existe
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'contactos_fts'")
+        if cursor.fetchone():
+            cursor.execute("PRAGMA table_info(contactos_fts)")
+            columnas_fts = [row["name"] for row in cursor.fetchall()]
+        else:
+            columnas_fts = []
+
+        # Obtener algunos ejemplos de registros
+        cursor.execute(f"SELECT * FROM {DB_TABLE} LIMIT {DB_EXAMPLE_LIMIT}")
+        ejemplos = []
+        for row in cursor.fetchall():
+            ejemplo = {}
             for key in row.keys():
-                registro[key] = row[key]
-            registros.append(registro)
+                ejemplo[key] = row[key]
+            ejemplos.append(ejemplo)
+
+        cursor.close()
+
+        return {
+            "columnas": columnas,
+            "total_registros": total_registros,
+            "nombres_unicos": nombres_unicos,
+            "ejemplos": ejemplos,
+            "columnas_fts": columnas_fts,
+            # Versiones serializadas para los prompts, calculadas una sola vez
+            "nombres_unicos_json": serializar_json(nombres_unicos),
+            "ejemplos_json": serializar_json(ejemplos),
+            "error": None
+        }
+    except Exception as e:
+        return {
+            "error": str(e)
+        }
+
+def ejecutar_consulta_llm(consulta_sql: str, parametros: List[Any], db_path: str = DB_PATH) -> Dict[str, Any]:
+    """
+    Ejecuta una consulta SQL generada por el LLM.
+
+    Args:
+        consulta_sql (str): Consulta SQL a ejecutar
+        parametros (list): Parámetros para la consulta
+        db_path (str): Ruta a la base de datos SQLite
+
+    Returns:
+        dict: Resultados de la consulta en formato columnar:
+            - columnas: Nombres de las columnas
+            - filas: Lista de tuplas con los valores de cada fila
+            - total: Total real de registros que coinciden
+            - error: Mensaje de error (None si no hay errores)
+    """
+    try:
+        # Reutilizar el resultado si la misma consulta ya se ejecutó sobre la misma base de datos
+        resultado_cache = sql_cache.get(consulta_sql, parametros, db_path)
+        if resultado_cache is not None:
+            return resultado_cache
+
+        # Conexión en modo solo lectura: el SQL viene del LLM
+        conn = obtener_conexion_lectura(db_path)
+
+        # Ejecutar consulta
+        cursor = conn.cursor()
+        cursor.execute(consulta_sql, parametros)
+
+        # Obtener resultados como tuplas; los diccionarios se construyen solo cuando se necesitan
+        columnas = [desc[0] for desc in cursor.description] if cursor.description else []
+
+        # Leer por lotes sin superar el máximo de filas, aunque la consulta no
+        # tenga LIMIT: como mucho se lee una fila más para saber si hay más
+        filas = []
+        while len(filas) <= SQL_MAX_FILAS:
+            lote = cursor.fetchmany(min(SQL_FETCH_BATCH, SQL_MAX_FILAS + 1 - len(filas)))
+            if not lote:
+                break
+            filas.extend(lote)
+        truncado = len(filas) > SQL_MAX_FILAS
+        del filas[SQL_MAX_FILAS:]
 
         # Obtener el total real de registros que coinciden con la consulta
         # Esto es importante para consultas que usan LIMIT
-        total_real = len(registros)
+        total_real = len(filas)
 
-        # Si la consulta contiene LIMIT, intentamos obtener el total real sin el límite
-        if "LIMIT" in consulta_sql.upper():
+        # Si la consulta contiene LIMIT o se truncó, intentamos obtener el total real sin el límite
+        if truncado or "LIMIT" in consulta_sql.upper():
             try:
                 # Crear una consulta para contar el total sin el límite
                 count_sql = f"SELECT COUNT(*) as total FROM ({consulta_sql.split('LIMIT')[0].strip()}) as subquery"
                 cursor.execute(count_sql, parametros)
                 count_result = cursor.fetchone()
-                if count_result and "total" in dict(count_result):
-                    total_real = dict(count_result)["total"]
+                if count_result:
+                    total_real = count_result[0]
             except:
                 # Si falla, usamos el total de registros obtenidos
                 pass
 
-        conn.close()
+        cursor.close()
 
-        return {
+        resultado = {
             "total": total_real,
-            "registros": registros,
+            "columnas": columnas,
+            "filas": filas,
             "error": None
         }
+        sql_cache.set(consulta_sql, parametros, db_path, resultado)
+
+        return resultado
     except Exception as e:
         return {
             "total": 0,
-            "registros": [],
+            "columnas": [],
+            "filas": [],
             "error": str(e)
         }
 
-def evaluar_resultados(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], db_path: str = DB_PATH) -> Dict[str, Any]:
+def filas_a_registros(resultados: Dict[str, Any], limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Convierte las filas de un resultado columnar a una lista de diccionarios.
+
+    Args:
+        resultados (dict): Resultado de ejecutar_consulta_llm
+        limite (int, optional): Número máximo de filas a convertir
+
+    Returns:
+        list: Registros como diccionarios columna -> valor
+    """
+    columnas = resultados.get("columnas", [])
+    filas = resultados.get("filas", [])
+    if limite is not None:
+        filas = filas[:limite]
+    return [dict(zip(columnas, fila)) for fila in filas]
+
+# Términos de búsqueda de cada atributo: el atributo normalizado (minúsculas,
+# sin acentos y con guiones bajos) -> su clave de ATTRIBUTE_MAPPING y todos los
+# sinónimos de esa clave, calculados una sola vez al importar el módulo
+_TERMINOS_ATRIBUTO = {}
+for _clave, _sinonimos in ATTRIBUTE_MAPPING.items():
+    _terminos = frozenset([_clave] + [normalizar_texto(s).replace(" ", "_") for s in _sinonimos])
+    for _termino in _terminos:
+        _TERMINOS_ATRIBUTO[_termino] = _TERMINOS_ATRIBUTO.get(_termino, frozenset()) | _terminos
+
+def _indices_columnas_relevantes(columnas: List[str], atributos: List[str]) -> List[int]:
+    """
+    Selecciona las columnas de un resultado que corresponden a los atributos solicitados,
+    además de id y nombre_completo.
+
+    Los atributos del LLM son conceptos ("telefono", "direccion"), no nombres de columna,
+    así que se amplían con los sinónimos de ATTRIBUTE_MAPPING y se buscan como
+    subcadenas del nombre normalizado de cada columna.
+
+    Args:
+        columnas (list): Columnas del resultado
+        atributos (list): Atributos solicitados en la estrategia
+
+    Returns:
+        list: Índices de las columnas a conservar (todas si no se puede proyectar)
+    """
+    terminos = set()
+    for atributo in atributos:
+        atributo_norm = normalizar_texto(str(atributo)).replace(" ", "_")
+        terminos.add(atributo_norm)
+        terminos.update(_TERMINOS_ATRIBUTO.get(atributo_norm, ()))
+
+    # Los términos muy cortos coincidirían con demasiadas columnas
+    terminos = [t for t in terminos if len(t) >= 4]
+    indices_atributos = [
+        i for i, columna in enumerate(map(normalizar_texto, columnas))
+        if any(t in columna for t in terminos)
+    ]
+    if not indices_atributos:
+        return list(range(len(columnas)))
+
+    fijas = [i for i, columna in enumerate(columnas) if columna in ("id", "nombre_completo")]
+    return sorted(set(fijas) | set(indices_atributos))
+
+def _formatear_historial_respuestas(estrategia: Dict[str, Any]) -> str:
+    """
+    Formatea el historial de consultas y respuestas anteriores para el prompt.
+
+    Args:
+        estrategia (dict): Estrategia de búsqueda con el historial
+
+    Returns:
+        str: Bloque de historial, o cadena vacía si no hay historial
+    """
+    info_respuestas_anteriores = ""
+    if "historial_respuestas" in estrategia and len(estrategia["historial_respuestas"]) > 0:
+        info_respuestas_anteriores = f"""
+        HISTORIAL DE CONSULTAS Y RESPUESTAS:
+        """
+
+        # Incluir historial de consultas y respuestas (solo las más recientes)
+        pares, omitidos = _ventana_historial(estrategia.get("historial_consultas", []), estrategia["historial_respuestas"])
+        info_respuestas_anteriores += _nota_historial_omitido(omitidos, len(pares))
+        for consulta_correspondiente, respuesta in pares:
+            info_respuestas_anteriores += f"""
+            Consulta: "{consulta_correspondiente}"
+            Respuesta: "{respuesta}"
+            """
+
+    return info_respuestas_anteriores
+
+def _preparar_resultados_respuesta(resultados: Dict[str, Any], estrategia: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Filtra los resultados más relevantes y los limita para incluirlos en el prompt.
+
+    Args:
+        resultados (dict): Resultados de la consulta SQL
+        estrategia (dict): Estrategia de búsqueda utilizada
+
+    Returns:
+        list: Registros proyectados a los campos solicitados (más nombre e id)
+    """
+    columnas = resultados.get("columnas", [])
+    filas_filtradas = resultados.get("filas", [])
+
+    # Si es una consulta de información sobre una persona específica,
+    # ordenar por relevancia si existe ese campo
+    if (estrategia.get("tipo_consulta") == "informacion" and estrategia.get("nombres_posibles")
+            and filas_filtradas and "relevancia" in columnas):
+        idx_relevancia = columnas.index("relevancia")
+
+        def relevancia(fila):
+            return fila[idx_relevancia] or 0
+
+        # Solo incluir resultados con al menos 80% de la relevancia máxima; de ellos
+        # solo se muestran los MAX_RESULTS_DISPLAY más relevantes, así que se
+        # seleccionan con un montículo en lugar de ordenar todas las filas
+        umbral = max(map(relevancia, filas_filtradas)) * 0.8
+        candidatas = [f for f in filas_filtradas if relevancia(f) >= umbral]
+        filas_filtradas = heapq.nlargest(MAX_RESULTS_DISPLAY, candidatas, key=relevancia)
+
+    # Limitar el número de resultados y proyectar solo los campos solicitados
+    # (más nombre e id), omitiendo valores vacíos, para evitar tokens excesivos.
+    # Las distintas columnas de nombre se sustituyen por nombre_natural, que el
+    # LLM puede usar tal cual sin reordenar apellidos y nombres
+    atributos = estrategia.get("atributos_solicitados") or []
+    indices = _indices_columnas_relevantes(columnas, atributos) if atributos else range(len(columnas))
+    indices = [i for i in indices if columnas[i] not in COLUMNAS_NOMBRE and columnas[i] not in COLUMNAS_NORMALIZADAS]
+    indices_nombre = [i for i, columna in enumerate(columnas) if columna in COLUMNAS_NOMBRE]
+
+    registros = []
+    for fila in filas_filtradas[:MAX_RESULTS_DISPLAY]:
+        registro = {}
+        if indices_nombre:
+            nombre = nombre_natural({columnas[i]: fila[i] for i in indices_nombre})
+            if nombre:
+                registro["nombre_natural"] = nombre
+        registro.update({columnas[i]: fila[i] for i in indices if fila[i] is not None and fila[i] != ""})
+        registros.append(registro)
+    return registros
+
+def _limpiar_respuesta(texto_respuesta: str) -> str:
+    """
+    Elimina las líneas duplicadas de una respuesta del LLM.
+
+    Args:
+        texto_respuesta (str): Texto de la respuesta
+
+    Returns:
+        str: Respuesta sin líneas duplicadas
+    """
+    # dict.fromkeys conserva el orden y comprueba duplicados en O(1) por línea
+    return '\n'.join(dict.fromkeys(texto_respuesta.strip().split('\n')))
+
+def generar_respuesta_directa(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], max_refinamientos: int = 0) -> Optional[str]:
+    """
+    Genera sin llamar al LLM la respuesta de los casos triviales:
+    - Sin resultados, sin refinamientos pendientes y sin historial que consultar
+    - Un único registro para una consulta de información sobre un solo atributo
+
+    Args:
+        consulta_original (str): Consulta original del usuario
+        resultados (dict): Resultados de la consulta SQL
+        estrategia (dict): Estrategia de búsqueda utilizada
+        max_refinamientos (int): Refinamientos automáticos que aún se pueden intentar
+
+    Returns:
+        str: Respuesta generada, o None si el caso requiere al LLM
+    """
+    total = resultados.get("total", 0)
+
+    if total == 0:
+        # Con refinamientos pendientes la evaluación del LLM propone una nueva
+        # estrategia, y con historial la respuesta puede estar en intercambios anteriores
+        if max_refinamientos > 0 or estrategia.get("historial_respuestas"):
+            return None
+        return "No encontré resultados para tu consulta. ¿Podrías intentar con otra búsqueda?"
+
+    atributos = estrategia.get("atributos_solicitados") or []
+    if total != 1 or estrategia.get("tipo_consulta") != "informacion" or len(atributos) != 1:
+        return None
+
+    columnas = resultados.get("columnas", [])
+    filas = resultados.get("filas", [])
+    if len(filas) != 1:
+        return None
+
+    indices = _indices_columnas_relevantes(columnas, atributos)
+    if len(indices) == len(columnas):
+        # El atributo no corresponde a ninguna columna concreta
+        return None
+
+    nombre = nombre_natural(dict(zip(columnas, filas[0])))
+    valores = [
+        f"{columnas[i].replace('_', ' ').capitalize()}: {filas[0][i]}"
+        for i in indices
+        if columnas[i] != "id" and columnas[i] not in COLUMNAS_NOMBRE and columnas[i] not in COLUMNAS_NORMALIZADAS
+        and filas[0][i] is not None and filas[0][i] != ""
+    ]
+    if not nombre or not valores:
+        return None
+
+    return f"Encontré la siguiente información para {nombre}: {', '.join(valores)}."
+
+def evaluar_resultados(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], db_path: str = DB_PATH, estrategia_json: Optional[str] = None) -> Dict[str, Any]:
     """
     Evalúa los resultados de una consulta y sugiere refinamientos si es necesario.
 
@@ -549,6 +1038,7 @@ def evaluar_resultados(consulta_original: str, resultados: Dict[str, Any], estra
         resultados (dict): Resultados de la consulta SQL
         estrategia (dict): Estrategia de búsqueda utilizada
         db_path (str): Ruta a la base de datos SQLite
+        estrategia_json (str, optional): Estrategia ya serializada con serializar_json
 
     Returns:
         dict: Evaluación de los resultados y posibles refinamientos
@@ -563,145 +1053,81 @@ def evaluar_resultados(consulta_original: str, resultados: Dict[str, Any], estra
     - Columnas disponibles: {', '.join(vista_previa.get('columnas', []))}
 
     Nombres únicos en la base de datos (muestra):
-    {json.dumps(vista_previa.get('nombres_unicos', []), indent=2, ensure_ascii=False)}
+    {vista_previa.get('nombres_unicos_json', '[]')}
     """
 
-    prompt = f"""
+    # Reutilizar la estrategia serializada si ya se calculó en un paso anterior
+    if estrategia_json is None:
+        estrategia_json = serializar_json(estrategia)
+
+    # Las instrucciones estáticas se envían como instrucciones de sistema para que
+    # sean idénticas entre llamadas y aprovechen el caché de prompts de Gemini
+    prompt = f"""{db_info}
+
     Consulta original del usuario: "{consulta_original}"
 
     Estrategia de búsqueda utilizada:
-    {json.dumps(estrategia, indent=2)}
+    {estrategia_json}
 
     Resultados obtenidos ({resultados["total"]} registros en total):
-    {json.dumps(resultados["registros"][:50] if len(resultados["registros"]) > 50 else resultados["registros"], indent=2)}
-
-    {db_info}
-
-    IMPORTANTE SOBRE LA ESTRUCTURA DE NOMBRES:
-    - En español, los nombres completos suelen tener la estructura: [Nombre(s)] [Apellido Paterno] [Apellido Materno]
-    - Sin embargo, en esta base de datos están almacenados como: [Apellido Paterno] [Apellido Materno] [Nombre(s)]
-    - Por ejemplo, "Luis Pérez Ibáñez" está almacenado como "PEREZ IBAÑEZ LUIS"
-    - Cuando el usuario busca "Luis", debe encontrar a "PEREZ IBAÑEZ LUIS" porque "Luis" es su nombre
-    - Cuando el usuario busca "Pérez", debe encontrar a "PEREZ IBAÑEZ LUIS" porque "Pérez" es su apellido paterno
-
-    MAPEO DE CONCEPTOS A CAMPOS DE LA BASE DE DATOS:
-
-    1. ROLES Y FUNCIONES:
-       - "docentes", "maestros", "profesores" → función_específica = 'DOCENTE FRENTE A GRUPO'
-       - "directores" → función_específica = 'DIRECTOR'
-       - "subdirectores académicos" → función_específica = 'SUBDIRECTOR ACADÉMICO'
-       - "subdirectores de gestión" → función_específica = 'SUBDIRECTOR DE GESTIÓN'
-       - "subdirectores" (genérico) → función_específica IN ('SUBDIRECTOR ACADÉMICO', 'SUBDIRECTOR DE GESTIÓN')
-       - "personal de aula de medios", "encargados de tecnología" → función_específica = 'TICAD'S (AULA DE MEDIOS)'
-       - "veladores", "personal de vigilancia" → función_específica = 'VELADOR'
-       - "ASPE", "personal de apoyo" → función_específica = 'ASPE'
-
-    IMPORTANTE SOBRE ROLES EDUCATIVOS:
-    - Si la consulta era sobre "docentes" o "maestros" pero los resultados NO muestran personas con función_específica = "DOCENTE FRENTE A GRUPO", la búsqueda NO es correcta
-    - Si la consulta era sobre "directores" pero los resultados NO muestran personas con función_específica = "DIRECTOR", la búsqueda NO es correcta
-    - Si la consulta era sobre "subdirectores" pero los resultados NO muestran personas con función_específica = "SUBDIRECTOR ACADÉMICO" o "SUBDIRECTOR DE GESTIÓN", la búsqueda NO es correcta
-    - Verifica que los campos utilizados en la búsqueda correspondan correctamente a los conceptos mencionados en la consulta
-
-    Evalúa estos resultados:
-    1. ¿Son relevantes para la consulta original?
-    2. ¿Hay demasiados resultados o muy pocos?
-    3. ¿Se encontró la información específica que se buscaba?
-    4. ¿Los resultados son precisos y completos?
-    5. ¿Se interpretó correctamente el nombre mencionado en la consulta?
-
-    IMPORTANTE PARA RESULTADOS VACÍOS:
-    Si no se encontraron resultados (total = 0), DEBES proporcionar una estrategia alternativa detallada:
-
-    1. Para búsquedas de nombres:
-       - Si el usuario buscó un nombre completo (como "Luis Pérez"), sugiere buscar solo por el nombre o solo por el apellido
-       - Si el usuario buscó solo un nombre (como "Luis"), sugiere buscar variantes como "Luís", "Luiz", etc.
-       - Sugiere buscar en otros campos como nombre_alternativo
-       - Proporciona una nueva estrategia con condiciones de búsqueda más flexibles
-
-    2. Para búsquedas de teléfonos/contactos:
-       - Si el usuario buscó el teléfono de alguien, asegúrate de que la estrategia busque tanto en el campo "telefono" como en "celular"
-       - Sugiere buscar variantes del nombre de la persona
-       - Proporciona una nueva estrategia que busque en ambos campos de teléfono
-
-    3. Para búsquedas por función o cargo:
-       - Si el usuario buscó por una función específica (como "director"), sugiere buscar variantes como "directora", "dirección", etc.
-       - Proporciona una nueva estrategia con términos de búsqueda más amplios
-
-    4. Para búsquedas por zona o ubicación:
-       - Si el usuario buscó por una zona específica, sugiere verificar si el formato de la zona es correcto
-       - Proporciona una nueva estrategia con búsqueda más flexible para la zona
-
-    IMPORTANTE:
-    - Si no se encontraron resultados pero hay nombres similares en la base de datos, sugiere buscar esos nombres.
-    - Si el usuario buscó un nombre parcial (como "Luis") y hay una única persona con ese nombre en la base de datos, sugiere buscar específicamente a esa persona.
-    - Si hay múltiples personas con nombres similares, sugiere preguntar al usuario para aclarar a cuál se refiere.
-    - Considera que el usuario puede referirse a una persona usando solo su nombre, solo su apellido, o cualquier combinación de estos.
-
-    PARA CONSULTAS DE LISTADO:
-    - Si la consulta pide listar múltiples registros, evalúa si se han recuperado todos los registros solicitados.
-    - Si la consulta pide un número específico de registros (como "50 números de teléfono"), verifica que se hayan recuperado exactamente ese número si están disponibles.
-    - Si hay demasiados resultados, sugiere formas de filtrarlos o agruparlos para hacerlos más manejables.
-
-    PRIORIZACIÓN DE MENSAJES RECIENTES:
-    - Si la consulta parece ser una aclaración o refinamiento de una consulta anterior, prioriza la precisión y completitud en la respuesta.
-    - Si el usuario ha hecho varias consultas sobre el mismo tema, sugiere proporcionar una respuesta más detallada y completa.
-
-    Si los resultados no son satisfactorios, DEBES proporcionar una nueva estrategia de búsqueda completa y detallada.
-
-    Formato de respuesta (solo JSON, sin texto adicional):
+    {serializar_json(filas_a_registros(resultados, 50))}
 
-    ```json
-    {{
-      "satisfactorio": true | false,
-      "evaluacion": "Tu evaluación de los resultados",
-      "refinamiento": {{
-        "sugerencia": "Sugerencia para refinar la búsqueda",
-        "nueva_estrategia": {{
-          "tipo_consulta": "informacion | filtrado | conteo",
-          "nombres_posibles": ["nombre1", "nombre2", ...],
-          "atributos_solicitados": ["atributo1", "atributo2", ...],
-          "condiciones": [
-            {{
-              "campo": "campo1",
-              "operador": "LIKE",
-              "valor": "valor1"
-            }}
-          ],
-          "explicacion": "Explicación de la nueva estrategia de búsqueda"
-        }}
-      }}
-    }}
-    ```
+    Responde SOLO con el JSON en el formato indicado, sin texto adicional.
     """
 
     # Usar la función común para llamar al LLM
-    respuesta = llamar_llm(prompt)
+    respuesta = llamar_llm(prompt, system_instruction=_PROMPT_EVALUACION_INSTRUCCIONES)
+
+    # Leer el texto de la respuesta una sola vez (cada acceso a .text lo vuelve a decodificar)
+    texto_respuesta = respuesta.text
 
     # Usar la función común para parsear la respuesta JSON
     try:
-        evaluacion = parsear_respuesta_json(respuesta)
+        evaluacion = parsear_respuesta_json(texto_respuesta)
         return evaluacion
     except Exception as e:
         # Si hay un error en el parseo, devolver un objeto con información del error
         return {
             "satisfactorio": False,
             "error": str(e),
-            "respuesta_original": respuesta.text
+            "respuesta_original": texto_respuesta
         }
 
-def generar_respuesta_desde_resultados(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], evaluacion: Dict[str, Any], db_path: str = DB_PATH) -> str:
+def _buscar_respuesta_cache(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], huella: Optional[str]) -> Tuple[str, Optional[str]]:
     """
-    Genera una respuesta natural basada en los resultados de la consulta.
+    Busca en el caché de respuestas la respuesta a la misma consulta con los
+    mismos registros y la misma estrategia.
 
     Args:
         consulta_original (str): Consulta original del usuario
         resultados (dict): Resultados de la consulta SQL
         estrategia (dict): Estrategia de búsqueda utilizada
-        evaluacion (dict): Evaluación de los resultados
+        huella (str, optional): Huella de la estrategia calculada con estrategia_fingerprint
+
+    Returns:
+        tuple: (clave para guardar la respuesta, respuesta almacenada o None)
+    """
+    if huella is None:
+        huella = estrategia_fingerprint(estrategia)
+    clave_respuesta = response_cache.generar_clave(consulta_original, resultados, huella)
+    return clave_respuesta, response_cache.get(clave_respuesta)
+
+def _construir_prompt_respuesta(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], evaluacion: Optional[Dict[str, Any]], db_path: str, estrategia_json: Optional[str]) -> str:
+    """
+    Construye la parte variable del prompt de generación de respuesta.
+
+    Args:
+        consulta_original (str): Consulta original del usuario
+        resultados (dict): Resultados de la consulta SQL
+        estrategia (dict): Estrategia de búsqueda utilizada
+        evaluacion (dict, optional): Evaluación de los resultados; si es None, el
+            prompt termina tras los resultados para que quien llama añada su
+            propia instrucción final (ver evaluar_y_responder)
         db_path (str): Ruta a la base de datos SQLite
+        estrategia_json (str, optional): Estrategia ya serializada con serializar_json
 
     Returns:
-        str: Respuesta natural generada
+        str: Prompt a enviar junto con _PROMPT_RESPUESTA_INSTRUCCIONES
     """
     # Obtener vista previa de la base de datos
     vista_previa = obtener_vista_previa_db(db_path)
@@ -712,195 +1138,203 @@ def generar_respuesta_desde_resultados(consulta_original: str, resultados: Dict[
     - Total de registros: {vista_previa.get('total_registros', 'N/A')}
 
     Nombres únicos en la base de datos (muestra):
-    {json.dumps(vista_previa.get('nombres_unicos', []), indent=2, ensure_ascii=False)}
+    {vista_previa.get('nombres_unicos_json', '[]')}
     """
 
     # Extraer información de respuestas anteriores si existe
-    info_respuestas_anteriores = ""
-    if "historial_respuestas" in estrategia and len(estrategia["historial_respuestas"]) > 0:
-        info_respuestas_anteriores = f"""
-        HISTORIAL DE CONSULTAS Y RESPUESTAS:
-        """
-
-        # Incluir historial de consultas y respuestas
-        for i, respuesta in enumerate(estrategia.get("historial_respuestas", [])):
-            consulta_correspondiente = estrategia.get("historial_consultas", [])[i] if i < len(estrategia.get("historial_consultas", [])) else ""
-            info_respuestas_anteriores += f"""
-            Consulta: "{consulta_correspondiente}"
-            Respuesta: "{respuesta}"
-            """
+    info_respuestas_anteriores = _formatear_historial_respuestas(estrategia)
 
-    # Filtrar resultados para mostrar solo los más relevantes
-    # y limitar el número para evitar tokens excesivos
-    resultados_filtrados = []
-
-    # Si es una consulta de información sobre una persona específica
-    if estrategia.get("tipo_consulta") == "informacion" and estrategia.get("nombres_posibles") and len(estrategia.get("nombres_posibles", [])) > 0:
-        # Ordenar por relevancia si existe ese campo
-        if resultados["registros"] and "relevancia" in resultados["registros"][0]:
-            resultados_ordenados = sorted(resultados["registros"], key=lambda x: x.get("relevancia", 0), reverse=True)
-        else:
-            resultados_ordenados = resultados["registros"]
+    # Filtrar y limitar los resultados para evitar tokens excesivos
+    resultados_limitados = _preparar_resultados_respuesta(resultados, estrategia)
 
-        # Filtrar solo los resultados con alta relevancia (si hay campo de relevancia)
-        if resultados_ordenados and "relevancia" in resultados_ordenados[0]:
-            max_relevancia = resultados_ordenados[0].get("relevancia", 0)
-            # Solo incluir resultados con al menos 80% de la relevancia máxima
-            resultados_filtrados = [r for r in resultados_ordenados if r.get("relevancia", 0) >= max_relevancia * 0.8]
-        else:
-            resultados_filtrados = resultados_ordenados
-    else:
-        # Para otros tipos de consultas, usar todos los resultados
-        resultados_filtrados = resultados["registros"]
+    # Reutilizar la estrategia serializada si ya se calculó en un paso anterior
+    if estrategia_json is None:
+        estrategia_json = serializar_json(estrategia)
 
-    # Limitar el número de resultados para evitar tokens excesivos
-    resultados_limitados = resultados_filtrados[:MAX_RESULTS_DISPLAY] if len(resultados_filtrados) > MAX_RESULTS_DISPLAY else resultados_filtrados
+    # Las instrucciones estáticas se envían como instrucciones de sistema para que
+    # sean idénticas entre llamadas y aprovechen el caché de prompts de Gemini
+    prompt = f"""{db_info}
 
-    prompt = f"""
-    Eres un asistente de agenda personal que mantiene una conversación continua con el usuario.
+    {info_respuestas_anteriores}
 
     CONSULTA ORIGINAL DEL USUARIO:
     {consulta_original}
 
     ESTRATEGIA DE BÚSQUEDA UTILIZADA:
-    {json.dumps(estrategia, indent=2)}
+    {estrategia_json}
 
     RESULTADOS OBTENIDOS ({resultados["total"]} registros en total, mostrando {len(resultados_limitados)}):
-    {json.dumps(resultados_limitados, indent=2)}
+    {serializar_json(resultados_limitados)}
+    """
 
+    if evaluacion is not None:
+        prompt += f"""
     EVALUACIÓN DE LOS RESULTADOS:
-    {json.dumps(evaluacion, indent=2)}
+    {serializar_json(evaluacion)}
 
-    {info_respuestas_anteriores}
+    GENERA UNA RESPUESTA NATURAL Y HUMANA:
+    """
 
-    {db_info}
+    return prompt
 
-    IMPORTANTE SOBRE LA ESTRUCTURA DE NOMBRES:
-    - En español, los nombres completos suelen tener la estructura: [Nombre(s)] [Apellido Paterno] [Apellido Materno]
-    - Sin embargo, en esta base de datos están almacenados como: [Apellido Paterno] [Apellido Materno] [Nombre(s)]
-    - Por ejemplo, "Luis Pérez Ibáñez" está almacenado como "PEREZ IBAÑEZ LUIS"
-    - Cuando el usuario busca "Luis", debe encontrar a "PEREZ IBAÑEZ LUIS" porque "Luis" es su nombre
-    - Cuando el usuario busca "Pérez", debe encontrar a "PEREZ IBAÑEZ LUIS" porque "Pérez" es su apellido paterno
-    - Al responder, usa el formato natural de nombres ([Nombre(s)] [Apellido Paterno] [Apellido Materno])
-
-    MAPEO DE CONCEPTOS A CAMPOS DE LA BASE DE DATOS:
-
-    1. ROLES Y FUNCIONES:
-       - "docentes", "maestros", "profesores" → función_específica = 'DOCENTE FRENTE A GRUPO'
-       - "directores" → función_específica = 'DIRECTOR'
-       - "subdirectores académicos" → función_específica = 'SUBDIRECTOR ACADÉMICO'
-       - "subdirectores de gestión" → función_específica = 'SUBDIRECTOR DE GESTIÓN'
-       - "subdirectores" (genérico) → función_específica IN ('SUBDIRECTOR ACADÉMICO', 'SUBDIRECTOR DE GESTIÓN')
-       - "personal de aula de medios", "encargados de tecnología" → función_específica = 'TICAD'S (AULA DE MEDIOS)'
-       - "veladores", "personal de vigilancia" → función_específica = 'VELADOR'
-       - "ASPE", "personal de apoyo" → función_específica = 'ASPE'
-       - "a qué se dedica", "función", "cargo", "puesto" → función_específica
-
-    2. DATOS DE CONTACTO:
-       - "teléfono", "número", "celular", "móvil" → teléfono_celular, teléfono_particular
-       - "correo", "email", "correo electrónico" → dirección_de_correo_electrónica
-       - "dirección", "domicilio", "dónde vive" → domicilio_particular
-
-    3. DATOS LABORALES:
-       - "centro de trabajo", "escuela", "dónde trabaja" → nombre_del_c_t
-       - "clave del centro de trabajo" → clave_de_c_t_en_el_que_labora
-       - "doble plaza" → el_trabajador_cuenta_con_doble_plaza
-       - "fecha de ingreso", "antigüedad", "cuándo empezó" → fecha_ingreso_a_la_sep
-       - "sector" → sector
-       - "zona" → zona
-
-    4. DATOS ACADÉMICOS:
-       - "estudios", "formación", "preparación" → último_grado_de_estudios
-
-    5. DATOS PERSONALES:
-       - "estado civil", "casado", "soltero" → estado_civil
-       - "CURP" → curp
-       - "RFC" → filiación_o_rfc_con_homonimia
+def generar_respuesta_desde_resultados(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], evaluacion: Dict[str, Any], db_path: str = DB_PATH, estrategia_json: Optional[str] = None, huella: Optional[str] = None) -> str:
+    """
+    Genera una respuesta natural basada en los resultados de la consulta.
 
-    IMPORTANTE SOBRE ROLES EDUCATIVOS:
-    - Si la consulta era sobre "docentes" o "maestros", asegúrate de mostrar SOLO personas con función_específica = "DOCENTE FRENTE A GRUPO"
-    - Si la consulta era sobre "directores", asegúrate de mostrar SOLO personas con función_específica = "DIRECTOR"
-    - Si la consulta era sobre "subdirectores", asegúrate de mostrar SOLO personas con función_específica = "SUBDIRECTOR ACADÉMICO" o "SUBDIRECTOR DE GESTIÓN"
+    Args:
+        consulta_original (str): Consulta original del usuario
+        resultados (dict): Resultados de la consulta SQL
+        estrategia (dict): Estrategia de búsqueda utilizada
+        evaluacion (dict): Evaluación de los resultados
+        db_path (str): Ruta a la base de datos SQLite
+        estrategia_json (str, optional): Estrategia ya serializada con serializar_json
+        huella (str, optional): Huella de la estrategia calculada con estrategia_fingerprint
 
-    INSTRUCCIONES:
+    Returns:
+        str: Respuesta natural generada
+    """
+    # Reutilizar la respuesta si ya se contestó la misma consulta con los mismos registros
+    clave_respuesta, respuesta_cache = _buscar_respuesta_cache(consulta_original, resultados, estrategia, huella)
+    if respuesta_cache is not None:
+        return respuesta_cache
 
-    1. Responde basándote en los RESULTADOS OBTENIDOS Y EN EL CONTEXTO ANTERIOR si es relevante.
-    2. Habla de forma natural y conversacional, como lo haría una persona real.
-    3. Mantén un tono amable, servicial y ligeramente informal.
-    4. Si no hay resultados relevantes en la consulta actual PERO la información aparece en respuestas anteriores, USA ESA INFORMACIÓN.
-    5. Si hay múltiples resultados, SOLO MUESTRA LOS MÁS RELEVANTES para la consulta.
-       - Si el usuario pregunta por una persona específica (ej: "teléfono de Luis Pérez"), SOLO muestra información de esa persona exacta.
-       - NUNCA incluyas información de otras personas que solo coincidan parcialmente con el nombre (ej: si buscan "Luis Pérez", no incluyas a "Claudia Pérez").
-       - Solo menciona otras personas si hay ambigüedad real (ej: hay dos "Luis Pérez" diferentes) o si el usuario explícitamente pide listar varias personas.
-    6. NO uses fórmulas repetitivas como "Según los datos..." o "La información indica...".
-    7. NO preguntes "¿Necesitas algo más?" o "¿Te puedo ayudar con algo más?".
-    8. Si la evaluación indica que los resultados no son satisfactorios, busca en el contexto anterior si ya proporcionaste esa información.
-    9. MANTÉN CONSISTENCIA con tus respuestas anteriores. Si antes dijiste que una persona tiene cierta información, no puedes decir ahora que no la tienes.
+    prompt = _construir_prompt_respuesta(consulta_original, resultados, estrategia, evaluacion, db_path, estrategia_json)
 
-    IMPORTANTE PARA NOMBRES:
-    - Si el usuario busca un nombre parcial (como "Luis") y encuentras a "PEREZ IBAÑEZ LUIS", responde refiriéndote a él como "Luis Pérez Ibáñez", NO como "Pérez Ibáñez Luis".
-    - Entiende que "Luis", "Pérez", "Ibáñez", "Luis Pérez", "Pérez Ibáñez" y "Luis Pérez Ibáñez" se refieren a la misma persona.
-    - Cuando muestres nombres, siempre usa el formato natural ([Nombre(s)] [Apellido Paterno] [Apellido Materno]).
-    - Si hay un campo nombre_alternativo, úsalo para verificar diferentes formas del nombre.
-    - Si no se encontraron resultados pero hay nombres similares en la base de datos, sugiere buscar esos nombres.
-    - Si hay múltiples personas con nombres similares, pregunta al usuario a cuál se refiere, proporcionando las opciones disponibles.
+    # Usar la función común para llamar al LLM con límite de tokens y configuración de seguridad
+    respuesta = llamar_llm(
+        prompt,
+        max_output_tokens=2048,
+        safety_settings=LLM_RESPONSE_SAFETY_SETTINGS,
+        system_instruction=_PROMPT_RESPUESTA_INSTRUCCIONES
+    )
 
-    INSTRUCCIONES PARA CONSULTAS DE LISTADO:
-    - Si la consulta pide listar múltiples registros (como "dame todos los números de teléfono" o "muestra todos los docentes"),
-      proporciona ABSOLUTAMENTE TODOS los resultados solicitados de manera clara y estructurada.
-    - NUNCA omitas resultados ni digas "entre otros" o "por ejemplo". Muestra TODOS los resultados.
-    - Para listas largas, usa SIEMPRE este formato consistente:
+    # Limpiar la respuesta para evitar duplicaciones de párrafos
+    texto_limpio = _limpiar_respuesta(respuesta.text)
 
-      1. Nombre: Juan Pérez - Teléfono: 123456789
-      2. Nombre: María López - Teléfono: 987654321
+    response_cache.put(clave_respuesta, texto_limpio)
 
-    - Sé EXTREMADAMENTE PRECISO con los datos numéricos. Si hay 20 docentes en la zona 109, muestra los 20.
-    - Si la consulta pide "todos" los registros de cierto tipo, proporciona el número total y luego lista TODOS los registros.
-    - Prioriza la precisión y completitud sobre la conversacionalidad para consultas de listado masivo.
-    - EVITA DUPLICAR TEXTO en tus respuestas. Revisa tu respuesta antes de enviarla para asegurarte de que no hay texto duplicado.
-    - Usa un formato CONSISTENTE para todas las entradas de la lista. No cambies el formato a mitad de la lista.
+    return texto_limpio
 
-    GENERA UNA RESPUESTA NATURAL Y HUMANA:
+def generar_respuesta_stream(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], evaluacion: Dict[str, Any], db_path: str = DB_PATH, estrategia_json: Optional[str] = None, huella: Optional[str] = None) -> Iterator[str]:
     """
+    Variante en streaming de generar_respuesta_desde_resultados.
 
-    # Configurar safety settings
-    safety_settings = [
-        {
-            "category": "HARM_CATEGORY_HARASSMENT",
-            "threshold": "BLOCK_ONLY_HIGH"
-        },
-        {
-            "category": "HARM_CATEGORY_HATE_SPEECH",
-            "threshold": "BLOCK_ONLY_HIGH"
-        },
-        {
-            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-            "threshold": "BLOCK_ONLY_HIGH"
-        },
-        {
-            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-            "threshold": "BLOCK_ONLY_HIGH"
-        }
-    ]
+    Emite la respuesta línea a línea a medida que el modelo la genera, de modo
+    que la interfaz puede mostrar el inicio sin esperar a la respuesta completa.
+    Las líneas repetidas se omiten igual que en la versión sin streaming.
 
-    # Usar la función común para llamar al LLM con límite de tokens y configuración de seguridad
-    respuesta = llamar_llm(prompt, max_output_tokens=2048, safety_settings=safety_settings)
+    Args:
+        consulta_original (str): Consulta original del usuario
+        resultados (dict): Resultados de la consulta SQL
+        estrategia (dict): Estrategia de búsqueda utilizada
+        evaluacion (dict): Evaluación de los resultados
+        db_path (str): Ruta a la base de datos SQLite
+        estrategia_json (str, optional): Estrategia ya serializada con serializar_json
+        huella (str, optional): Huella de la estrategia calculada con estrategia_fingerprint
+
+    Yields:
+        str: Fragmentos de la respuesta (líneas completas)
+    """
+    # Reutilizar la respuesta si ya se contestó la misma consulta con los mismos registros
+    clave_respuesta, respuesta_cache = _buscar_respuesta_cache(consulta_original, resultados, estrategia, huella)
+    if respuesta_cache is not None:
+        yield respuesta_cache
+        return
+
+    prompt = _construir_prompt_respuesta(consulta_original, resultados, estrategia, evaluacion, db_path, estrategia_json)
+
+    lineas_vistas = set()
+    lineas = []
+    pendiente = ""
+
+    def _nuevas_lineas(completas):
+        for linea in completas:
+            # Omitir líneas vacías iniciales y líneas ya emitidas
+            if (not lineas and not linea.strip()) or linea in lineas_vistas:
+                continue
+            lineas_vistas.add(linea)
+            lineas.append(linea)
+            yield linea
+
+    for fragmento in llamar_llm_stream(
+        prompt,
+        max_output_tokens=2048,
+        safety_settings=LLM_RESPONSE_SAFETY_SETTINGS,
+        system_instruction=_PROMPT_RESPUESTA_INSTRUCCIONES
+    ):
+        pendiente += fragmento
+        *completas, pendiente = pendiente.split('\n')
+        for linea in _nuevas_lineas(completas):
+            yield linea + '\n'
+
+    # Última línea (sin salto de línea final)
+    for linea in _nuevas_lineas([pendiente.rstrip()]):
+        yield linea
+
+    response_cache.put(clave_respuesta, '\n'.join(lineas).strip())
+
+def evaluar_y_responder(consulta_original: str, resultados: Dict[str, Any], estrategia: Dict[str, Any], db_path: str = DB_PATH, estrategia_json: Optional[str] = None, huella: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Evalúa los resultados y genera la respuesta natural en una sola llamada al LLM.
 
-    # Limpiar la respuesta para evitar duplicaciones
-    texto_respuesta = respuesta.text.strip()
+    Sustituye a evaluar_resultados + generar_respuesta_desde_resultados cuando la
+    evaluación no puede dar lugar a un refinamiento, ahorrando una llamada.
+
+    Args:
+        consulta_original (str): Consulta original del usuario
+        resultados (dict): Resultados de la consulta SQL
+        estrategia (dict): Estrategia de búsqueda utilizada
+        db_path (str): Ruta a la base de datos SQLite
+        estrategia_json (str, optional): Estrategia ya serializada con serializar_json
+        huella (str, optional): Huella de la estrategia calculada con estrategia_fingerprint
 
-    # Verificar si hay duplicaciones de párrafos y eliminarlas
-    lineas = texto_respuesta.split('\n')
-    lineas_unicas = []
-    for linea in lineas:
-        if linea not in lineas_unicas:
-            lineas_unicas.append(linea)
+    Returns:
+        dict: Diccionario con la evaluación ("evaluacion") y la respuesta ("respuesta")
 
-    texto_limpio = '\n'.join(lineas_unicas)
+    Raises:
+        ValueError: Si la respuesta del LLM no tiene el formato esperado
+    """
+    # Reutilizar la respuesta si ya se contestó la misma consulta con los mismos registros
+    clave_respuesta, respuesta_cache = _buscar_respuesta_cache(consulta_original, resultados, estrategia, huella)
+    if respuesta_cache is not None:
+        return {
+            "evaluacion": {
+                "satisfactorio": resultados["total"] > 0,
+                "evaluacion": "Respuesta reutilizada del caché de respuestas."
+            },
+            "respuesta": respuesta_cache
+        }
 
-    return texto_limpio
+    # Mismo contexto que el prompt de respuesta, pero pidiendo la evaluación y la
+    # respuesta en el formato JSON de _PROMPT_EVALUACION_RESPUESTA_INSTRUCCIONES
+    prompt = _construir_prompt_respuesta(consulta_original, resultados, estrategia, None, db_path, estrategia_json)
+    prompt += """
+    Responde SOLO con el JSON en el formato indicado, sin texto adicional.
+    """
 
-def procesar_consulta_completa(consulta: str, contexto: Optional[Dict[str, Any]] = None, db_path: str = DB_PATH, debug: bool = False, max_refinamientos: int = 1) -> Dict[str, Any]:
+    # La salida incluye la evaluación además de la respuesta: margen extra de tokens
+    respuesta = llamar_llm(
+        prompt,
+        max_output_tokens=2048 + 256,
+        safety_settings=LLM_RESPONSE_SAFETY_SETTINGS,
+        system_instruction=_PROMPT_EVALUACION_RESPUESTA_INSTRUCCIONES
+    )
+
+    datos = parsear_respuesta_json(respuesta.text)
+    evaluacion = datos.get("evaluacion") if isinstance(datos, dict) else None
+    texto_respuesta = datos.get("respuesta") if isinstance(datos, dict) else None
+    if not isinstance(evaluacion, dict) or not isinstance(texto_respuesta, str) or not texto_respuesta.strip():
+        raise ValueError("La respuesta combinada del LLM no tiene el formato esperado")
+
+    texto_limpio = _limpiar_respuesta(texto_respuesta)
+    response_cache.put(clave_respuesta, texto_limpio)
+
+    return {
+        "evaluacion": evaluacion,
+        "respuesta": texto_limpio
+    }
+
+def procesar_consulta_completa(consulta: str, contexto: Optional[Dict[str, Any]] = None, db_path: str = DB_PATH, debug: bool = False, max_refinamientos: int = 1, al_generar: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
     """
     Procesa una consulta completa utilizando el flujo de 5 pasos con refinamiento automático.
 
@@ -921,6 +1355,8 @@ def procesar_consulta_completa(consulta: str, contexto: Optional[Dict[str, Any]]
         db_path (str): Ruta a la base de datos SQLite
         debug (bool): Activar modo de depuración para mostrar información detallada
         max_refinamientos (int): Número máximo de refinamientos automáticos a intentar
+        al_generar (callable, optional): Función que recibe los fragmentos de la
+            respuesta a medida que el LLM la genera (ver procesar_consulta)
 
     Returns:
         dict: Resultado completo del procesamiento con todos los pasos intermedios
@@ -929,5 +1365,5 @@ def procesar_consulta_completa(consulta: str, contexto: Optional[Dict[str, Any]]
     from helpers.consulta_processor import procesar_consulta
 
     # Llamar a la función de procesamiento (sin caché tradicional)
-    return procesar_consulta(consulta, contexto, db_path, debug, max_refinamientos)
+    return procesar_consulta(consulta, contexto, db_path, debug, max_refinamientos, al_generar)
 
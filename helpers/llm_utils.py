@@ -7,10 +7,19 @@ Este módulo proporciona funciones comunes para llamar a los modelos LLM
 y procesar sus respuestas, incluyendo manejo de fallback entre modelos.
 """
 
-import json
+import asyncio
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import orjson
 from colorama import Fore, Style
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from config import (
+    GOOGLE_API_KEY,
+    LLM_TRANSPORT,
     LLM_PRIMARY_MODEL,
     LLM_FALLBACK_MODEL,
     LLM_TEMPERATURE,
@@ -18,10 +27,197 @@ from config import (
     LLM_TOP_K,
     LLM_MAX_TOKENS,
     LLM_FALLBACK_MAX_TOKENS,
+    LLM_FALLBACK_RATE,
+    LLM_FALLBACK_BURST,
+    LLM_MAX_CONCURRENT_REQUESTS,
     LLM_SAFETY_SETTINGS
 )
+from helpers.gemini_context_cache import context_cache
 
-def llamar_llm(prompt, max_output_tokens=None, safety_settings=None):
+# Configurar el cliente de Gemini una sola vez para todo el proceso: cada llamada
+# a genai.configure descarta los clientes creados y, con ellos, sus conexiones
+# abiertas, por lo que los demás módulos no deben volver a configurarlo
+genai.configure(api_key=GOOGLE_API_KEY, transport=LLM_TRANSPORT)
+
+# Modelos ya construidos, por (nombre del modelo, instrucciones de sistema),
+# en orden de uso (LRU): cada CachedContent renovado genera una entrada nueva.
+# Se comparte entre los hilos del servidor, así que se accede con _lock_modelos
+_modelos = OrderedDict()
+_MAX_MODELOS = 16
+_lock_modelos = threading.Lock()
+
+# Bloque de código Markdown (```json ... ```) que envuelve el JSON de las respuestas;
+# el cierre es opcional por si la respuesta llegó truncada
+_PATRON_BLOQUE_JSON = re.compile(r"```(?:json)?\s*(.*?)\s*(?:```|\Z)", re.S)
+
+# Errores transitorios del modelo principal que justifican probar el alternativo;
+# el resto (argumentos inválidos, permisos, errores de programación) fallaría igual
+_ERRORES_REINTENTABLES = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError
+)
+
+class _CubetaTokens:
+    """
+    Cubeta de tokens que limita la frecuencia de los fallbacks, para que una
+    caída del modelo principal no se traslade en ráfaga al alternativo.
+    """
+
+    def __init__(self, tasa: float, capacidad: int):
+        """
+        Inicializa la cubeta llena.
+
+        Args:
+            tasa (float): Tokens repuestos por segundo
+            capacidad (int): Número máximo de tokens acumulados
+        """
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = float(capacidad)
+        self.ultima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consumir(self) -> bool:
+        """
+        Consume un token si hay disponible.
+
+        Returns:
+            bool: True si se consumió un token, False si la cubeta está vacía
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultima) * self.tasa)
+            self.ultima = ahora
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+_cubeta_fallback = _CubetaTokens(LLM_FALLBACK_RATE, LLM_FALLBACK_BURST)
+
+def _permitir_fallback(error):
+    """
+    Indica si un error del modelo principal debe reintentarse con el alternativo.
+
+    Args:
+        error (Exception): Error del modelo principal
+
+    Returns:
+        bool: True si el error es transitorio y la cubeta de fallbacks tiene tokens
+    """
+    if not isinstance(error, _ERRORES_REINTENTABLES):
+        return False
+    if not _cubeta_fallback.consumir():
+        print(f"{Fore.YELLOW}⚠ Demasiados fallbacks recientes, no se intenta {LLM_FALLBACK_MODEL}{Style.RESET_ALL}")
+        return False
+    return True
+
+# Límite de llamadas asíncronas simultáneas a Gemini: un semáforo por bucle de
+# eventos, porque un asyncio.Semaphore queda ligado al primer bucle que espera en él
+_semaforos_llm = weakref.WeakKeyDictionary()
+
+def _semaforo_llm():
+    """
+    Obtiene el semáforo que limita las llamadas asíncronas del bucle de eventos
+    actual, creándolo en el primer uso.
+
+    Returns:
+        asyncio.Semaphore: Semáforo con LLM_MAX_CONCURRENT_REQUESTS permisos
+    """
+    bucle = asyncio.get_running_loop()
+    semaforo = _semaforos_llm.get(bucle)
+    if semaforo is None:
+        semaforo = _semaforos_llm[bucle] = asyncio.Semaphore(LLM_MAX_CONCURRENT_REQUESTS)
+    return semaforo
+
+def _configuracion_generacion(max_output_tokens):
+    """
+    Construye la configuración de generación común a todas las llamadas.
+
+    Args:
+        max_output_tokens (int): Límite de tokens de salida
+
+    Returns:
+        dict: Configuración de generación
+    """
+    # Configurar el modelo para evitar repeticiones y respuestas más coherentes
+    return {
+        "temperature": LLM_TEMPERATURE,
+        "top_p": LLM_TOP_P,
+        "top_k": LLM_TOP_K,
+        "max_output_tokens": max_output_tokens
+    }
+
+def _obtener_modelo(model_name, system_instruction=None):
+    """
+    Obtiene un modelo generativo reutilizando la instancia si ya se creó.
+
+    Reutilizar el mismo objeto con las mismas instrucciones de sistema evita
+    reconstruirlo en cada llamada y mantiene idéntico el prefijo enviado,
+    lo que permite a Gemini aplicar su caché implícito de prompts.
+
+    Args:
+        model_name (str): Nombre del modelo
+        system_instruction (str, optional): Instrucciones de sistema fijas
+
+    Returns:
+        genai.GenerativeModel: Modelo generativo
+    """
+    return _registrar_modelo(
+        (model_name, system_instruction),
+        lambda: genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+    )
+
+def _registrar_modelo(clave, crear):
+    """
+    Obtiene el modelo guardado con la clave, o lo crea y lo guarda, y lo marca
+    como el más reciente, descartando los menos usados si se supera _MAX_MODELOS.
+
+    Args:
+        clave (tuple): Clave del modelo en _modelos
+        crear (callable): Función que construye el modelo si no está guardado
+
+    Returns:
+        genai.GenerativeModel: Modelo generativo
+    """
+    with _lock_modelos:
+        modelo = _modelos.get(clave)
+        if modelo is None:
+            modelo = _modelos[clave] = crear()
+        else:
+            _modelos.move_to_end(clave)
+        while len(_modelos) > _MAX_MODELOS:
+            _modelos.popitem(last=False)
+    return modelo
+
+def _descartar_modelo(clave):
+    """
+    Elimina un modelo guardado, si existe.
+
+    Args:
+        clave (tuple): Clave del modelo en _modelos
+    """
+    with _lock_modelos:
+        _modelos.pop(clave, None)
+
+def _obtener_modelo_desde_cache(cached_content):
+    """
+    Obtiene un modelo generativo ligado a un CachedContent de Gemini.
+
+    Args:
+        cached_content: CachedContent con las instrucciones fijas
+
+    Returns:
+        genai.GenerativeModel: Modelo generativo
+    """
+    return _registrar_modelo(
+        ("cached_content", cached_content.name),
+        lambda: genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+    )
+
+def llamar_llm(prompt, max_output_tokens=None, safety_settings=None, system_instruction=None, cached_content=None):
     """
     Función común para llamar al LLM con fallback automático.
 
@@ -29,6 +225,10 @@ def llamar_llm(prompt, max_output_tokens=None, safety_settings=None):
         prompt (str): El prompt a enviar al modelo
         max_output_tokens (int, optional): Límite de tokens de salida
         safety_settings (list, optional): Configuración de seguridad
+        system_instruction (str, optional): Instrucciones fijas que se envían como
+            instrucciones de sistema, separadas del contenido de cada llamada
+        cached_content (optional): CachedContent de Gemini con las instrucciones fijas;
+            si falla, se usa system_instruction
 
     Returns:
         object: Respuesta del modelo
@@ -41,16 +241,27 @@ def llamar_llm(prompt, max_output_tokens=None, safety_settings=None):
     if max_output_tokens is None:
         max_output_tokens = LLM_MAX_TOKENS
 
+    generation_config = _configuracion_generacion(max_output_tokens)
+
+    # Usar el caché de contexto de Gemini si está disponible
+    if cached_content is not None:
+        try:
+            modelo = _obtener_modelo_desde_cache(cached_content)
+            respuesta = modelo.generate_content(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings
+            )
+            print(f"{Fore.GREEN}✓ Usando modelo: {LLM_PRIMARY_MODEL} (caché de contexto){Style.RESET_ALL}")
+            return respuesta
+        except Exception as e:
+            # El caché pudo expirar o eliminarse (NotFound): se volverá a crear en la próxima llamada
+            print(f"{Fore.YELLOW}⚠ Error con el caché de contexto: {str(e)}{Style.RESET_ALL}")
+            context_cache.invalidar(cached_content)
+            _descartar_modelo(("cached_content", cached_content.name))
+
     try:
-        modelo = genai.GenerativeModel(model_name=LLM_PRIMARY_MODEL)
-
-        # Configurar el modelo para evitar repeticiones y respuestas más coherentes
-        generation_config = {
-            "temperature": LLM_TEMPERATURE,
-            "top_p": LLM_TOP_P,
-            "top_k": LLM_TOP_K,
-            "max_output_tokens": max_output_tokens
-        }
+        modelo = _obtener_modelo(LLM_PRIMARY_MODEL, system_instruction)
 
         respuesta = modelo.generate_content(
             prompt,
@@ -61,15 +272,12 @@ def llamar_llm(prompt, max_output_tokens=None, safety_settings=None):
         return respuesta
     except Exception as e:
         print(f"{Fore.YELLOW}⚠ Error con {LLM_PRIMARY_MODEL}: {str(e)}{Style.RESET_ALL}")
+        if not _permitir_fallback(e):
+            raise
         print(f"{Fore.YELLOW}⚠ Intentando con modelo alternativo: {LLM_FALLBACK_MODEL}{Style.RESET_ALL}")
 
-        modelo = genai.GenerativeModel(model_name=LLM_FALLBACK_MODEL)
-        generation_config = {
-            "temperature": LLM_TEMPERATURE,
-            "top_p": LLM_TOP_P,
-            "top_k": LLM_TOP_K,
-            "max_output_tokens": min(max_output_tokens, LLM_FALLBACK_MAX_TOKENS)
-        }
+        modelo = _obtener_modelo(LLM_FALLBACK_MODEL, system_instruction)
+        generation_config = _configuracion_generacion(min(max_output_tokens, LLM_FALLBACK_MAX_TOKENS))
 
         respuesta = modelo.generate_content(
             prompt,
@@ -79,30 +287,162 @@ def llamar_llm(prompt, max_output_tokens=None, safety_settings=None):
         print(f"{Fore.GREEN}✓ Usando modelo: {LLM_FALLBACK_MODEL}{Style.RESET_ALL}")
         return respuesta
 
-def parsear_respuesta_json(respuesta):
+async def llamar_llm_async(prompt, max_output_tokens=None, safety_settings=None, system_instruction=None, cached_content=None):
+    """
+    Versión asíncrona de llamar_llm, con el mismo fallback entre modelos.
+
+    Permite atender varias consultas concurrentes en un mismo bucle de eventos
+    sin bloquear un hilo por llamada; el número de llamadas simultáneas a
+    Gemini se limita con LLM_MAX_CONCURRENT_REQUESTS.
+
+    Args:
+        prompt (str): El prompt a enviar al modelo
+        max_output_tokens (int, optional): Límite de tokens de salida
+        safety_settings (list, optional): Configuración de seguridad
+        system_instruction (str, optional): Instrucciones fijas que se envían como
+            instrucciones de sistema, separadas del contenido de cada llamada
+        cached_content (optional): CachedContent de Gemini con las instrucciones fijas;
+            si falla, se usa system_instruction
+
+    Returns:
+        object: Respuesta del modelo
+    """
+    if safety_settings is None:
+        safety_settings = LLM_SAFETY_SETTINGS
+
+    if max_output_tokens is None:
+        max_output_tokens = LLM_MAX_TOKENS
+
+    generation_config = _configuracion_generacion(max_output_tokens)
+
+    async with _semaforo_llm():
+        # Usar el caché de contexto de Gemini si está disponible
+        if cached_content is not None:
+            try:
+                modelo = _obtener_modelo_desde_cache(cached_content)
+                respuesta = await modelo.generate_content_async(
+                    prompt,
+                    generation_config=generation_config,
+                    safety_settings=safety_settings
+                )
+                print(f"{Fore.GREEN}✓ Usando modelo: {LLM_PRIMARY_MODEL} (caché de contexto){Style.RESET_ALL}")
+                return respuesta
+            except Exception as e:
+                print(f"{Fore.YELLOW}⚠ Error con el caché de contexto: {str(e)}{Style.RESET_ALL}")
+                context_cache.invalidar(cached_content)
+                _descartar_modelo(("cached_content", cached_content.name))
+
+        try:
+            modelo = _obtener_modelo(LLM_PRIMARY_MODEL, system_instruction)
+
+            respuesta = await modelo.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings
+            )
+            print(f"{Fore.GREEN}✓ Usando modelo: {LLM_PRIMARY_MODEL}{Style.RESET_ALL}")
+            return respuesta
+        except Exception as e:
+            print(f"{Fore.YELLOW}⚠ Error con {LLM_PRIMARY_MODEL}: {str(e)}{Style.RESET_ALL}")
+            if not _permitir_fallback(e):
+                raise
+            print(f"{Fore.YELLOW}⚠ Intentando con modelo alternativo: {LLM_FALLBACK_MODEL}{Style.RESET_ALL}")
+
+            modelo = _obtener_modelo(LLM_FALLBACK_MODEL, system_instruction)
+            generation_config = _configuracion_generacion(min(max_output_tokens, LLM_FALLBACK_MAX_TOKENS))
+
+            respuesta = await modelo.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings
+            )
+            print(f"{Fore.GREEN}✓ Usando modelo: {LLM_FALLBACK_MODEL}{Style.RESET_ALL}")
+            return respuesta
+
+def llamar_llm_stream(prompt, max_output_tokens=None, safety_settings=None, system_instruction=None, cached_content=None):
+    """
+    Llama al LLM en modo streaming y emite el texto a medida que se genera.
+
+    Si un modelo falla antes de emitir texto se intenta con el siguiente
+    (caché de contexto, modelo principal, modelo alternativo); si falla a mitad
+    de la respuesta, el error se propaga porque ya se emitió texto parcial.
+
+    Args:
+        prompt (str): El prompt a enviar al modelo
+        max_output_tokens (int, optional): Límite de tokens de salida
+        safety_settings (list, optional): Configuración de seguridad
+        system_instruction (str, optional): Instrucciones fijas que se envían como
+            instrucciones de sistema, separadas del contenido de cada llamada
+        cached_content (optional): CachedContent de Gemini con las instrucciones fijas;
+            si falla, se usa system_instruction
+
+    Yields:
+        str: Fragmentos de texto de la respuesta
+    """
+    if safety_settings is None:
+        safety_settings = LLM_SAFETY_SETTINGS
+
+    if max_output_tokens is None:
+        max_output_tokens = LLM_MAX_TOKENS
+
+    # Intentos en orden: (modelo, nombre para mostrar, límite de tokens)
+    intentos = []
+    if cached_content is not None:
+        intentos.append((lambda: _obtener_modelo_desde_cache(cached_content), f"{LLM_PRIMARY_MODEL} (caché de contexto)", max_output_tokens))
+    intentos.append((lambda: _obtener_modelo(LLM_PRIMARY_MODEL, system_instruction), LLM_PRIMARY_MODEL, max_output_tokens))
+    intentos.append((lambda: _obtener_modelo(LLM_FALLBACK_MODEL, system_instruction), LLM_FALLBACK_MODEL, min(max_output_tokens, LLM_FALLBACK_MAX_TOKENS)))
+
+    for i, (obtener_modelo, nombre, limite_tokens) in enumerate(intentos):
+        emitido = False
+        try:
+            respuesta = obtener_modelo().generate_content(
+                prompt,
+                generation_config=_configuracion_generacion(limite_tokens),
+                safety_settings=safety_settings,
+                stream=True
+            )
+            for chunk in respuesta:
+                texto = chunk.text
+                if texto:
+                    # Tras el primer fragmento ya no se cambia de modelo: se informa
+                    # aquí para que el aviso no quede en medio de la respuesta
+                    if not emitido:
+                        print(f"{Fore.GREEN}✓ Usando modelo: {nombre} (streaming){Style.RESET_ALL}")
+                    emitido = True
+                    yield texto
+            return
+        except Exception as e:
+            if emitido or i == len(intentos) - 1:
+                raise
+            print(f"{Fore.YELLOW}⚠ Error con {nombre}: {str(e)}{Style.RESET_ALL}")
+            # El paso al modelo alternativo solo se permite para errores transitorios
+            if i == len(intentos) - 2 and not _permitir_fallback(e):
+                raise
+            if cached_content is not None and i == 0:
+                context_cache.invalidar(cached_content)
+                _descartar_modelo(("cached_content", cached_content.name))
+
+def parsear_respuesta_json(texto):
     """
     Función común para parsear respuestas JSON del LLM.
 
     Args:
-        respuesta (object): Respuesta del modelo
+        texto (str): Texto de la respuesta del modelo (respuesta.text, leído una sola vez)
 
     Returns:
         dict: Objeto JSON parseado o diccionario con error
     """
     try:
-        texto_respuesta = respuesta.text.strip()
-        if "```json" in texto_respuesta:
-            texto_respuesta = texto_respuesta.split("```json")[1].split("```")[0].strip()
-        elif "```" in texto_respuesta:
-            texto_respuesta = texto_respuesta.split("```")[1].strip()
+        coincidencia = _PATRON_BLOQUE_JSON.search(texto)
+        texto_respuesta = coincidencia.group(1) if coincidencia else texto
 
-        return json.loads(texto_respuesta)
+        return orjson.loads(texto_respuesta)
     except Exception as e:
         print(f"Error al parsear respuesta JSON: {e}")
-        print(f"Respuesta recibida: {respuesta.text}")
+        print(f"Respuesta recibida: {texto}")
         return {
             "error": str(e),
-            "respuesta_original": respuesta.text
+            "respuesta_original": texto
         }
 
 def generar_respuesta_texto(prompt, max_output_tokens=None, safety_settings=None):
@@ -7,31 +7,51 @@ Proporciona funciones para registrar eventos, errores y métricas de manera cons
 """
 
 import os
-import json
+import atexit
 import logging
+import queue
+import threading
 import time
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener
 from typing import Dict, Any, Optional, Union, List
-from colorama import Fore, Style
-from helpers.logging_config.config import get_logging_config, update_logging_config, set_console_log_level
-
-# Configuración de directorios
+import orjson
+from helpers.logging_config.config import get_logging_config, update_logging_config, set_console_log_level, get_log_level_from_name
+
+# colorama es opcional: sin ella los mensajes de consola se muestran sin color
+try:
+    from colorama import Fore, Style
+except ImportError:
+    class _SinColor:
+        def __getattr__(self, nombre):
+            return ""
+    Fore = Style = _SinColor()
+
+# Configuración de directorios (el directorio se crea al configurar el logger)
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
 
 # Niveles de log personalizados
 CONSULTA = 25  # Entre INFO y WARNING
 METRICA = 15   # Entre DEBUG e INFO
 
-# Registrar niveles personalizados
-logging.addLevelName(CONSULTA, "CONSULTA")
-logging.addLevelName(METRICA, "METRICA")
+# Máximo de buffers por llamada a os.writev
+try:
+    _MAX_IOV = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+except (ValueError, OSError):
+    _MAX_IOV = 1024
+if _MAX_IOV <= 0:
+    _MAX_IOV = 1024
+
+# Logger configurado y nivel más bajo que acepta algún handler; las funciones de
+# registro los consultan directamente y descartan los registros por debajo de ese
+# nivel antes de construir sus detalles
+_LOG: Optional[logging.Logger] = None
+_NIVEL_MINIMO = logging.DEBUG
+
 
 
 class JsonFormatter(logging.Formatter):
     """
-    Formateador personalizado que genera logs en formato JSON.
+    Formateador personalizado que genera logs en formato JSON (una línea compacta por registro).
     """
 
     def format(self, record):
@@ -46,6 +66,7 @@ class JsonFormatter(logging.Formatter):
         """
         log_data = {
             "timestamp": self.formatTime(record, self.datefmt),
+            "created": record.created,
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
@@ -61,7 +82,7 @@ class JsonFormatter(logging.Formatter):
         if hasattr(record, "detalles") and record.detalles:
             log_data["detalles"] = record.detalles
 
-        return json.dumps(log_data, ensure_ascii=False)
+        return orjson.dumps(log_data, option=orjson.OPT_NON_STR_KEYS, default=str).decode("utf-8")
 
 
 class ColoredConsoleFormatter(logging.Formatter):
@@ -94,6 +115,274 @@ class ColoredConsoleFormatter(logging.Formatter):
         return f"{color}{log_message}{Style.RESET_ALL}"
 
 
+class ManejadorArchivoLotes(logging.Handler):
+    """
+    Handler de archivo con rotación que agrupa los registros y los escribe en lote.
+    Pensado para ejecutarse en el hilo del QueueListener: acumula las líneas formateadas
+    y las escribe con una sola llamada os.writev al superar el tamaño o la antigüedad
+    del lote, al registrar un error o cuando la cola queda vacía.
+    """
+
+    # Tamaño máximo del lote antes de escribirlo (bytes)
+    MAX_BYTES_LOTE = 64 * 1024
+
+    # Antigüedad máxima del lote antes de escribirlo (segundos)
+    MAX_ESPERA_LOTE = 0.1
+
+    def __init__(self, filename: str, maxBytes: int = 0, backupCount: int = 0, encoding: str = "utf-8"):
+        """
+        Inicializa el handler y abre el archivo en modo append.
+
+        Args:
+            filename (str): Ruta del archivo de log
+            maxBytes (int): Tamaño a partir del cual se rota el archivo (0 = sin rotación)
+            backupCount (int): Número de archivos rotados que se conservan
+            encoding (str): Codificación de las líneas
+        """
+        super().__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.encoding = encoding
+        self._pendientes: List[bytes] = []
+        self._bytes_pendientes = 0
+        self._inicio_lote = 0.0
+        self._fd = self._abrir()
+        self._bytes_escritos = os.fstat(self._fd).st_size
+
+    def _abrir(self) -> int:
+        """
+        Abre el archivo de log para añadir al final.
+
+        Returns:
+            int: Descriptor del archivo
+        """
+        return os.open(self.baseFilename, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def emit(self, record):
+        """
+        Añade un registro al lote y lo escribe si corresponde.
+
+        Args:
+            record: Registro de log
+        """
+        try:
+            linea = (self.format(record) + "\n").encode(self.encoding)
+        except Exception:
+            self.handleError(record)
+            return
+
+        if not self._pendientes:
+            self._inicio_lote = time.monotonic()
+        self._pendientes.append(linea)
+        self._bytes_pendientes += len(linea)
+
+        if (record.levelno >= logging.ERROR
+                or self._bytes_pendientes >= self.MAX_BYTES_LOTE
+                or time.monotonic() - self._inicio_lote >= self.MAX_ESPERA_LOTE):
+            self.flush()
+
+    def flush(self):
+        """Escribe en el archivo las líneas pendientes, rotándolo si es necesario."""
+        self.acquire()
+        try:
+            if not self._pendientes or self._fd is None:
+                return
+
+            lote, self._pendientes = self._pendientes, []
+            tamano, self._bytes_pendientes = self._bytes_pendientes, 0
+
+            if self.maxBytes > 0 and self._bytes_escritos and self._bytes_escritos + tamano > self.maxBytes:
+                self._rotar()
+
+            self._escribir(lote, tamano)
+            self._bytes_escritos += tamano
+        except OSError as e:
+            print(f"Error al escribir el log {self.baseFilename}: {e}")
+        finally:
+            self.release()
+
+    def _escribir(self, lote: List[bytes], tamano: int) -> None:
+        """
+        Escribe un lote de líneas con os.writev (os.write donde no está disponible).
+
+        Args:
+            lote (list): Líneas codificadas
+            tamano (int): Suma de sus longitudes
+        """
+        escritos = 0
+        if hasattr(os, "writev"):
+            for i in range(0, len(lote), _MAX_IOV):
+                trozo = lote[i:i + _MAX_IOV]
+                escritos_trozo = os.writev(self._fd, trozo)
+                escritos += escritos_trozo
+                # Escritura parcial: no seguir con los trozos siguientes, para
+                # que el resto se escriba en orden a partir del primer byte pendiente
+                if escritos_trozo < sum(map(len, trozo)):
+                    break
+
+        # Completar desde el primer byte no escrito (todo el lote sin writev)
+        if escritos < tamano:
+            datos = memoryview(b"".join(lote))[escritos:]
+            while datos:
+                datos = datos[os.write(self._fd, datos):]
+
+    def _rotar(self) -> None:
+        """Rota el archivo igual que RotatingFileHandler (archivo.1, archivo.2, ...)."""
+        os.close(self._fd)
+        if self.backupCount > 0:
+            for i in range(self.backupCount - 1, 0, -1):
+                origen = f"{self.baseFilename}.{i}"
+                if os.path.exists(origen):
+                    os.replace(origen, f"{self.baseFilename}.{i + 1}")
+            if os.path.exists(self.baseFilename):
+                os.replace(self.baseFilename, f"{self.baseFilename}.1")
+        else:
+            os.truncate(self.baseFilename, 0)
+        self._fd = self._abrir()
+        self._bytes_escritos = 0
+
+    def close(self):
+        """Escribe las líneas pendientes y cierra el archivo."""
+        self.acquire()
+        try:
+            self.flush()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        finally:
+            self.release()
+            super().close()
+
+
+# Argumentos de mensaje que se pueden interpolar más tarde sin riesgo
+_TIPOS_INMUTABLES = (str, int, float, bool, type(None))
+
+
+class ManejadorCola(QueueHandler):
+    """
+    QueueHandler que conserva la información de la excepción del registro.
+    El QueueHandler estándar incorpora el traceback al mensaje y descarta exc_info,
+    lo que haría desaparecer el campo "exception" de los logs JSON.
+    Con una cola acotada nunca bloquea: si está llena descarta el registro más antiguo.
+    """
+
+    def __init__(self, cola):
+        """
+        Inicializa el manejador.
+
+        Args:
+            cola (queue.Queue): Cola compartida con el listener
+        """
+        super().__init__(cola)
+        self.descartados = 0
+        self._lock_descartados = threading.Lock()
+
+    def enqueue(self, record):
+        """
+        Encola un registro, descartando el más antiguo si la cola está llena.
+
+        Args:
+            record: Registro de log
+        """
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Otro hilo ocupó el hueco; se descarta el registro nuevo
+            pass
+
+        with self._lock_descartados:
+            self.descartados += 1
+
+    def tomar_descartados(self) -> int:
+        """
+        Obtiene y reinicia el contador de registros descartados.
+
+        Returns:
+            int: Registros descartados desde la última llamada
+        """
+        with self._lock_descartados:
+            descartados, self.descartados = self.descartados, 0
+        return descartados
+
+    def prepare(self, record):
+        """
+        Prepara un registro para encolarlo.
+
+        Si los argumentos del mensaje son inmutables, la interpolación se deja al
+        formateador en el hilo del listener; si no, el mensaje se resuelve ahora,
+        porque los argumentos podrían modificarse antes de escribir el registro.
+
+        Args:
+            record: Registro de log
+
+        Returns:
+            logging.LogRecord: Registro listo para el listener
+        """
+        if record.args and not (isinstance(record.args, tuple)
+                                and all(isinstance(arg, _TIPOS_INMUTABLES) for arg in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class ListenerCola(QueueListener):
+    """
+    QueueListener que informa periódicamente de los registros descartados por la cola
+    y vacía los lotes de los handlers de archivo cuando no quedan registros en espera.
+    """
+
+    # Intervalo mínimo entre métricas de registros descartados (segundos)
+    INTERVALO_REPORTE = 1.0
+
+    def __init__(self, cola, manejador_cola: ManejadorCola, *handlers, respect_handler_level: bool = False):
+        """
+        Inicializa el listener.
+
+        Args:
+            cola (queue.Queue): Cola de registros
+            manejador_cola (ManejadorCola): Manejador que alimenta la cola
+            *handlers: Handlers que escriben los registros
+            respect_handler_level (bool): Si se respeta el nivel de cada handler
+        """
+        super().__init__(cola, *handlers, respect_handler_level=respect_handler_level)
+        self._manejador_cola = manejador_cola
+        self._ultimo_reporte = 0.0
+
+    def handle(self, record):
+        """
+        Escribe un registro y, como mucho una vez por intervalo, la métrica log_dropped.
+
+        Args:
+            record: Registro de log
+        """
+        super().handle(record)
+
+        # Sin más registros en espera: escribir los lotes pendientes
+        if self.queue.empty():
+            for handler in self.handlers:
+                if isinstance(handler, ManejadorArchivoLotes):
+                    handler.flush()
+
+        ahora = time.monotonic()
+        if ahora - self._ultimo_reporte >= self.INTERVALO_REPORTE:
+            self._ultimo_reporte = ahora
+            descartados = self._manejador_cola.tomar_descartados()
+            if descartados:
+                Logger.log_metrica("log_dropped", descartados)
+
+
 class Logger:
     """
     Clase principal para el sistema de logging.
@@ -102,6 +391,7 @@ class Logger:
 
     _instance = None
     _logger = None
+    _listener = None
 
     @classmethod
     def get_logger(cls):
@@ -124,6 +414,7 @@ class Logger:
         # Crear logger
         logger = logging.getLogger("asistente_agenda")
         logger.setLevel(logging.DEBUG)  # El nivel base siempre es DEBUG
+        logger.propagate = False  # Los handlers propios ya escriben todo; no pasar al logger raíz
 
         # Evitar duplicación de logs
         if logger.handlers:
@@ -137,12 +428,17 @@ class Logger:
         def metrica(self, message, *args, **kwargs):
             self.log(METRICA, message, *args, **kwargs)
 
-        # Añadir métodos personalizados al logger
+        # Registrar niveles personalizados y añadir sus métodos al logger
+        logging.addLevelName(CONSULTA, "CONSULTA")
+        logging.addLevelName(METRICA, "METRICA")
         logging.Logger.consulta = consulta
         logging.Logger.metrica = metrica
 
+        # Crear directorio de logs
+        os.makedirs(LOG_DIR, exist_ok=True)
+
         # Crear handler para archivo de log general
-        file_handler = RotatingFileHandler(
+        file_handler = ManejadorArchivoLotes(
             os.path.join(LOG_DIR, "asistente.log"),
             maxBytes=10*1024*1024,  # 10 MB
             backupCount=5
@@ -151,7 +447,7 @@ class Logger:
         file_handler.setFormatter(JsonFormatter())
 
         # Crear handler para archivo de errores
-        error_handler = RotatingFileHandler(
+        error_handler = ManejadorArchivoLotes(
             os.path.join(LOG_DIR, "errores.log"),
             maxBytes=5*1024*1024,  # 5 MB
             backupCount=3
@@ -160,7 +456,7 @@ class Logger:
         error_handler.setFormatter(JsonFormatter())
 
         # Crear handler para consultas
-        consulta_handler = RotatingFileHandler(
+        consulta_handler = ManejadorArchivoLotes(
             os.path.join(LOG_DIR, "consultas.log"),
             maxBytes=10*1024*1024,  # 10 MB
             backupCount=5
@@ -176,20 +472,42 @@ class Logger:
             '%Y-%m-%d %H:%M:%S'
         ))
 
-        # Añadir handlers al logger
-        logger.addHandler(file_handler)
-        logger.addHandler(error_handler)
-        logger.addHandler(consulta_handler)
-        logger.addHandler(console_handler)
+        # El logger solo encola los registros; los handlers reales formatean
+        # y escriben en un hilo dedicado para no bloquear al hilo que registra
+        cola = queue.Queue(maxsize=config.get("queue_max_size", 10000))
+        manejador_cola = ManejadorCola(cola)
+        logger.addHandler(manejador_cola)
+        cls._listener = ListenerCola(
+            cola, manejador_cola, file_handler, error_handler, consulta_handler, console_handler,
+            respect_handler_level=True
+        )
+        cls._listener.start()
+        atexit.register(cls._detener_listener)
 
-        # Guardar referencia al logger
+        # Guardar referencia al logger (también a nivel de módulo para las funciones de registro)
+        global _LOG
         cls._logger = logger
+        _LOG = logger
 
         # Guardar referencia a los handlers para poder actualizarlos después
         cls._console_handler = console_handler
         cls._file_handler = file_handler
         cls._error_handler = error_handler
         cls._consulta_handler = consulta_handler
+        cls._actualizar_nivel_minimo()
+
+    @classmethod
+    def _actualizar_nivel_minimo(cls) -> None:
+        """Recalcula el nivel más bajo aceptado por los handlers del listener."""
+        global _NIVEL_MINIMO
+        if cls._listener is not None and cls._listener.handlers:
+            _NIVEL_MINIMO = min(handler.level for handler in cls._listener.handlers)
+
+    @classmethod
+    def _detener_listener(cls) -> None:
+        """Detiene el listener vaciando antes la cola de registros pendientes."""
+        if cls._listener is not None and cls._listener._thread is not None:
+            cls._listener.stop()
 
     @classmethod
     def log_consulta(cls, consulta: str, contexto: Optional[Dict[str, Any]] = None,
@@ -202,19 +520,7 @@ class Logger:
             contexto (dict, optional): Contexto de la consulta
             usuario (str, optional): Identificador del usuario
         """
-        logger = cls.get_logger()
-        detalles = {
-            "consulta": consulta,
-            "timestamp": time.time()
-        }
-
-        if contexto:
-            detalles["contexto"] = contexto
-
-        if usuario:
-            detalles["usuario"] = usuario
-
-        logger.consulta(f"Nueva consulta: {consulta}", extra={"detalles": detalles})
+        log_consulta(consulta, contexto, usuario)
 
     @classmethod
     def log_respuesta(cls, consulta: str, respuesta: str,
@@ -229,20 +535,7 @@ class Logger:
             tiempo_ejecucion (float, optional): Tiempo de ejecución en segundos
             cache_hit (bool, optional): Si la respuesta vino del caché
         """
-        logger = cls.get_logger()
-        detalles = {
-            "consulta": consulta,
-            "respuesta": respuesta,
-            "timestamp": time.time()
-        }
-
-        if tiempo_ejecucion is not None:
-            detalles["tiempo_ejecucion"] = tiempo_ejecucion
-
-        if cache_hit is not None:
-            detalles["cache_hit"] = cache_hit
-
-        logger.consulta(f"Respuesta generada para: {consulta}", extra={"detalles": detalles})
+        log_respuesta(consulta, respuesta, tiempo_ejecucion, cache_hit)
 
     @classmethod
     def log_metrica(cls, nombre: str, valor: Union[int, float, str],
@@ -255,17 +548,7 @@ class Logger:
             valor: Valor de la métrica
             contexto (dict, optional): Contexto adicional
         """
-        logger = cls.get_logger()
-        detalles = {
-            "metrica": nombre,
-            "valor": valor,
-            "timestamp": time.time()
-        }
-
-        if contexto:
-            detalles["contexto"] = contexto
-
-        logger.metrica(f"Métrica {nombre}: {valor}", extra={"detalles": detalles})
+        log_metrica(nombre, valor, contexto)
 
     @classmethod
     def log_error(cls, mensaje: str, error: Optional[Exception] = None,
@@ -278,14 +561,7 @@ class Logger:
             error (Exception, optional): Excepción original
             detalles (dict, optional): Detalles adicionales
         """
-        logger = cls.get_logger()
-        extra_detalles = detalles or {}
-
-        if error:
-            extra_detalles["error_type"] = type(error).__name__
-            extra_detalles["error_message"] = str(error)
-
-        logger.error(mensaje, exc_info=error is not None, extra={"detalles": extra_detalles})
+        log_error(mensaje, error, detalles)
 
     @classmethod
     def set_log_level(cls, level_name: str) -> None:
@@ -296,14 +572,7 @@ class Logger:
             level_name (str): Nombre del nivel (DEBUG, INFO, WARNING, ERROR)
         """
         # Obtener el nivel de log a partir del nombre
-        level_map = {
-            "DEBUG": logging.DEBUG,
-            "INFO": logging.INFO,
-            "WARNING": logging.WARNING,
-            "ERROR": logging.ERROR,
-            "CRITICAL": logging.CRITICAL
-        }
-        level = level_map.get(level_name.upper(), logging.INFO)
+        level = get_log_level_from_name(level_name)
 
         # Actualizar la configuración
         config = update_logging_config({"console_level": level})
@@ -311,6 +580,7 @@ class Logger:
         # Actualizar el nivel de log en el handler de consola
         if hasattr(cls, '_console_handler') and cls._console_handler:
             cls._console_handler.setLevel(level)
+            cls._actualizar_nivel_minimo()
 
             # Registrar el cambio
             logger = cls.get_logger()
@@ -332,7 +602,21 @@ def log_consulta(consulta: str, contexto: Optional[Dict[str, Any]] = None,
         contexto (dict, optional): Contexto de la consulta
         usuario (str, optional): Identificador del usuario
     """
-    Logger.log_consulta(consulta, contexto, usuario)
+    logger = _LOG if _LOG is not None else Logger.get_logger()
+    if CONSULTA < _NIVEL_MINIMO:
+        return
+
+    detalles = {
+        "consulta": consulta
+    }
+
+    if contexto:
+        detalles["contexto"] = contexto
+
+    if usuario:
+        detalles["usuario"] = usuario
+
+    logger.consulta("Nueva consulta: %s", consulta, extra={"detalles": detalles})
 
 
 def log_respuesta(consulta: str, respuesta: str,
@@ -347,7 +631,22 @@ def log_respuesta(consulta: str, respuesta: str,
         tiempo_ejecucion (float, optional): Tiempo de ejecución en segundos
         cache_hit (bool, optional): Si la respuesta vino del caché
     """
-    Logger.log_respuesta(consulta, respuesta, tiempo_ejecucion, cache_hit)
+    logger = _LOG if _LOG is not None else Logger.get_logger()
+    if CONSULTA < _NIVEL_MINIMO:
+        return
+
+    detalles = {
+        "consulta": consulta,
+        "respuesta": respuesta
+    }
+
+    if tiempo_ejecucion is not None:
+        detalles["tiempo_ejecucion"] = tiempo_ejecucion
+
+    if cache_hit is not None:
+        detalles["cache_hit"] = cache_hit
+
+    logger.consulta("Respuesta generada para: %s", consulta, extra={"detalles": detalles})
 
 
 def log_metrica(nombre: str, valor: Union[int, float, str],
@@ -360,7 +659,19 @@ def log_metrica(nombre: str, valor: Union[int, float, str],
         valor: Valor de la métrica
         contexto (dict, optional): Contexto adicional
     """
-    Logger.log_metrica(nombre, valor, contexto)
+    logger = _LOG if _LOG is not None else Logger.get_logger()
+    if METRICA < _NIVEL_MINIMO:
+        return
+
+    detalles = {
+        "metrica": nombre,
+        "valor": valor
+    }
+
+    if contexto:
+        detalles["contexto"] = contexto
+
+    logger.metrica("Métrica %s: %s", nombre, valor, extra={"detalles": detalles})
 
 
 def log_error(mensaje: str, error: Optional[Exception] = None,
@@ -373,7 +684,17 @@ def log_error(mensaje: str, error: Optional[Exception] = None,
         error (Exception, optional): Excepción original
         detalles (dict, optional): Detalles adicionales
     """
-    Logger.log_error(mensaje, error, detalles)
+    logger = _LOG if _LOG is not None else Logger.get_logger()
+    if logging.ERROR < _NIVEL_MINIMO:
+        return
+
+    extra_detalles = detalles or {}
+
+    if error:
+        extra_detalles["error_type"] = type(error).__name__
+        extra_detalles["error_message"] = str(error)
+
+    logger.error(mensaje, exc_info=error is not None, extra={"detalles": extra_detalles})
 
 
 def set_log_level(level_name: str) -> bool:
@@ -15,6 +15,15 @@ import logging
 # ERROR = 40
 # CRITICAL = 50
 
+# Niveles que se pueden seleccionar por nombre
+_LEVEL_MAP = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL
+}
+
 # Configuración por defecto
 DEFAULT_CONFIG = {
     # Nivel de log para la consola
@@ -29,6 +38,9 @@ DEFAULT_CONFIG = {
     # Nivel de log para consultas
     "consulta_level": 25,  # Nivel personalizado CONSULTA
     
+    # Máximo de registros pendientes de escribir; al llenarse se descartan los más antiguos
+    "queue_max_size": 10000,
+    
     # Mostrar información de depuración en la consola
     "show_debug_in_console": False,
     
@@ -108,11 +120,4 @@ def get_log_level_from_name(level_name):
     Returns:
         int: Nivel de log correspondiente
     """
-    level_map = {
-        "DEBUG": logging.DEBUG,
-        "INFO": logging.INFO,
-        "WARNING": logging.WARNING,
-        "ERROR": logging.ERROR,
-        "CRITICAL": logging.CRITICAL
-    }
-    return level_map.get(level_name.upper(), logging.INFO)
+    return _LEVEL_MAP.get(level_name.upper(), logging.INFO)
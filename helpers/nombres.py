@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Formato de nombres para el asistente de agenda.
+En la agenda los nombres se almacenan como [Apellido Paterno] [Apellido Materno] [Nombre(s)];
+este módulo calcula la forma natural ([Nombre(s)] [Apellido Paterno] [Apellido Materno])
+una sola vez al cargar los datos, en lugar de pedir al LLM que la deduzca en cada respuesta.
+"""
+
+from typing import Dict, Any
+
+# Columnas de nombre que se buscan; cada una tiene una copia normalizada (sin
+# acentos y en minúsculas) con el sufijo _norm para compararla sin LOWER()
+COLUMNAS_BUSQUEDA = ("nombre_completo", "nombre_alternativo", "nombre_s", "apellido_paterno", "apellido_materno")
+SUFIJO_NORMALIZADO = "_norm"
+
+# Columnas de texto que se filtran sin distinguir acentos ni mayúsculas; como las
+# de nombre, tienen una copia normalizada. La función se filtra por prefijo y su
+# copia está indexada; los estudios y el centro de trabajo son texto libre
+COLUMNAS_FILTRO = ("funcion", "estudios", "centro_trabajo")
+COLUMNAS_FILTRO_PREFIJO = ("funcion",)
+
+# Copias normalizadas, que solo sirven para buscar
+COLUMNAS_NORMALIZADAS = tuple(columna + SUFIJO_NORMALIZADO for columna in COLUMNAS_BUSQUEDA + COLUMNAS_FILTRO)
+
+# Columnas que contienen el nombre de la persona en alguna de sus formas
+COLUMNAS_NOMBRE = (("nombre_natural",) + COLUMNAS_BUSQUEDA
+                   + tuple(columna + SUFIJO_NORMALIZADO for columna in COLUMNAS_BUSQUEDA))
+
+def nombre_natural(registro: Dict[str, Any]) -> str:
+    """
+    Obtiene el nombre de un registro en orden natural y con mayúscula inicial.
+
+    Usa, por orden de preferencia, el campo nombre_natural ya calculado, los campos
+    separados (nombre_s y apellidos), nombre_alternativo (que ya está en orden natural)
+    o, como último recurso, nombre_completo suponiendo los apellidos al inicio.
+
+    Args:
+        registro (dict): Registro de la agenda (completo o parcial)
+
+    Returns:
+        str: Nombre en orden natural, o cadena vacía si el registro no tiene nombre
+    """
+    if registro.get("nombre_natural"):
+        return str(registro["nombre_natural"])
+
+    if registro.get("nombre_s"):
+        partes = [registro.get(campo) for campo in ("nombre_s", "apellido_paterno", "apellido_materno")]
+        return " ".join(str(p).strip() for p in partes if p).title()
+
+    if registro.get("nombre_alternativo"):
+        return " ".join(str(registro["nombre_alternativo"]).split()).title()
+
+    # Solo se separan los dos apellidos del inicio; el resto son los nombres
+    partes = str(registro.get("nombre_completo") or "").split(None, 2)
+    if len(partes) == 3:
+        partes = [" ".join(partes[2].split()), partes[0], partes[1]]
+    elif len(partes) == 2:
+        partes = [partes[1], partes[0]]
+    return " ".join(partes).title()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fragmentos de texto compartidos por los prompts del asistente de agenda.
+Este módulo centraliza los bloques que se repiten de forma idéntica en
+varios prompts para que todos reutilicen la misma cadena.
+"""
+
+import sys
+
+# Mapeo de roles y funciones a valores de función_específica
+MAPEO_ROLES = sys.intern("""    MAPEO DE CONCEPTOS A CAMPOS DE LA BASE DE DATOS:
+
+    1. ROLES Y FUNCIONES:
+       - "docentes", "maestros", "profesores" → función_específica = 'DOCENTE FRENTE A GRUPO'
+       - "directores" → función_específica = 'DIRECTOR'
+       - "subdirectores académicos" → función_específica = 'SUBDIRECTOR ACADÉMICO'
+       - "subdirectores de gestión" → función_específica = 'SUBDIRECTOR DE GESTIÓN'
+       - "subdirectores" (genérico) → función_específica IN ('SUBDIRECTOR ACADÉMICO', 'SUBDIRECTOR DE GESTIÓN')
+       - "personal de aula de medios", "encargados de tecnología" → función_específica = 'TICAD'S (AULA DE MEDIOS)'
+       - "veladores", "personal de vigilancia" → función_específica = 'VELADOR'
+       - "ASPE", "personal de apoyo" → función_específica = 'ASPE'""")
+
+# Mapeo completo de conceptos del lenguaje natural a campos de la base de datos
+MAPEO_CONCEPTOS = sys.intern(MAPEO_ROLES + """
+       - "a qué se dedica", "función", "cargo", "puesto" → función_específica
+
+    2. DATOS DE CONTACTO:
+       - "teléfono", "número", "celular", "móvil" → teléfono_celular, teléfono_particular
+       - "correo", "email", "correo electrónico" → dirección_de_correo_electrónica
+       - "dirección", "domicilio", "dónde vive" → domicilio_particular
+
+    3. DATOS LABORALES:
+       - "centro de trabajo", "escuela", "dónde trabaja" → nombre_del_c_t
+       - "clave del centro de trabajo" → clave_de_c_t_en_el_que_labora
+       - "doble plaza" → el_trabajador_cuenta_con_doble_plaza
+       - "fecha de ingreso", "antigüedad", "cuándo empezó" → fecha_ingreso_a_la_sep
+       - "sector" → sector
+       - "zona" → zona
+
+    4. DATOS ACADÉMICOS:
+       - "estudios", "formación", "preparación" → último_grado_de_estudios
+
+    5. DATOS PERSONALES:
+       - "estado civil", "casado", "soltero" → estado_civil
+       - "CURP" → curp
+       - "RFC" → filiación_o_rfc_con_homonimia""")
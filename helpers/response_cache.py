@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Caché de respuestas en lenguaje natural para el asistente de agenda.
+Este módulo guarda en disco (SQLite) las respuestas generadas por el LLM,
+indexadas por la consulta normalizada, los registros encontrados y la
+estrategia utilizada, para no repetir la llamada al LLM cuando se vuelve a
+hacer la misma pregunta sobre los mismos datos.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Any, Optional
+from config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_FILE,
+    RESPONSE_CACHE_MAX_SIZE,
+    RESPONSE_CACHE_TTL
+)
+
+class ResponseCache:
+    """
+    Caché persistente de respuestas respaldado por SQLite.
+    Cada entrada guarda el texto de la respuesta y su fecha de creación;
+    las entradas más antiguas que el TTL se eliminan al escribir.
+    """
+
+    def __init__(self, db_file: str = RESPONSE_CACHE_FILE, max_size: int = RESPONSE_CACHE_MAX_SIZE, ttl: int = RESPONSE_CACHE_TTL):
+        """
+        Inicializa el caché de respuestas.
+
+        Args:
+            db_file (str): Ruta al archivo SQLite del caché
+            max_size (int): Número máximo de respuestas almacenadas
+            ttl (int): Tiempo de vida de las respuestas en segundos
+        """
+        self.db_file = db_file
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._inicializado = False
+
+        # Conexión abierta por cada hilo, reutilizada entre consultas
+        self._local = threading.local()
+
+        # Bandera para indicar si el caché está habilitado
+        self.enabled = RESPONSE_CACHE_ENABLED
+
+    def _conectar(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual al archivo del caché, abriéndola en
+        el primer uso y creando la tabla si no existe.
+
+        Returns:
+            sqlite3.Connection: Conexión abierta (no debe cerrarse)
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        if not self._inicializado:
+            os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+
+        conn = sqlite3.connect(self.db_file)
+
+        if not self._inicializado:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, text BLOB, ts INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_ts ON cache (ts)")
+            conn.commit()
+            self._inicializado = True
+
+        self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def normalizar_consulta(consulta: str) -> str:
+        """
+        Normaliza una consulta: minúsculas, sin acentos ni puntuación final.
+
+        Args:
+            consulta (str): Consulta del usuario
+
+        Returns:
+            str: Consulta normalizada
+        """
+        texto = unicodedata.normalize("NFKD", consulta).lower().strip()
+        texto = "".join(c for c in texto if not unicodedata.combining(c))
+        texto = " ".join(texto.split())
+        return texto.strip("¿?¡!.,;: ")
+
+    @classmethod
+    def generar_clave(cls, consulta: str, resultados: Dict[str, Any], huella: str) -> str:
+        """
+        Genera la clave de una respuesta.
+
+        Los resultados se identifican por los ids de los registros (ordenados);
+        si la consulta no devolvió la columna id, se usan las filas completas.
+
+        Args:
+            consulta (str): Consulta original del usuario
+            resultados (dict): Resultados de la consulta SQL
+            huella (str): Huella de la estrategia (helpers.fingerprint.estrategia_fingerprint)
+
+        Returns:
+            str: Hash SHA-256 de la consulta, los registros y la huella de la estrategia
+        """
+        columnas = resultados.get("columnas", [])
+        filas = resultados.get("filas", [])
+        if "id" in columnas:
+            idx_id = columnas.index("id")
+            registros = sorted(str(fila[idx_id]) for fila in filas)
+        else:
+            registros = [repr(fila) for fila in filas]
+
+        h = hashlib.sha256()
+        h.update(cls.normalizar_consulta(consulta).encode("utf-8"))
+        h.update(b"\0")
+        h.update(",".join(registros).encode("utf-8"))
+        h.update(b"\0")
+        h.update(huella.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, clave: str) -> Optional[str]:
+        """
+        Obtiene una respuesta del caché.
+
+        Args:
+            clave (str): Clave generada con generar_clave
+
+        Returns:
+            str: Respuesta almacenada, o None si no existe o expiró
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            conn = self._conectar()
+            fila = conn.execute(
+                "SELECT text FROM cache WHERE key = ? AND ts >= ?",
+                (clave, int(time.time()) - self.ttl)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error al leer el caché de respuestas: {e}")
+            return None
+
+        if fila is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return fila[0].decode("utf-8")
+
+    def put(self, clave: str, texto: str) -> None:
+        """
+        Guarda una respuesta en el caché y elimina las entradas expiradas.
+
+        Args:
+            clave (str): Clave generada con generar_clave
+            texto (str): Respuesta a almacenar
+        """
+        if not self.enabled:
+            return
+
+        ahora = int(time.time())
+        try:
+            conn = self._conectar()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, text, ts) VALUES (?, ?, ?)",
+                    (clave, texto.encode("utf-8"), ahora)
+                )
+                conn.execute("DELETE FROM cache WHERE ts < ?", (ahora - self.ttl,))
+                # Limitar el tamaño eliminando las entradas más antiguas
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY ts DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,)
+                )
+        except sqlite3.Error as e:
+            print(f"Error al guardar en el caché de respuestas: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas del caché.
+
+        Returns:
+            dict: Estadísticas del caché (tamaño, hits, misses, etc.)
+        """
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total) * 100 if total > 0 else 0
+
+        try:
+            conn = self._conectar()
+            size = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        except sqlite3.Error:
+            size = 0
+
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{hit_rate:.2f}%"
+        }
+
+# Instancia global del caché
+response_cache = ResponseCache()
@@ -9,10 +9,32 @@ generadas por el LLM para almacenar y recuperar resultados de consultas.
 
 import os
 import time
+import atexit
+import queue
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional
+import orjson
 from helpers.base_cache import BaseCache
 from helpers.llm_normalizer import normalizar_clave_con_llm
-from config import SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_MAX_SIZE, SEMANTIC_CACHE_FILE
+from config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_SIZE,
+    SEMANTIC_CACHE_FILE,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MODEL,
+    EMBEDDING_CACHE_INDEX_FILE,
+    EMBEDDING_CACHE_THRESHOLD,
+    EMBEDDING_CACHE_TTL
+)
+
+# Dependencias opcionales del caché por similitud de embeddings
+try:
+    import numpy as np
+    import faiss
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
 
 # Ruta por defecto para el archivo de caché (usar la configuración si está disponible)
 DEFAULT_CACHE_PATH = SEMANTIC_CACHE_FILE
@@ -24,6 +46,9 @@ class SemanticCache(BaseCache):
     de volver a consultar la base de datos.
     """
 
+    # Tamaño del diario a partir del cual se adelanta la siguiente instantánea (bytes)
+    MAX_BYTES_DIARIO = 10 * 1024 * 1024
+
     def __init__(self, cache_path: str = DEFAULT_CACHE_PATH, max_size: int = SEMANTIC_CACHE_MAX_SIZE, ttl: int = 86400):
         """
         Inicializa el caché semántico.
@@ -35,22 +60,44 @@ class SemanticCache(BaseCache):
         """
         super().__init__(max_size, cache_path, ttl)
 
+        # Orden de uso (LRU): la entrada menos usada recientemente queda al principio
+        self.cache = OrderedDict()
+
+        # Protege self.cache: lo modifican los hilos del servidor y lo copia la
+        # instantánea. Las llamadas al LLM para normalizar claves se hacen fuera
+        self._lock = threading.Lock()
+
+        # Persistencia en segundo plano: cada set se añade a un diario (append-only)
+        # y la instantánea completa solo se reescribe cada save_interval segundos
+        self.journal_file = cache_path + ".jnl"
+        self._cola_persistencia = queue.Queue()
+        self._hilo_persistencia = None
+        self._diario = None
+        self._bytes_diario = 0
+        self._snapshot_pendiente = False
+
         # Bandera para indicar si el caché está habilitado
         self.enabled = SEMANTIC_CACHE_ENABLED
 
         # Cargar caché existente si existe y está habilitado
         if self.enabled:
             self.load_from_disk()
+            self._iniciar_persistencia()
             print(f"Caché semántico inicializado y habilitado. Tamaño máximo: {max_size} entradas.")
         else:
             print("Caché semántico inicializado pero DESHABILITADO. Las consultas no se almacenarán en caché.")
 
-    def get(self, clave_semantica: str) -> Optional[Dict[str, Any]]:
+    def get(self, clave_semantica: str, canonica: bool = False) -> Optional[Dict[str, Any]]:
         """
         Obtiene un resultado del caché usando la clave semántica.
 
+        Primero busca la clave tal como la generó el LLM (las claves ya vistas se
+        guardan como alias de su forma normalizada) y solo si no está se normaliza
+        con el LLM y se vuelve a buscar.
+
         Args:
             clave_semantica (str): Clave semántica generada por el LLM
+            canonica (bool): La clave ya es canónica (ruta rápida) y no se normaliza con el LLM
 
         Returns:
             dict: Resultado almacenado en caché, o None si no existe
@@ -60,54 +107,143 @@ class SemanticCache(BaseCache):
             self.misses += 1
             return None
 
-        # Normalizar clave
-        clave = self._normalizar_clave(clave_semantica)
-
-        # Verificar si existe en caché
-        if clave in self.cache:
-            # Verificar si ha expirado
-            entry = self.cache[clave]
-            if "timestamp" in entry and time.time() - entry["timestamp"] > self.ttl:
-                # Entrada expirada, eliminarla
-                del self.cache[clave]
-                self.misses += 1
-                return None
+        with self._lock:
+            self._barrer_expiradas()
+            datos = self._usar_entrada(clave_semantica, clave_semantica)
 
-            # Actualizar estadísticas
-            self.hits += 1
+        if datos is None and not canonica:
+            clave = self._normalizar_clave(clave_semantica)
+            with self._lock:
+                datos = self._usar_entrada(clave, clave_semantica)
 
-            # Actualizar timestamp para mantener la entrada "fresca"
-            self.cache[clave]["timestamp"] = time.time()
+        # No encontrado en caché
+        if datos is None:
+            self.misses += 1
+            return None
 
-            return self.cache[clave]["data"]
+        # Actualizar estadísticas
+        self.hits += 1
 
-        # No encontrado en caché
-        self.misses += 1
-        return None
+        return datos
+
+    def _usar_entrada(self, clave: str, clave_semantica: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca una entrada vigente y, si existe, actualiza su timestamp para
+        mantenerla "fresca" y la marca como la más reciente. Debe llamarse con
+        self._lock adquirido.
+
+        Args:
+            clave (str): Clave original o normalizada
+            clave_semantica (str): Clave semántica generada por el LLM (su alias
+                también se marca como reciente)
+
+        Returns:
+            dict: Datos de la entrada, o None si no existe
+        """
+        clave = self._buscar_vigente(clave)
+        if clave is None:
+            return None
+
+        # Se sustituye la entrada en lugar de modificarla: la original puede
+        # estar en la cola del diario
+        entry = self.cache[clave] = {**self.cache[clave], "timestamp": time.time()}
+        self.cache.move_to_end(clave)
+        if clave_semantica != clave and clave_semantica in self.cache:
+            self.cache.move_to_end(clave_semantica)
+
+        return entry["data"]
+
+    def _barrer_expiradas(self) -> None:
+        """
+        Elimina las entradas expiradas del principio del caché.
+
+        Como cada uso actualiza el timestamp y mueve la entrada al final, el orden
+        LRU es también el orden de expiración: basta con revisar el principio
+        hasta encontrar una entrada vigente, sin recorrer todo el caché.
+        """
+        if not self.ttl:
+            return
+
+        limite = time.time() - self.ttl
+        while self.cache:
+            entry = next(iter(self.cache.values()))
+            timestamp = self._get_entry_timestamp(entry)
+            if timestamp is None or timestamp >= limite:
+                break
+            self.cache.popitem(last=False)
+
+    def _buscar_vigente(self, clave: str) -> Optional[str]:
+        """
+        Busca una entrada vigente, resolviendo los alias y eliminando las expiradas.
+        Debe llamarse con self._lock adquirido.
+
+        Args:
+            clave (str): Clave original o normalizada
+
+        Returns:
+            str: Clave normalizada de la entrada con los datos, o None si no existe
+        """
+        entry = self.cache.get(clave)
+        if entry is None:
+            return None
+
+        if "timestamp" in entry and time.time() - entry["timestamp"] > self.ttl:
+            # Entrada expirada, eliminarla
+            del self.cache[clave]
+            return None
+
+        if "alias" in entry:
+            # Un alias solo se resuelve a una entrada con datos (nunca a otro alias)
+            destino = entry["alias"]
+            if "data" not in self.cache.get(destino, {}):
+                return None
+            return self._buscar_vigente(destino)
+
+        return clave
 
-    def set(self, clave_semantica: str, data: Dict[str, Any]) -> None:
+    def set(self, clave_semantica: str, data: Dict[str, Any], canonica: bool = False) -> None:
         """
         Guarda un resultado en el caché usando la clave semántica.
+        La clave original se guarda como alias de la normalizada para que las
+        búsquedas posteriores con la misma clave no necesiten al LLM.
 
         Args:
             clave_semantica (str): Clave semántica generada por el LLM
             data (dict): Datos a almacenar en caché
+            canonica (bool): La clave ya es canónica (ruta rápida) y no se normaliza con el LLM
         """
         # Si el caché está deshabilitado, no hacer nada
         if not self.enabled:
             return
 
         # Normalizar clave
-        clave = self._normalizar_clave(clave_semantica)
+        clave = clave_semantica if canonica else self._normalizar_clave(clave_semantica)
+        ahora = time.time()
 
         # Guardar en caché con timestamp
-        self.cache[clave] = {
-            "data": data,
-            "timestamp": time.time()
-        }
+        entradas = [(clave, {"data": data, "timestamp": ahora})]
+        if clave_semantica != clave:
+            entradas.append((clave_semantica, {"alias": clave, "timestamp": ahora}))
+
+        # Las tareas del diario se encolan con el lock adquirido para que sigan
+        # el mismo orden que los cambios y las instantáneas
+        with self._lock:
+            self._barrer_expiradas()
+
+            for clave_entrada, entry in entradas:
+                self.cache[clave_entrada] = entry
+                self.cache.move_to_end(clave_entrada)
+
+                # Registrar la entrada nueva en el diario
+                self._cola_persistencia.put(("entrada", (clave_entrada, entry)))
 
-        # Verificar si es momento de guardar en disco
-        self._check_save_to_disk()
+            # Desalojar las entradas menos usadas recientemente
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+            # Verificar si es momento de reescribir la instantánea
+            if self._snapshot_pendiente or self._should_save_to_disk():
+                self._programar_snapshot()
 
     def _get_entry_timestamp(self, entry: Any) -> Optional[float]:
         """
@@ -138,7 +274,7 @@ class SemanticCache(BaseCache):
                 "hits": self.hits,
                 "misses": self.misses
             },
-            "entries": self.cache
+            "entries": dict(self.cache)
         }
 
     def _process_loaded_data(self, data: Dict[str, Any]) -> None:
@@ -152,7 +288,7 @@ class SemanticCache(BaseCache):
             # Verificar formato
             if isinstance(data, dict) and "entries" in data:
                 # Formato estándar
-                self.cache = data["entries"]
+                self.cache = OrderedDict(data["entries"])
 
                 # Cargar estadísticas si existen
                 if "metadata" in data:
@@ -163,19 +299,19 @@ class SemanticCache(BaseCache):
             elif isinstance(data, dict) and any(isinstance(v, dict) for v in data.values()):
                 # Formato alternativo (diccionario de entradas sin metadata)
                 print("ADVERTENCIA: Formato de caché no estándar, intentando reparar")
-                self.cache = data
+                self.cache = OrderedDict(data)
                 print(f"DEBUG: Caché semántico reparado: {len(self.cache)} entradas")
             else:
                 # Formato desconocido
                 print("ERROR: Formato de caché inválido, inicializando vacío")
-                self.cache = {}
+                self.cache = OrderedDict()
 
             # Limpiar entradas expiradas
             self._clean_expired_entries()
         except Exception as e:
             # En caso de cualquier error, inicializar vacío
             print(f"ERROR: Error al procesar datos del caché: {str(e)}")
-            self.cache = {}
+            self.cache = OrderedDict()
 
     def _normalizar_clave(self, clave: str) -> str:
         """
@@ -190,9 +326,125 @@ class SemanticCache(BaseCache):
         # Usar el LLM para normalizar la clave
         return normalizar_clave_con_llm(clave)
 
+    def _iniciar_persistencia(self) -> None:
+        """
+        Inicia el hilo que escribe el diario y las instantáneas del caché.
+        """
+        if self._hilo_persistencia is not None:
+            return
+
+        self._hilo_persistencia = threading.Thread(target=self._persistir, name="semantic-cache-persistencia", daemon=True)
+        self._hilo_persistencia.start()
+        atexit.register(self._detener_persistencia)
+
+    def _detener_persistencia(self) -> None:
+        """
+        Espera a que se escriban las tareas pendientes y detiene el hilo de persistencia.
+        """
+        if self._hilo_persistencia is None:
+            return
+
+        self._cola_persistencia.put(None)
+        self._hilo_persistencia.join(timeout=5)
+        self._hilo_persistencia = None
+
+    def _persistir(self) -> None:
+        """
+        Bucle del hilo de persistencia: añade las entradas al diario y escribe
+        las instantáneas en el orden en que se encolaron.
+        """
+        while True:
+            tarea = self._cola_persistencia.get()
+            try:
+                if tarea is None:
+                    if self._diario is not None:
+                        self._diario.close()
+                        self._diario = None
+                    return
+
+                tipo, datos = tarea
+                if tipo == "entrada":
+                    self._escribir_diario(*datos)
+                elif self._escribir_snapshot(datos):
+                    # La instantánea incluye todo lo registrado antes en el diario
+                    self._vaciar_diario()
+            except Exception as e:
+                print(f"ERROR: Error al persistir el caché semántico: {str(e)}")
+            finally:
+                self._cola_persistencia.task_done()
+
+    def _escribir_diario(self, clave: str, entry: Dict[str, Any]) -> None:
+        """
+        Añade una entrada al diario del caché.
+
+        Args:
+            clave (str): Clave de la entrada
+            entry (dict): Entrada del caché (datos o alias y timestamp)
+        """
+        if self._diario is None:
+            os.makedirs(os.path.dirname(self.journal_file) or ".", exist_ok=True)
+            self._diario = open(self.journal_file, "ab", buffering=0)
+            self._bytes_diario = self._diario.tell()
+
+        linea = orjson.dumps({"k": clave, "e": entry}, option=orjson.OPT_NON_STR_KEYS, default=str) + b"\n"
+        self._diario.write(linea)
+        self._bytes_diario += len(linea)
+
+        if self._bytes_diario > self.MAX_BYTES_DIARIO:
+            self._snapshot_pendiente = True
+
+    def _vaciar_diario(self) -> None:
+        """
+        Vacía el diario tras escribir una instantánea completa.
+        """
+        if self._diario is None:
+            self._diario = open(self.journal_file, "ab", buffering=0)
+        self._diario.truncate(0)
+        self._bytes_diario = 0
+
+    def _programar_snapshot(self) -> None:
+        """
+        Encola la escritura de una instantánea del caché en el hilo de persistencia.
+        Debe llamarse con self._lock adquirido.
+        """
+        self.last_save_time = time.time()
+        self._snapshot_pendiente = False
+        self._cola_persistencia.put(("snapshot", self._prepare_data_for_save()))
+
+    def _reproducir_diario(self) -> int:
+        """
+        Aplica sobre el caché cargado las entradas registradas en el diario.
+
+        Returns:
+            int: Número de entradas recuperadas del diario
+        """
+        if not os.path.exists(self.journal_file):
+            return 0
+
+        recuperadas = 0
+        with open(self.journal_file, "rb") as f:
+            for linea in f:
+                try:
+                    registro = orjson.loads(linea)
+                except orjson.JSONDecodeError:
+                    # Línea incompleta por una interrupción durante la escritura
+                    continue
+                self.cache[registro["k"]] = registro["e"]
+                self.cache.move_to_end(registro["k"])
+                recuperadas += 1
+
+        if recuperadas:
+            self._clean_expired_entries()
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+            print(f"DEBUG: Se recuperaron {recuperadas} entradas del diario del caché semántico")
+
+        return recuperadas
+
     def save_to_disk(self) -> bool:
         """
         Guarda el caché en disco si está habilitado.
+        La escritura la hace el hilo de persistencia; este método espera a que termine.
 
         Returns:
             bool: True si se guardó correctamente, False en caso contrario
@@ -201,11 +453,18 @@ class SemanticCache(BaseCache):
             print("DEBUG: Caché semántico deshabilitado, no se guardará en disco")
             return False
 
-        return super().save_to_disk()
+        if self._hilo_persistencia is None:
+            return super().save_to_disk()
+
+        with self._lock:
+            self._programar_snapshot()
+        self._cola_persistencia.join()
+        return True
 
     def load_from_disk(self) -> bool:
         """
-        Carga el caché desde disco si está habilitado.
+        Carga el caché desde disco si está habilitado: la última instantánea
+        y después las entradas registradas en el diario.
 
         Returns:
             bool: True si se cargó correctamente, False en caso contrario
@@ -214,7 +473,256 @@ class SemanticCache(BaseCache):
             print("DEBUG: Caché semántico deshabilitado, no se cargará desde disco")
             return False
 
-        return super().load_from_disk()
+        cargado = super().load_from_disk()
+        return self._reproducir_diario() > 0 or cargado
+
+class EmbeddingCache:
+    """
+    Caché de respuestas por similitud de la consulta (embeddings de oraciones).
+    Reconoce paráfrasis ("dame el teléfono de Luis", "número de Luis Pérez")
+    que el caché por clave exacta no detecta. Solo devuelve una respuesta si
+    la consulta es muy similar Y la estrategia calculada coincide con la de la
+    entrada almacenada.
+
+    El modelo y el índice se cargan en un hilo en segundo plano al crear el
+    caché; mientras no estén listos, las consultas se tratan como fallos. El
+    mismo hilo guarda el índice en disco cada save_interval segundos si hubo
+    cambios.
+
+    Requiere sentence-transformers y faiss; si no están instalados, el caché
+    queda deshabilitado.
+    """
+
+    def __init__(self, index_file: str = EMBEDDING_CACHE_INDEX_FILE, umbral: float = EMBEDDING_CACHE_THRESHOLD, ttl: int = EMBEDDING_CACHE_TTL):
+        """
+        Inicializa el caché por similitud.
+
+        Args:
+            index_file (str): Ruta del índice FAISS (las entradas se guardan en index_file + ".json")
+            umbral (float): Similitud coseno mínima para considerar un acierto
+            ttl (int): Tiempo de vida de las entradas en segundos
+        """
+        self.index_file = index_file
+        self.entries_file = index_file + ".json"
+        self.umbral = umbral
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.save_interval = 300  # 5 minutos
+
+        # El modelo y el índice los carga el hilo de fondo
+        self.modelo = None
+        self.index = None
+        self.entries = []
+
+        # El índice y las entradas se modifican juntos: las posiciones del índice
+        # deben corresponder siempre a las de self.entries
+        self._lock = threading.Lock()
+        self._lock_escritura = threading.Lock()
+        self._listo = threading.Event()
+        self._detener = threading.Event()
+        self._pendiente = False
+        self._hilo = None
+
+        # Bandera para indicar si el caché está habilitado
+        self.enabled = EMBEDDING_CACHE_ENABLED and SentenceTransformer is not None
+
+        if self.enabled:
+            self._iniciar_hilo()
+
+    def _iniciar_hilo(self) -> None:
+        """
+        Inicia el hilo que carga el modelo y guarda el índice periódicamente.
+        """
+        self._hilo = threading.Thread(target=self._trabajar, name="embedding-cache", daemon=True)
+        self._hilo.start()
+        atexit.register(self._detener_hilo)
+
+    def _detener_hilo(self) -> None:
+        """
+        Detiene el hilo de fondo, que guarda los cambios pendientes antes de terminar.
+        """
+        if self._hilo is None:
+            return
+
+        self._detener.set()
+        self._hilo.join(timeout=5)
+        self._hilo = None
+
+    def _trabajar(self) -> None:
+        """
+        Bucle del hilo de fondo: carga el modelo y después guarda el índice
+        cada save_interval segundos si hubo cambios.
+        """
+        try:
+            self._inicializar()
+        except Exception as e:
+            print(f"ERROR: No se pudo cargar el modelo de embeddings: {str(e)}")
+            self.enabled = False
+            return
+
+        self._listo.set()
+
+        while True:
+            detenido = self._detener.wait(self.save_interval)
+            if self._pendiente:
+                self.save_to_disk()
+            if detenido:
+                return
+
+    def _inicializar(self) -> None:
+        """
+        Carga el modelo de embeddings y el índice guardado en disco, si existe.
+        """
+        self.modelo = SentenceTransformer(EMBEDDING_CACHE_MODEL)
+        dimension = self.modelo.get_sentence_embedding_dimension()
+
+        if os.path.exists(self.index_file) and os.path.exists(self.entries_file):
+            try:
+                self.index = faiss.read_index(self.index_file)
+                with open(self.entries_file, "rb") as f:
+                    self.entries = orjson.loads(f.read())
+                if self.index.ntotal == len(self.entries):
+                    return
+                print("ADVERTENCIA: Índice de embeddings inconsistente, inicializando vacío")
+            except Exception as e:
+                print(f"ERROR: Error al cargar el índice de embeddings: {str(e)}")
+
+        self.index = faiss.IndexFlatIP(dimension)
+        self.entries = []
+
+    def _vectorizar(self, consulta: str):
+        """
+        Calcula el embedding normalizado (L2) de una consulta.
+
+        Args:
+            consulta (str): Consulta del usuario
+
+        Returns:
+            numpy.ndarray: Matriz 1 x dimensión en float32
+        """
+        vector = self.modelo.encode([consulta], normalize_embeddings=True)
+        return np.asarray(vector, dtype="float32")
+
+    def get(self, consulta: str, huella: str) -> Optional[str]:
+        """
+        Busca la respuesta de una consulta similar con la misma estrategia.
+
+        Args:
+            consulta (str): Consulta del usuario
+            huella (str): Huella de la estrategia calculada para la consulta (estrategia_fingerprint)
+
+        Returns:
+            str: Respuesta almacenada, o None si no hay una entrada suficientemente similar
+                o el modelo aún no está cargado
+        """
+        if not self.enabled or not self._listo.is_set():
+            self.misses += 1
+            return None
+
+        with self._lock:
+            if self.index.ntotal == 0:
+                self.misses += 1
+                return None
+
+        vector = self._vectorizar(consulta)
+
+        with self._lock:
+            puntuaciones, indices = self.index.search(vector, 1)
+            puntuacion, indice = float(puntuaciones[0][0]), int(indices[0][0])
+            if indice < 0 or puntuacion < self.umbral:
+                self.misses += 1
+                return None
+
+            entry = self.entries[indice]
+            if entry["expira"] < time.time() or entry["estrategia_hash"] != huella:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry["respuesta"]
+
+    def set(self, consulta: str, huella: str, respuesta: str) -> None:
+        """
+        Guarda la respuesta de una consulta y elimina las entradas expiradas.
+        No escribe en disco: el hilo de fondo guarda los cambios periódicamente.
+
+        Args:
+            consulta (str): Consulta del usuario
+            huella (str): Huella de la estrategia utilizada (estrategia_fingerprint)
+            respuesta (str): Respuesta generada
+        """
+        if not self.enabled or not self._listo.is_set():
+            return
+
+        vector = self._vectorizar(consulta)
+        ahora = time.time()
+
+        with self._lock:
+            # Eliminar entradas expiradas reconstruyendo el índice con las vigentes
+            vigentes = [i for i, entry in enumerate(self.entries) if entry["expira"] >= ahora]
+            if len(vigentes) < len(self.entries):
+                vectores = self.index.reconstruct_n(0, self.index.ntotal)[vigentes]
+                self.index.reset()
+                if len(vigentes):
+                    self.index.add(vectores)
+                self.entries = [self.entries[i] for i in vigentes]
+
+            self.index.add(vector)
+            self.entries.append({
+                "estrategia_hash": huella,
+                "respuesta": respuesta,
+                "expira": ahora + self.ttl
+            })
+            self._pendiente = True
+
+    def save_to_disk(self) -> bool:
+        """
+        Guarda el índice y las entradas en disco. Se copian con el caché
+        bloqueado y se escriben fuera del bloqueo, para no detener las consultas.
+
+        Returns:
+            bool: True si se guardó correctamente, False en caso contrario
+        """
+        if not self.enabled or not self._listo.is_set():
+            return False
+
+        with self._lock_escritura:
+            with self._lock:
+                index = faiss.clone_index(self.index)
+                entries = orjson.dumps(self.entries)
+                self._pendiente = False
+
+            try:
+                os.makedirs(os.path.dirname(self.index_file) or ".", exist_ok=True)
+                faiss.write_index(index, self.index_file)
+                with open(self.entries_file, "wb") as f:
+                    f.write(entries)
+                return True
+            except Exception as e:
+                print(f"ERROR: Error al guardar el índice de embeddings: {str(e)}")
+                self._pendiente = True
+                return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas del caché.
+
+        Returns:
+            dict: Estadísticas del caché (tamaño, hits, misses, etc.)
+        """
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total) * 100 if total > 0 else 0
+
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{hit_rate:.2f}%"
+        }
 
 # Instancia global del caché
 semantic_cache = SemanticCache()
+
+# Instancia global del caché por similitud
+embedding_cache = EmbeddingCache()
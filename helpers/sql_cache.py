@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Caché de resultados SQL para el asistente de agenda.
+Este módulo almacena los resultados de las consultas SQL generadas por el LLM,
+indexados por la consulta y sus parámetros, para no volver a ejecutar
+consultas idénticas (por ejemplo, listados repetidos) contra la base de datos.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from helpers.base_cache import BaseCache
+from config import SQL_CACHE_ENABLED, SQL_CACHE_MAX_SIZE, SQL_CACHE_TTL
+
+class SQLResultCache(BaseCache):
+    """
+    Caché en memoria de resultados SQL.
+    Cada entrada guarda la fecha de modificación de la base de datos en el
+    momento de la consulta; si la base de datos cambia, la entrada se invalida.
+    El caché se comparte entre los hilos del servidor, así que sus cambios se
+    hacen con un lock.
+    """
+
+    def __init__(self, max_size: int = SQL_CACHE_MAX_SIZE, ttl: int = SQL_CACHE_TTL):
+        """
+        Inicializa el caché de resultados SQL.
+
+        Args:
+            max_size (int): Tamaño máximo del caché (número de entradas)
+            ttl (int): Tiempo de vida de las entradas en segundos
+        """
+        super().__init__(max_size, None, ttl)
+
+        # Bandera para indicar si el caché está habilitado
+        self.enabled = SQL_CACHE_ENABLED
+
+        # Protege self.cache frente a peticiones simultáneas
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def generar_clave(consulta_sql: str, parametros: List[Any], db_path: str) -> str:
+        """
+        Genera la clave del caché a partir de la consulta y sus parámetros.
+
+        Args:
+            consulta_sql (str): Consulta SQL
+            parametros (list): Parámetros de la consulta
+            db_path (str): Ruta a la base de datos SQLite
+
+        Returns:
+            str: Hash SHA-256 de la consulta, los parámetros y la ruta
+        """
+        contenido = f"{db_path}\n{consulta_sql}\n{parametros!r}"
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _obtener_mtime(db_path: str) -> Optional[float]:
+        """
+        Obtiene la fecha de modificación de la base de datos.
+
+        Args:
+            db_path (str): Ruta a la base de datos SQLite
+
+        Returns:
+            float: Fecha de modificación o None si no se puede obtener
+        """
+        try:
+            return os.path.getmtime(db_path)
+        except OSError:
+            return None
+
+    def get(self, consulta_sql: str, parametros: List[Any], db_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el resultado de una consulta SQL si está en caché y sigue vigente.
+
+        Args:
+            consulta_sql (str): Consulta SQL
+            parametros (list): Parámetros de la consulta
+            db_path (str): Ruta a la base de datos SQLite
+
+        Returns:
+            dict: Resultado almacenado ({total, columnas, filas, error}) o None si no existe
+        """
+        if not self.enabled:
+            self.misses += 1
+            return None
+
+        clave = self.generar_clave(consulta_sql, parametros, db_path)
+        db_mtime = self._obtener_mtime(db_path)
+        with self._lock:
+            entry = self.cache.get(clave)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # Invalidar si expiró o si la base de datos cambió desde que se guardó
+            expirada = self.ttl and time.time() - entry["timestamp"] > self.ttl
+            if expirada or entry["db_mtime"] != db_mtime:
+                self.cache.pop(clave, None)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return dict(entry["data"])
+
+    def set(self, consulta_sql: str, parametros: List[Any], db_path: str, data: Dict[str, Any]) -> None:
+        """
+        Guarda el resultado de una consulta SQL en el caché.
+
+        Args:
+            consulta_sql (str): Consulta SQL
+            parametros (list): Parámetros de la consulta
+            db_path (str): Ruta a la base de datos SQLite
+            data (dict): Resultado de la consulta
+        """
+        if not self.enabled:
+            return
+
+        clave = self.generar_clave(consulta_sql, parametros, db_path)
+        entry = {
+            "data": data,
+            "timestamp": time.time(),
+            "db_mtime": self._obtener_mtime(db_path)
+        }
+        with self._lock:
+            # Limitar el tamaño del caché eliminando la entrada más antigua
+            if clave not in self.cache and len(self.cache) >= self.max_size:
+                self.cache.pop(next(iter(self.cache)), None)
+            self.cache[clave] = entry
+
+# Instancia global del caché
+sql_cache = SQLResultCache()
@@ -8,15 +8,41 @@ y realizar consultas SQL directamente.
 """
 
 import os
+import re
 import sqlite3
 import json
-import pandas as pd
+import unicodedata
+from functools import lru_cache
+from itertools import groupby
 from typing import List, Dict, Any, Tuple, Optional
+from helpers.nombres import nombre_natural, COLUMNAS_BUSQUEDA, COLUMNAS_FILTRO, COLUMNAS_FILTRO_PREFIJO, SUFIJO_NORMALIZADO
+from helpers.conexion_db import obtener_conexion_lectura
 
 # Directorio para la base de datos
 DB_DIR = "datos"
 DB_PATH = os.path.join(DB_DIR, "agenda.db")
 
+# Caracteres que obligan a normalizar el nombre de un campo para usarlo como columna
+_CARACTERES_ESPECIALES = frozenset("=-/\\:;,'\"?¿!¡%&$#@+* .()")
+
+# Tabla que sustituye por guion bajo los caracteres no válidos en un nombre de columna
+_TABLA_ESPECIALES = str.maketrans(dict.fromkeys(" .()\n=-/\\:;,'\"?¿!¡%&$#@+*", "_"))
+_GUIONES_BAJOS = re.compile(r"_{2,}")
+
+def normalizar_nombre_columna(campo: str) -> str:
+    """
+    Convierte el nombre de un campo en un nombre de columna de SQLite:
+    minúsculas, caracteres especiales sustituidos por un solo guion bajo y sin
+    guiones bajos al inicio ni al final.
+
+    Args:
+        campo: Nombre original del campo
+
+    Returns:
+        str: Nombre normalizado (puede quedar vacío si el campo solo tenía signos)
+    """
+    return _GUIONES_BAJOS.sub("_", campo.lower().translate(_TABLA_ESPECIALES)).strip("_")
+
 def crear_base_datos(registros: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Crea una base de datos SQLite a partir de los registros de la agenda.
@@ -33,60 +59,69 @@ def crear_base_datos(registros: List[Dict[str, Any]]) -> Dict[str, Any]:
         "db_path": DB_PATH
     }
 
+    # La base de datos se construye en memoria y se escribe de una sola vez en
+    # un archivo temporal que reemplaza a la anterior al terminar, para no dejar
+    # nunca una base de datos a medio crear
+    db_temporal = DB_PATH + ".tmp"
+
     try:
         # Asegurarse de que el directorio existe
         os.makedirs(DB_DIR, exist_ok=True)
 
-        # Eliminar la base de datos si ya existe
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
+        # Eliminar restos de una creación anterior interrumpida
+        if os.path.exists(db_temporal):
+            os.remove(db_temporal)
 
-        # Crear conexión a la base de datos
-        conn = sqlite3.connect(DB_PATH)
+        # Crear la base de datos en memoria: la carga y los índices no escriben en disco
+        conn = sqlite3.connect(":memory:")
         cursor = conn.cursor()
 
-        # Obtener todos los campos únicos de los registros
-        campos_unicos = set()
+        # Ordenaciones de CREATE INDEX y de la tabla de texto completo también en memoria
+        cursor.execute("PRAGMA temp_store=MEMORY")
+
+        # Obtener todos los campos únicos de los registros (en orden de aparición)
+        campos_unicos = {}
         for registro in registros:
-            campos_unicos.update(registro.keys())
+            campos_unicos.update(dict.fromkeys(registro))
 
         # Asegurarse de que los campos básicos estén presentes
-        campos_basicos = ["id", "nombre_completo", "nombre_alternativo"]
+        campos_basicos = ["id", "nombre_completo", "nombre_alternativo", "nombre_natural"]
         for campo in campos_basicos:
-            if campo not in campos_unicos:
-                campos_unicos.add(campo)
+            campos_unicos.setdefault(campo, None)
 
-        # Crear la definición de la tabla dinámicamente
+        # Crear la definición de la tabla dinámicamente; el nombre normalizado de
+        # cada campo se calcula una sola vez y se reutiliza en el INSERT
         campos_sql = ["id INTEGER PRIMARY KEY"]
-        for campo in campos_unicos:
-            if campo != "id":  # id ya está definido
-                # Normalizar el nombre del campo para asegurar que sea válido en SQLite
-                campo_normalizado = campo
-
-                # Verificar si el campo contiene caracteres especiales
-                if any(char in campo for char in ["=", "-", "/", "\\", ":", ";", ",", "'", '"', "?", "¿", "!", "¡", "%", "&", "$", "#", "@", "+", "*", " ", ".", "(", ")"]):
-                    # Normalizar el campo
-                    campo_normalizado = campo.lower()
-                    # Reemplazar caracteres especiales
-                    for char in [" ", ".", "(", ")", "\n", "=", "-", "/", "\\", ":", ";", ",", "'", '"', "?", "¿", "!", "¡", "%", "&", "$", "#", "@", "+", "*"]:
-                        campo_normalizado = campo_normalizado.replace(char, "_")
-                    # Eliminar guiones bajos múltiples
-                    while "__" in campo_normalizado:
-                        campo_normalizado = campo_normalizado.replace("__", "_")
-                    # Eliminar guiones bajos al inicio y final
-                    campo_normalizado = campo_normalizado.strip("_")
-
-                # Determinar el tipo de datos
-                tipo = "TEXT"  # Por defecto, todo es texto
-                if campo in ["edad", "antiguedad"]:
-                    tipo = "INTEGER"
-
-                # Asegurarse de que el campo no esté vacío
-                if not campo_normalizado:
-                    campo_normalizado = f"campo_{len(campos_sql)}"
-
-                # Añadir comillas para evitar problemas con palabras reservadas
-                campos_sql.append(f'"{campo_normalizado}" {tipo}')
+        campos = [campo for campo in campos_unicos if campo != "id"]  # id ya está definido
+        columnas = ["id"]
+        for campo in campos:
+            # Normalizar el nombre del campo para asegurar que sea válido en SQLite
+            campo_normalizado = campo
+            if not _CARACTERES_ESPECIALES.isdisjoint(campo):
+                campo_normalizado = normalizar_nombre_columna(campo)
+
+            # Determinar el tipo de datos
+            tipo = "TEXT"  # Por defecto, todo es texto
+            if campo in ["edad", "antiguedad"]:
+                tipo = "INTEGER"
+
+            # Asegurarse de que el campo no esté vacío
+            if not campo_normalizado:
+                campo_normalizado = f"campo_{len(campos_sql)}"
+
+            # Añadir comillas para evitar problemas con palabras reservadas
+            campos_sql.append(f'"{campo_normalizado}" {tipo}')
+            columnas.append(campo_normalizado)
+
+        # Copias normalizadas de las columnas de nombre y de filtro; NOCASE
+        # permite que el índice se use con LIKE
+        columnas_normalizadas = [
+            (columnas.index(columna), columna + SUFIJO_NORMALIZADO)
+            for columna in COLUMNAS_BUSQUEDA + COLUMNAS_FILTRO if columna in columnas
+        ]
+        for _, columna_norm in columnas_normalizadas:
+            campos_sql.append(f'"{columna_norm}" TEXT COLLATE NOCASE')
+            columnas.append(columna_norm)
 
         # Crear la tabla
         cursor.execute(f'''
@@ -95,86 +130,286 @@ def crear_base_datos(registros: List[Dict[str, Any]]) -> Dict[str, Any]:
         )
         ''')
 
-        # Insertar registros
-        for i, registro in enumerate(registros):
-            # Añadir ID al registro
-            campos = {"id": i + 1}
-
-            # Copiar todos los campos del registro
-            for campo, valor in registro.items():
-                # Normalizar el nombre del campo para asegurar que sea válido en SQLite
-                campo_normalizado = campo
-
-                # Verificar si el campo contiene caracteres especiales
-                if any(char in campo for char in ["=", "-", "/", "\\", ":", ";", ",", "'", '"', "?", "¿", "!", "¡", "%", "&", "$", "#", "@", "+", "*", " ", ".", "(", ")"]):
-                    # Normalizar el campo
-                    campo_normalizado = campo.lower()
-                    # Reemplazar caracteres especiales
-                    for char in [" ", ".", "(", ")", "\n", "=", "-", "/", "\\", ":", ";", ",", "'", '"', "?", "¿", "!", "¡", "%", "&", "$", "#", "@", "+", "*"]:
-                        campo_normalizado = campo_normalizado.replace(char, "_")
-                    # Eliminar guiones bajos múltiples
-                    while "__" in campo_normalizado:
-                        campo_normalizado = campo_normalizado.replace("__", "_")
-                    # Eliminar guiones bajos al inicio y final
-                    campo_normalizado = campo_normalizado.strip("_")
-
-                # Asegurarse de que el campo no esté vacío
-                if not campo_normalizado:
-                    campo_normalizado = f"campo_{len(campos)}"
-
-                campos[campo_normalizado] = valor
-
-            # Preparar la consulta SQL
-            campos_str = ", ".join([f'"{campo}"' for campo in campos.keys()])
-            placeholders = ", ".join(["?" for _ in campos])
-
-            # Ejecutar la consulta
-            cursor.execute(
-                f"INSERT INTO contactos ({campos_str}) VALUES ({placeholders})",
-                list(campos.values())
-            )
-
-        # Crear índices para búsquedas rápidas
-        # Verificar si las columnas existen antes de crear índices
-        cursor.execute("PRAGMA table_info(contactos)")
-        columnas_existentes = [info[1] for info in cursor.fetchall()]
-
-        # Crear índice para nombre_completo si existe
-        if "nombre_completo" in columnas_existentes:
-            cursor.execute('CREATE INDEX idx_nombre ON contactos ("nombre_completo")')
-
-        # Buscar columnas relacionadas con zona
-        columnas_zona = [col for col in columnas_existentes if "zona" in col.lower()]
-        if columnas_zona:
-            cursor.execute(f'CREATE INDEX idx_zona ON contactos ("{columnas_zona[0]}")')
-
-        # Buscar columnas relacionadas con función
-        columnas_funcion = [col for col in columnas_existentes if "funcion" in col.lower() or "función" in col.lower()]
-        if columnas_funcion:
-            cursor.execute(f'CREATE INDEX idx_funcion ON contactos ("{columnas_funcion[0]}")')
-
-        # Guardar cambios
+        # Insertar todos los registros con una sola sentencia preparada
+        posicion_natural = columnas.index("nombre_natural")
+        columnas_str = ", ".join(f'"{columna}"' for columna in columnas)
+        placeholders = ", ".join("?" * len(columnas))
+        insert_sql = f"INSERT INTO contactos ({columnas_str}) VALUES ({placeholders})"
+
+        def filas():
+            for i, registro in enumerate(registros):
+                # ID del registro; los campos vacíos se guardan como NULL
+                obtener = registro.get
+                valores = [obtener("id", i + 1)]
+                valores += [None if valor == "" else valor for valor in map(obtener, campos)]
+                # Nombre en orden natural si el cargador no lo calculó
+                if valores[posicion_natural] is None:
+                    valores[posicion_natural] = nombre_natural(registro) or None
+                for posicion, _ in columnas_normalizadas:
+                    valores.append(normalizar_texto(valores[posicion]) or None)
+                yield valores
+
+        cursor.executemany(insert_sql, filas())
+
+        # Crear índices y la tabla de texto completo para búsquedas rápidas, ya
+        # con todos los registros insertados, y estadísticas para el planificador
+        crear_indices_busqueda(cursor)
+        cursor.execute("ANALYZE contactos")
+
+        # Guardar cambios y escribir la base de datos completa en el archivo temporal
         conn.commit()
+        conn.execute("VACUUM INTO ?", (db_temporal,))
         conn.close()
 
+        # Llevar el archivo a disco una sola vez y reemplazar la base de datos anterior
+        with open(db_temporal, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(db_temporal, DB_PATH)
+
         resultado["mensaje"] = f"Base de datos creada con éxito en {DB_PATH} con {len(registros)} registros"
 
     except Exception as e:
         resultado["error"] = str(e)
         resultado["mensaje"] = f"Error al crear la base de datos: {str(e)}"
 
+        try:
+            conn.close()
+        except (NameError, sqlite3.Error):
+            pass
+        try:
+            os.remove(db_temporal)
+        except OSError:
+            pass
+
+    return resultado
+
+# Columnas de nombre indexadas en la tabla de texto completo
+COLUMNAS_FTS = ["nombre_completo", "nombre_s", "apellido_paterno", "apellido_materno", "nombre_alternativo"]
+
+def crear_indices_busqueda(cursor: sqlite3.Cursor) -> bool:
+    """
+    Crea los índices de búsqueda de la tabla contactos si no existen:
+    - Índices b-tree para nombre_completo, las columnas de nombre normalizadas,
+      la función normalizada, zona, función y rol administrativo
+    - Tabla virtual FTS5 (contactos_fts) sobre las columnas de nombre, para
+      que las búsquedas por nombre no tengan que recorrer toda la tabla con LIKE '%...%'
+
+    Args:
+        cursor: Cursor de una conexión abierta a la base de datos
+
+    Returns:
+        bool: True si la tabla de texto completo está disponible
+    """
+    # Verificar si las columnas existen antes de crear índices
+    cursor.execute("PRAGMA table_info(contactos)")
+    columnas_existentes = [info[1] for info in cursor.fetchall()]
+
+    # Crear índice para nombre_completo si existe
+    if "nombre_completo" in columnas_existentes:
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nombre ON contactos ("nombre_completo")')
+
+    # Índices sobre las copias normalizadas de las columnas de nombre y de las
+    # que se filtran por prefijo
+    for columna in COLUMNAS_BUSQUEDA + COLUMNAS_FILTRO_PREFIJO:
+        columna_norm = columna + SUFIJO_NORMALIZADO
+        if columna_norm in columnas_existentes:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{columna_norm} ON contactos ("{columna_norm}")')
+
+    # Buscar columnas relacionadas con zona
+    columnas_zona = [col for col in columnas_existentes if "zona" in col.lower()]
+    if columnas_zona:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_zona ON contactos ("{columnas_zona[0]}")')
+
+    # Buscar columnas relacionadas con función
+    columnas_funcion = [col for col in columnas_existentes if "funcion" in col.lower() or "función" in col.lower()]
+    if columnas_funcion:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_funcion ON contactos ("{columnas_funcion[0]}")')
+
+    # Buscar la columna de rol administrativo (J/S/D/SD)
+    columnas_rol = [col for col in columnas_existentes if col.lower().startswith("j_jefe")]
+    if columnas_rol:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_rol ON contactos ("{columnas_rol[0]}")')
+
+    # Crear la tabla de texto completo sobre las columnas de nombre que existan
+    columnas_fts = [col for col in COLUMNAS_FTS if col in columnas_existentes]
+    if not columnas_fts:
+        return False
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'contactos_fts'")
+    if cursor.fetchone():
+        return True
+
+    try:
+        # remove_diacritics permite que 'PEREZ' encuentre 'PÉREZ'
+        cursor.execute(f"""
+        CREATE VIRTUAL TABLE contactos_fts USING fts5(
+            {", ".join(columnas_fts)},
+            content='contactos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite compilado sin FTS5: se sigue usando LIKE
+        return False
+
+    # Poblar el índice a partir de la tabla contactos
+    cursor.execute("INSERT INTO contactos_fts(contactos_fts) VALUES ('rebuild')")
+
+    # Mantener el índice sincronizado si se modifican los contactos
+    columnas_str = ", ".join(columnas_fts)
+    nuevos = ", ".join(f"new.{col}" for col in columnas_fts)
+    viejos = ", ".join(f"old.{col}" for col in columnas_fts)
+    cursor.execute(f"""
+    CREATE TRIGGER contactos_fts_ai AFTER INSERT ON contactos BEGIN
+        INSERT INTO contactos_fts(rowid, {columnas_str}) VALUES (new.id, {nuevos});
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER contactos_fts_ad AFTER DELETE ON contactos BEGIN
+        INSERT INTO contactos_fts(contactos_fts, rowid, {columnas_str}) VALUES ('delete', old.id, {viejos});
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER contactos_fts_au AFTER UPDATE ON contactos BEGIN
+        INSERT INTO contactos_fts(contactos_fts, rowid, {columnas_str}) VALUES ('delete', old.id, {viejos});
+        INSERT INTO contactos_fts(rowid, {columnas_str}) VALUES (new.id, {nuevos});
+    END
+    """)
+
+    return True
+
+def asegurar_nombre_natural(cursor: sqlite3.Cursor) -> None:
+    """
+    Añade la columna nombre_natural a una base de datos creada antes de que
+    existiera, calculándola una sola vez para todos los registros.
+
+    Args:
+        cursor: Cursor de una conexión abierta a la base de datos
+    """
+    cursor.execute("PRAGMA table_info(contactos)")
+    columnas_existentes = [info[1] for info in cursor.fetchall()]
+    if "nombre_natural" in columnas_existentes:
+        return
+
+    columnas_nombre = [col for col in COLUMNAS_BUSQUEDA if col in columnas_existentes]
+    cursor.execute('ALTER TABLE contactos ADD COLUMN "nombre_natural" TEXT')
+    if not columnas_nombre:
+        return
+
+    cursor.execute(f"SELECT id, {', '.join(columnas_nombre)} FROM contactos")
+    actualizaciones = [
+        (nombre_natural(dict(zip(columnas_nombre, fila[1:]))), fila[0])
+        for fila in cursor.fetchall()
+    ]
+    cursor.executemany('UPDATE contactos SET "nombre_natural" = ? WHERE id = ?', actualizaciones)
+
+def asegurar_columnas_normalizadas(cursor: sqlite3.Cursor) -> None:
+    """
+    Añade las copias normalizadas de las columnas de nombre y de filtro (ver
+    COLUMNAS_BUSQUEDA y COLUMNAS_FILTRO) a una base de datos creada antes de
+    que existieran.
+
+    Args:
+        cursor: Cursor de una conexión abierta a la base de datos
+    """
+    cursor.execute("PRAGMA table_info(contactos)")
+    columnas_existentes = [info[1] for info in cursor.fetchall()]
+    columnas = [
+        columna for columna in COLUMNAS_BUSQUEDA + COLUMNAS_FILTRO
+        if columna in columnas_existentes and columna + SUFIJO_NORMALIZADO not in columnas_existentes
+    ]
+    if not columnas:
+        return
+
+    # Normalizar en SQLite con la misma función que se usa en Python
+    cursor.connection.create_function("normalizar_texto", 1, lambda texto: normalizar_texto(texto) or None, deterministic=True)
+    for columna in columnas:
+        cursor.execute(f'ALTER TABLE contactos ADD COLUMN "{columna}{SUFIJO_NORMALIZADO}" TEXT COLLATE NOCASE')
+    asignaciones = ", ".join(f'"{columna}{SUFIJO_NORMALIZADO}" = normalizar_texto("{columna}")' for columna in columnas)
+    cursor.execute(f"UPDATE contactos SET {asignaciones}")
+
+def asegurar_indices_busqueda(db_path: str = DB_PATH) -> Dict[str, Any]:
+    """
+    Migra una base de datos existente añadiendo la columna nombre_natural, las
+    columnas normalizadas, los índices de búsqueda y la tabla de texto completo si todavía no los tiene.
+
+    Args:
+        db_path: Ruta a la base de datos SQLite
+
+    Returns:
+        dict: Resultado de la operación
+    """
+    resultado = {
+        "error": None,
+        "fts_disponible": False
+    }
+
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        asegurar_nombre_natural(cursor)
+        asegurar_columnas_normalizadas(cursor)
+        resultado["fts_disponible"] = crear_indices_busqueda(cursor)
+        cursor.execute("ANALYZE contactos")
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        resultado["error"] = str(e)
+
     return resultado
 
+def esquema_contactos(db_path: str = DB_PATH) -> Tuple[Tuple[str, ...], bool]:
+    """
+    Obtiene las columnas de la tabla contactos y si existe la tabla de texto
+    completo. El resultado se reutiliza mientras el archivo de la base de datos
+    no cambie (mismo inodo y fecha de modificación).
+
+    Args:
+        db_path: Ruta a la base de datos SQLite
+
+    Returns:
+        tuple: (columnas, fts_disponible)
+
+    Raises:
+        OSError: Si la base de datos no existe
+    """
+    info = os.stat(db_path)
+    return _leer_esquema_contactos(db_path, info.st_ino, info.st_mtime_ns)
+
+@lru_cache(maxsize=8)
+def _leer_esquema_contactos(db_path: str, inodo: int, modificacion: int) -> Tuple[Tuple[str, ...], bool]:
+    """
+    Lee el esquema de la tabla contactos (ver esquema_contactos). El inodo y la
+    fecha de modificación solo forman parte de la clave del caché.
+
+    Args:
+        db_path: Ruta a la base de datos SQLite
+        inodo: Inodo del archivo
+        modificacion: Fecha de modificación del archivo (ns)
+
+    Returns:
+        tuple: (columnas, fts_disponible)
+    """
+    cursor = obtener_conexion_lectura(db_path).cursor()
+    cursor.execute("PRAGMA table_info(contactos)")
+    columnas = tuple(info[1] for info in cursor.fetchall())
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'contactos_fts'")
+    fts_disponible = cursor.fetchone() is not None
+    cursor.close()
+    return columnas, fts_disponible
+
 def ejecutar_consulta(consulta: str, parametros: Optional[Tuple] = None) -> Dict[str, Any]:
     """
-    Ejecuta una consulta SQL en la base de datos.
+    Ejecuta una consulta SQL de lectura en la base de datos, con la conexión
+    de solo lectura del hilo actual.
 
     Args:
         consulta: Consulta SQL a ejecutar
         parametros: Parámetros para la consulta (opcional)
 
     Returns:
-        dict: Resultado de la consulta
+        dict: Resultado de la consulta; los registros son tuplas en el orden de
+            "columnas" e "indices_columnas" da la posición de cada columna
     """
     resultado = {
         "error": None,
@@ -189,13 +424,8 @@ def ejecutar_consulta(consulta: str, parametros: Optional[Tuple] = None) -> Dict
             resultado["error"] = f"La base de datos no existe en {DB_PATH}"
             return resultado
 
-        # Crear conexión a la base de datos
-        conn = sqlite3.connect(DB_PATH)
-
-        # Convertir resultados a diccionarios
-        conn.row_factory = sqlite3.Row
-
-        cursor = conn.cursor()
+        # Obtener la conexión de lectura; las filas se devuelven como tuplas
+        cursor = obtener_conexion_lectura(DB_PATH).cursor()
 
         # Ejecutar la consulta
         if parametros:
@@ -203,15 +433,14 @@ def ejecutar_consulta(consulta: str, parametros: Optional[Tuple] = None) -> Dict
         else:
             cursor.execute(consulta)
 
-        # Obtener resultados
-        filas = cursor.fetchall()
-
-        # Convertir a lista de diccionarios
         resultado["columnas"] = [desc[0] for desc in cursor.description]
-        resultado["registros"] = [dict(fila) for fila in filas]
+        resultado["indices_columnas"] = {columna: i for i, columna in enumerate(resultado["columnas"])}
+
+        # Obtener resultados
+        resultado["registros"] = cursor.fetchall()
         resultado["total"] = len(resultado["registros"])
 
-        conn.close()
+        cursor.close()
 
     except Exception as e:
         resultado["error"] = str(e)
@@ -231,25 +460,48 @@ def normalizar_texto(texto: str) -> str:
     Returns:
         str: Texto normalizado
     """
-    import unicodedata
-
     if not texto:
         return ""
 
     # Convertir a string si no lo es
-    texto = str(texto)
+    return _normalizar_cadena(str(texto))
+
+# Tabla que en una sola pasada convierte a minúsculas sin acento las letras
+# del español: mayúsculas ASCII, vocales acentuadas, ñ, ü y ç (en ambos casos),
+# y elimina los acentos combinantes de un texto ya descompuesto
+_ACENTUADAS = "áéíóúàèìòùâêîôûäëïöüñç"
+_TABLA_PLEGADO = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ" + _ACENTUADAS + _ACENTUADAS.upper(),
+    "abcdefghijklmnopqrstuvwxyz" + "aeiouaeiouaeiouaeiounc" * 2,
+    "".join(chr(c) for c in range(0x300, 0x370))
+)
+
+@lru_cache(maxsize=8192)
+def _normalizar_cadena(texto: str) -> str:
+    """
+    Normaliza una cadena (ver normalizar_texto). Los resultados se guardan en
+    caché porque los mismos nombres y atributos se normalizan en cada consulta.
 
-    # Convertir a minúsculas
-    texto = texto.lower()
+    Args:
+        texto: Cadena a normalizar
 
-    # Eliminar espacios adicionales
-    texto = " ".join(texto.split())
+    Returns:
+        str: Cadena normalizada
+    """
+    # Un texto ASCII no tiene acentos que eliminar
+    if texto.isascii():
+        return " ".join(texto.lower().split())
 
-    # Eliminar acentos
-    texto = ''.join(c for c in unicodedata.normalize('NFD', texto)
-                    if unicodedata.category(c) != 'Mn')
+    # Convertir a minúsculas y eliminar los acentos del español con la tabla de
+    # traducción; solo si quedan otros caracteres no ASCII se recurre a NFD
+    plegado = texto.translate(_TABLA_PLEGADO)
+    if plegado.isascii():
+        return " ".join(plegado.split())
 
-    return texto
+    # Convertir a minúsculas, eliminar espacios adicionales y acentos
+    texto = " ".join(texto.lower().split())
+    return ''.join(c for c in unicodedata.normalize('NFD', texto)
+                   if unicodedata.category(c) != 'Mn')
 
 # Mapeo de atributos a columnas de la base de datos
 MAPEO_ATRIBUTOS = {
@@ -271,6 +523,43 @@ MAPEO_ATRIBUTOS = {
     "observacion": ["observaciones", "observación", "observacion", "notas", "comentarios", "información adicional", "informacion adicional"]
 }
 
+# Sinónimos normalizados -> columna, para resolver en una sola búsqueda los
+# atributos que coinciden exactamente con un sinónimo
+_SINONIMOS_ATRIBUTOS = {}
+for _columna, _sinonimos in MAPEO_ATRIBUTOS.items():
+    for _sinonimo in _sinonimos:
+        _SINONIMOS_ATRIBUTOS.setdefault(normalizar_texto(_sinonimo), _columna)
+
+# Expresión que encuentra un sinónimo dentro del atributo (el más largo primero)
+_PATRON_SINONIMOS = re.compile("|".join(
+    re.escape(sinonimo) for sinonimo in sorted(_SINONIMOS_ATRIBUTOS, key=len, reverse=True)
+))
+
+@lru_cache(maxsize=1024)
+def _columna_por_sinonimo(atributo: str) -> Optional[str]:
+    """
+    Busca la columna de un atributo entre los sinónimos conocidos.
+    No depende de la base de datos, así que el resultado se guarda en caché.
+
+    Args:
+        atributo: Atributo a mapear
+
+    Returns:
+        str: Columna de la base de datos, o None si ningún sinónimo coincide
+    """
+    atributo_norm = normalizar_texto(atributo)
+
+    # Verificar si hay una coincidencia directa en el mapeo
+    if atributo_norm in _SINONIMOS_ATRIBUTOS:
+        return _SINONIMOS_ATRIBUTOS[atributo_norm]
+
+    # O si el atributo contiene alguno de los sinónimos
+    coincidencia = _PATRON_SINONIMOS.search(atributo_norm)
+    if coincidencia:
+        return _SINONIMOS_ATRIBUTOS[coincidencia.group(0)]
+
+    return None
+
 def mapear_atributo(atributo: str) -> str:
     """
     Mapea un atributo de la consulta a una columna de la base de datos.
@@ -284,31 +573,16 @@ def mapear_atributo(atributo: str) -> str:
     if not atributo:
         return ""
 
-    atributo_norm = normalizar_texto(atributo)
-
-    # Verificar si hay una coincidencia directa en el mapeo
-    for columna, sinonimos in MAPEO_ATRIBUTOS.items():
-        if atributo_norm in sinonimos or any(s in atributo_norm for s in sinonimos):
-            return columna
+    columna = _columna_por_sinonimo(atributo)
+    if columna:
+        return columna
 
     # Si no hay coincidencia directa, normalizar el atributo como se hace con los campos
-    campo_normalizado = atributo.lower()
-    # Reemplazar caracteres especiales
-    for char in [" ", ".", "(", ")", "\n", "=", "-", "/", "\\", ":", ";", ",", "'", '"', "?", "¿", "!", "¡", "%", "&", "$", "#", "@", "+", "*"]:
-        campo_normalizado = campo_normalizado.replace(char, "_")
-    # Eliminar guiones bajos múltiples
-    while "__" in campo_normalizado:
-        campo_normalizado = campo_normalizado.replace("__", "_")
-    # Eliminar guiones bajos al inicio y final
-    campo_normalizado = campo_normalizado.strip("_")
+    campo_normalizado = normalizar_nombre_columna(atributo)
 
     # Verificar si existe una columna con este nombre normalizado
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(contactos)")
-        columnas_existentes = [info[1] for info in cursor.fetchall()]
-        conn.close()
+        columnas_existentes, _ = esquema_contactos()
 
         # Buscar coincidencias exactas o parciales
         for col in columnas_existentes:
@@ -324,6 +598,162 @@ def mapear_atributo(atributo: str) -> str:
 
     return atributo
 
+def _expresion_nombre(columna: str, columnas_existentes: Tuple[str, ...], alias: str = "") -> str:
+    """
+    Obtiene la expresión SQL con la que se compara una columna de nombre contra
+    un texto normalizado: la copia normalizada indexada si existe o, en bases de
+    datos antiguas, la columna original normalizada al vuelo.
+
+    Args:
+        columna: Columna de nombre (ver COLUMNAS_BUSQUEDA)
+        columnas_existentes: Columnas de la tabla contactos
+        alias: Prefijo de la tabla en la consulta (por ejemplo "c.")
+
+    Returns:
+        str: Expresión SQL
+    """
+    if columna + SUFIJO_NORMALIZADO in columnas_existentes:
+        return f"{alias}{columna}{SUFIJO_NORMALIZADO}"
+    return f"normalizar_texto({alias}{columna})"
+
+def _condicion_nombre_indices(persona_norm: str, tokens: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Construye la condición para buscar a una persona por nombre como una unión
+    de búsquedas sobre los índices de las columnas normalizadas, en lugar de una
+    cadena de OR con LIKE '%...%' que obliga a recorrer toda la tabla.
+
+    Los nombres completos se buscan por prefijo (en orden de la agenda y en orden
+    natural) y cada palabra por igualdad con los apellidos o por prefijo del nombre.
+    Los textos a buscar se pasan como listas JSON que se recorren con json_each,
+    así que el texto de la consulta es el mismo sea cual sea el número de palabras.
+
+    Args:
+        persona_norm: Nombre normalizado de la persona
+        tokens: Palabras del nombre
+
+    Returns:
+        tuple: (condiciones, parámetros)
+    """
+    # Nombre completo, también invertido (ejemplo: "Luis Pérez" busca "Pérez Luis")
+    nombres = [persona_norm]
+    if len(tokens) >= 2:
+        nombres.append(" ".join(tokens[::-1]))
+
+    # Palabras individuales, ignorando las muy cortas
+    palabras = [token for token in tokens if len(token) > 2]
+
+    # Combinaciones de palabras (para nombres y apellidos compuestos)
+    combinaciones = []
+    if len(tokens) >= 3:
+        combinaciones = [f"{tokens[i]} {tokens[i+1]}" for i in range(len(tokens) - 1)]
+
+    busquedas = [
+        ("apellido_paterno", "=", palabras),
+        ("apellido_materno", "=", palabras),
+        ("nombre_s", "prefijo", palabras),
+        ("nombre_completo", "prefijo", nombres + palabras + combinaciones),
+        ("nombre_alternativo", "prefijo", nombres + palabras)
+    ]
+
+    subconsultas = []
+    params = []
+    for columna, operador, textos in busquedas:
+        columna = f"c2.{columna}{SUFIJO_NORMALIZADO}"
+        if operador == "=":
+            comparacion = f"{columna} = t.value"
+        else:
+            # Rango equivalente a LIKE 'texto%' que sí puede usar el índice
+            comparacion = f"{columna} >= t.value AND {columna} < t.value || char(1114111)"
+        # CROSS JOIN recorre primero los textos y busca cada uno en el índice
+        subconsultas.append(f"SELECT c2.id FROM json_each(?) t CROSS JOIN contactos c2 ON {comparacion}")
+        # Omitir textos repetidos (palabras repetidas o nombre de una sola palabra)
+        params.append(json.dumps(list(dict.fromkeys(textos))))
+
+    return [f"c.id IN ({' UNION '.join(subconsultas)})"], params
+
+def _condiciones_nombre_subcadena(persona_norm: str, tokens: List[str], columnas_existentes: Tuple[str, ...]) -> Tuple[List[str], List[str]]:
+    """
+    Construye las condiciones de subcadena (INSTR sobre el texto normalizado)
+    para buscar a una persona por nombre cuando la base de datos no tiene la
+    tabla de texto completo ni las columnas normalizadas.
+
+    Como en _condicion_nombre_indices, los textos a buscar en cada columna se
+    pasan como una lista JSON, así que el texto de la consulta no depende del
+    número de palabras del nombre.
+
+    Args:
+        persona_norm: Nombre normalizado de la persona
+        tokens: Palabras del nombre
+        columnas_existentes: Columnas de la tabla contactos
+
+    Returns:
+        tuple: (condiciones, parámetros)
+    """
+    # Nombre completo, también invertido (ejemplo: "Luis Pérez" busca "Pérez Luis")
+    nombres = [persona_norm]
+    if len(tokens) >= 2:
+        nombres.append(" ".join(tokens[::-1]))
+
+    # Palabras individuales, ignorando las muy cortas
+    palabras = [token for token in tokens if len(token) > 2]
+
+    # Combinaciones de palabras (para nombres compuestos)
+    combinaciones = []
+    if len(tokens) >= 3:
+        combinaciones = [f"{tokens[i]} {tokens[i+1]}" for i in range(len(tokens) - 1)]
+
+    busquedas = [
+        ("nombre_completo", nombres + palabras + combinaciones),
+        ("nombre_alternativo", nombres + palabras + combinaciones)
+    ]
+    # Verificar si las columnas existen antes de añadirlas a las condiciones
+    busquedas += [
+        (columna, palabras) for columna in ("nombre_s", "apellido_paterno", "apellido_materno")
+        if columna in columnas_existentes
+    ]
+
+    condiciones = []
+    params = []
+    for columna, textos in busquedas:
+        expresion = _expresion_nombre(columna, columnas_existentes)
+        condiciones.append(f"EXISTS (SELECT 1 FROM json_each(?) t WHERE INSTR({expresion}, t.value) > 0)")
+        # Omitir textos repetidos (palabras repetidas o nombre de una sola palabra)
+        params.append(json.dumps(list(dict.fromkeys(textos))))
+
+    return condiciones, params
+
+def _condicion_texto(atributo: str, valor_norm: str, columnas_existentes: Tuple[str, ...]) -> Tuple[str, List[str]]:
+    """
+    Construye la condición para filtrar una columna de texto por un valor
+    normalizado, sin distinguir acentos ni mayúsculas.
+
+    Las columnas con copia normalizada (ver COLUMNAS_FILTRO) se comparan con
+    esa copia: las de COLUMNAS_FILTRO_PREFIJO por prefijo, con un rango que usa
+    su índice (así 'direccion' no encuentra 'SUBDIRECCIÓN'), y las de texto
+    libre por subcadena con INSTR. Las demás columnas se comparan con
+    LOWER(...) LIKE '%...%'.
+
+    Args:
+        atributo: Columna a filtrar
+        valor_norm: Valor normalizado a buscar
+        columnas_existentes: Columnas de la tabla contactos
+
+    Returns:
+        tuple: (condición, parámetros)
+    """
+    columna_norm = atributo + SUFIJO_NORMALIZADO
+    if columna_norm not in columnas_existentes:
+        return f"LOWER({atributo}) LIKE ?", [f"%{valor_norm}%"]
+
+    if atributo in COLUMNAS_FILTRO_PREFIJO:
+        # Rango equivalente a LIKE 'valor%' que sí puede usar el índice
+        return f"{columna_norm} >= ? AND {columna_norm} < ? || char(1114111)", [valor_norm, valor_norm]
+
+    return f"INSTR({columna_norm}, ?) > 0", [valor_norm]
+
+# Expresiones que indican que el usuario pide una lista de personas
+_PATRON_LISTADO = re.compile(r"qui[eé]n|cu[aá]les|qu[eé] personas|lista|enumera|dime tod[oa]s|menciona|dame", re.IGNORECASE)
+
 def generar_consulta_sql(parametros: Dict[str, Any]) -> Dict[str, Any]:
     """
     Genera una consulta SQL a partir de parámetros extraídos de la consulta en lenguaje natural.
@@ -340,16 +770,13 @@ def generar_consulta_sql(parametros: Dict[str, Any]) -> Dict[str, Any]:
         "tipo": parametros.get("tipo_consulta", "")
     }
 
-    # Obtener las columnas existentes en la tabla
+    # Obtener las columnas existentes en la tabla y si existe la tabla de texto completo
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(contactos)")
-        columnas_existentes = [info[1] for info in cursor.fetchall()]
-        conn.close()
+        columnas_existentes, fts_disponible = esquema_contactos()
     except:
         # Si hay algún error, usar una lista vacía
-        columnas_existentes = []
+        columnas_existentes = ()
+        fts_disponible = False
 
     # Mapear atributo si existe
     if "atributo" in parametros and parametros["atributo"]:
@@ -367,97 +794,55 @@ def generar_consulta_sql(parametros: Dict[str, Any]) -> Dict[str, Any]:
             # Dividir en tokens para búsqueda más flexible
             tokens = persona_norm.split()
 
-            # Construir condiciones para cada token
-            condiciones = []
-            params = []
-
-            # Búsqueda exacta primero (mayor prioridad)
-            condiciones.append("LOWER(nombre_completo) LIKE ?")
-            params.append(f"%{persona_norm}%")
-
-            condiciones.append("LOWER(nombre_alternativo) LIKE ?")
-            params.append(f"%{persona_norm}%")
-
-            # Búsqueda por nombre invertido (apellidos primero)
-            # Ejemplo: "Luis Pérez" también busca "Pérez Luis"
-            if len(tokens) >= 2:
-                nombre_invertido = " ".join(tokens[::-1])
-                condiciones.append("LOWER(nombre_completo) LIKE ?")
-                params.append(f"%{nombre_invertido}%")
-
-                condiciones.append("LOWER(nombre_alternativo) LIKE ?")
-                params.append(f"%{nombre_invertido}%")
-
-            # Búsqueda por tokens individuales
-            for token in tokens:
-                if len(token) > 2:  # Ignorar tokens muy cortos
-                    condiciones.append("LOWER(nombre_completo) LIKE ?")
-                    params.append(f"%{token}%")
-
-                    condiciones.append("LOWER(nombre_alternativo) LIKE ?")
-                    params.append(f"%{token}%")
-
-                    # Verificar si las columnas existen antes de añadirlas a las condiciones
-                    if "nombre_s" in columnas_existentes:
-                        condiciones.append("LOWER(nombre_s) LIKE ?")
-                        params.append(f"%{token}%")
-
-                    if "apellido_paterno" in columnas_existentes:
-                        condiciones.append("LOWER(apellido_paterno) LIKE ?")
-                        params.append(f"%{token}%")
-
-                    if "apellido_materno" in columnas_existentes:
-                        condiciones.append("LOWER(apellido_materno) LIKE ?")
-                        params.append(f"%{token}%")
-
-            # Búsqueda por combinaciones de tokens (para nombres compuestos)
-            if len(tokens) >= 3:
-                for i in range(len(tokens) - 1):
-                    token_combinado = f"{tokens[i]} {tokens[i+1]}"
-                    condiciones.append("LOWER(nombre_completo) LIKE ?")
-                    params.append(f"%{token_combinado}%")
-
-                    condiciones.append("LOWER(nombre_alternativo) LIKE ?")
-                    params.append(f"%{token_combinado}%")
-
-            # Construir consulta SQL
+            # Columnas a devolver: un atributo específico o toda la información de la persona
             if atributo:
                 # Si el atributo es teléfono, incluir también celular
-                campos_select = atributo
-                if atributo == "telefono":
-                    campos_select = "telefono, celular"
+                campos_select = ["telefono", "celular"] if atributo == "telefono" else [atributo]
+                campos_select = ", ".join(f"c.{campo}" for campo in campos_select) + ", c.nombre_completo"
+            else:
+                campos_select = "c.*"
+
+            # Coincidencia exacta del nombre completo (mayor prioridad)
+            completo = _expresion_nombre("nombre_completo", columnas_existentes, "c.")
+            alternativo = _expresion_nombre("nombre_alternativo", columnas_existentes, "c.")
+            exact_match = f"""CASE
+                           WHEN INSTR({completo}, ?) > 0 THEN 1
+                           WHEN INSTR({alternativo}, ?) > 0 THEN 1
+                           ELSE 0
+                       END as exact_match"""
+            params_exact = [persona_norm, persona_norm]
+
+            if fts_disponible:
+                # Buscar en el índice de texto completo (sin distinguir acentos ni
+                # mayúsculas): el nombre como frase o cualquiera de sus palabras,
+                # que también encuentran las palabras que empiezan por ellas
+                terminos = [persona_norm] + [token for token in tokens if len(token) > 2 and token != persona_norm]
+                terminos = ['"' + termino.replace('"', '""') + '"' for termino in terminos]
+                terminos[1:] = [termino + "*" for termino in terminos[1:]]
 
-                # Consulta de un atributo específico de una persona
                 resultado["consulta"] = f"""
-                SELECT {campos_select}, nombre_completo,
-                       CASE
-                           WHEN LOWER(nombre_completo) LIKE ? THEN 1
-                           WHEN LOWER(nombre_alternativo) LIKE ? THEN 1
-                           ELSE 0
-                       END as exact_match
-                FROM contactos
-                WHERE {" OR ".join(condiciones)}
-                ORDER BY exact_match DESC, nombre_completo
+                SELECT {campos_select},
+                       {exact_match}
+                FROM contactos c
+                JOIN contactos_fts f ON f.rowid = c.id
+                WHERE contactos_fts MATCH ?
+                ORDER BY exact_match DESC, f.rank, c.nombre_completo
                 """
-                # Añadir parámetros para exact_match
-                params_exact = [f"%{persona_norm}%", f"%{persona_norm}%"] + params
-                resultado["parametros"] = params_exact
+                resultado["parametros"] = params_exact + [" OR ".join(terminos)]
             else:
-                # Consulta de toda la información de una persona
+                # Con las columnas normalizadas, buscar por índices; si no, recorrer la tabla
+                if all(columna + SUFIJO_NORMALIZADO in columnas_existentes for columna in COLUMNAS_BUSQUEDA):
+                    condiciones, params = _condicion_nombre_indices(persona_norm, tokens)
+                else:
+                    condiciones, params = _condiciones_nombre_subcadena(persona_norm, tokens, columnas_existentes)
                 resultado["consulta"] = f"""
-                SELECT *,
-                       CASE
-                           WHEN LOWER(nombre_completo) LIKE ? THEN 1
-                           WHEN LOWER(nombre_alternativo) LIKE ? THEN 1
-                           ELSE 0
-                       END as exact_match
-                FROM contactos
+                SELECT {campos_select},
+                       {exact_match}
+                FROM contactos c
                 WHERE {" OR ".join(condiciones)}
-                ORDER BY exact_match DESC, nombre_completo
+                ORDER BY exact_match DESC, c.nombre_completo
                 """
-                # Añadir parámetros para exact_match
-                params_exact = [f"%{persona_norm}%", f"%{persona_norm}%"] + params
-                resultado["parametros"] = params_exact
+                resultado["parametros"] = params_exact + params
 
     # Consulta de filtrado
     elif parametros.get("tipo_consulta") == "filtrado":
@@ -466,12 +851,7 @@ def generar_consulta_sql(parametros: Dict[str, Any]) -> Dict[str, Any]:
         valor = parametros.get("valor", "")
 
         # Detectar consultas de listado
-        query_text = parametros.get("query", "").lower()
-        is_listing_query = any(term in query_text.lower() for term in [
-            "quién", "quien", "quienes", "quiénes", "cuáles", "cuales",
-            "qué personas", "que personas", "lista", "listar", "enumera",
-            "enumerar", "dime todos", "dime todas", "menciona", "dame"
-        ])
+        is_listing_query = _PATRON_LISTADO.search(parametros.get("query", "")) is not None
 
         # Normalizar valor para búsqueda
         if valor:
@@ -494,15 +874,15 @@ def generar_consulta_sql(parametros: Dict[str, Any]) -> Dict[str, Any]:
 
             # Manejar casos especiales para ciertos atributos
             if atributo == "funcion" and valor:
-                # Para funciones, permitir búsqueda parcial (LIKE)
-                resultado["consulta"] = """
+                # Para funciones, buscar por el inicio de la función
+                condicion_sql, resultado["parametros"] = _condicion_texto(atributo, valor_norm, columnas_existentes)
+                resultado["consulta"] = f"""
                 SELECT nombre_completo, funcion, centro_trabajo, zona
                 FROM contactos
-                WHERE LOWER(funcion) LIKE ?
+                WHERE {condicion_sql}
                 ORDER BY funcion, nombre_completo
                 """
-                resultado["parametros"] = [f"%{valor_norm}%"]
-                resultado["descripcion"] = f"Personas con función que contiene '{valor}'"
+                resultado["descripcion"] = f"Personas con función que empieza por '{valor}'"
 
             elif atributo == "zona" and valor:
                 # Para zonas, mostrar más información relevante
@@ -517,38 +897,38 @@ def generar_consulta_sql(parametros: Dict[str, Any]) -> Dict[str, Any]:
 
             elif atributo == "estudios" and valor:
                 # Para estudios, permitir búsqueda parcial
-                resultado["consulta"] = """
+                condicion_sql, resultado["parametros"] = _condicion_texto(atributo, valor_norm, columnas_existentes)
+                resultado["consulta"] = f"""
                 SELECT nombre_completo, estudios, funcion
                 FROM contactos
-                WHERE LOWER(estudios) LIKE ?
+                WHERE {condicion_sql}
                 ORDER BY funcion, nombre_completo
                 """
-                resultado["parametros"] = [f"%{valor_norm}%"]
                 resultado["descripcion"] = f"Personas con estudios que contienen '{valor}'"
 
             elif atributo == "centro_trabajo" and valor:
                 # Para centro de trabajo, permitir búsqueda parcial
-                resultado["consulta"] = """
+                condicion_sql, resultado["parametros"] = _condicion_texto(atributo, valor_norm, columnas_existentes)
+                resultado["consulta"] = f"""
                 SELECT nombre_completo, centro_trabajo, funcion, zona
                 FROM contactos
-                WHERE LOWER(centro_trabajo) LIKE ?
+                WHERE {condicion_sql}
                 ORDER BY funcion, nombre_completo
                 """
-                resultado["parametros"] = [f"%{valor_norm}%"]
                 resultado["descripcion"] = f"Personas que trabajan en '{valor}'"
 
             # Consulta general para otros atributos
             elif atributo and condicion and valor:
-                # Determinar si usar LIKE o comparación exacta
+                # Determinar si usar subcadena o comparación exacta
                 if condicion == "igual_a" and isinstance(valor, str):
-                    # Para texto, usar LIKE para mayor flexibilidad
+                    # Para texto, buscar como subcadena para mayor flexibilidad
+                    condicion_sql, resultado["parametros"] = _condicion_texto(atributo, valor_norm, columnas_existentes)
                     resultado["consulta"] = f"""
                     SELECT nombre_completo, {atributo}, funcion
                     FROM contactos
-                    WHERE LOWER({atributo}) LIKE ?
+                    WHERE {condicion_sql}
                     ORDER BY funcion, nombre_completo
                     """
-                    resultado["parametros"] = [f"%{valor_norm}%"]
                 else:
                     # Para otros tipos, usar comparación exacta
                     resultado["consulta"] = f"""
@@ -572,12 +952,12 @@ def generar_consulta_sql(parametros: Dict[str, Any]) -> Dict[str, Any]:
 
         if atributo and valor:
             # Conteo con filtro
+            condicion_sql, resultado["parametros"] = _condicion_texto(atributo, valor_norm, columnas_existentes)
             resultado["consulta"] = f"""
             SELECT COUNT(*) as total
             FROM contactos
-            WHERE LOWER({atributo}) LIKE ?
+            WHERE {condicion_sql}
             """
-            resultado["parametros"] = [f"%{valor_norm}%"]
             resultado["descripcion"] = f"Conteo de personas con {atributo} que contiene '{valor}'"
         else:
             # Conteo total
@@ -605,39 +985,48 @@ def consulta_a_texto(resultado_consulta: Dict[str, Any]) -> str:
     if not resultado_consulta.get("registros"):
         return "No se encontraron resultados para esta consulta."
 
-    # Convertir a DataFrame para facilitar el formateo
-    df = pd.DataFrame(resultado_consulta["registros"])
+    # Registros numerados según su posición en el resultado
+    registros = list(enumerate(resultado_consulta["registros"]))
+    columnas = resultado_consulta.get("columnas") or list(registros[0][1])
 
-    # Verificar si hay una columna de coincidencia exacta
-    if "exact_match" in df.columns:
-        # Filtrar solo las coincidencias exactas
-        exact_matches = df[df["exact_match"] == 1]
+    # Los registros de ejecutar_consulta son tuplas que se leen por posición;
+    # también se aceptan registros como diccionarios
+    indices_columnas = resultado_consulta.get("indices_columnas")
+
+    def valor(fila, columna):
+        if indices_columnas is None:
+            return fila.get(columna)
+        indice = indices_columnas.get(columna)
+        return fila[indice] if indice is not None else None
 
+    # Verificar si hay una columna de coincidencia exacta
+    if "exact_match" in columnas:
         # Si hay coincidencias exactas, usar solo esas
-        if len(exact_matches) > 0:
-            df = exact_matches
+        exact_matches = [(i, registro) for i, registro in registros if valor(registro, "exact_match") == 1]
+        if exact_matches:
+            registros = exact_matches
 
-        # Eliminar la columna de coincidencia exacta para que no se muestre
-        df = df.drop(columns=["exact_match"])
+    # La coincidencia exacta y las copias normalizadas de los nombres solo sirven para buscar
+    columnas = [col for col in columnas if col != "exact_match" and not col.endswith(SUFIJO_NORMALIZADO)]
 
     # Obtener descripción de la consulta si existe
     descripcion = resultado_consulta.get("descripcion", "")
 
     # Formatear según el tipo de resultado
-    if "total" in df.columns and len(df) == 1:
+    if "total" in columnas and len(registros) == 1:
         # Resultado de conteo
-        total = df.iloc[0]["total"]
+        total = valor(registros[0][1], "total")
         if descripcion:
-            texto = f"Encontré la siguiente información:\n\n"
-            texto += f"Total: {total}\n"
-            texto += f"Descripción: {descripcion}\n"
+            partes = [f"Encontré la siguiente información:\n\n"]
+            partes.append(f"Total: {total}\n")
+            partes.append(f"Descripción: {descripcion}\n")
         else:
-            texto = f"Encontré la siguiente información:\n\n"
-            texto += f"Total: {total}\n"
-    elif len(df) == 1:
+            partes = [f"Encontré la siguiente información:\n\n"]
+            partes.append(f"Total: {total}\n")
+    elif len(registros) == 1:
         # Un solo registro
-        registro = df.iloc[0]
-        texto = "Encontré la siguiente información:\n\n"
+        registro = registros[0][1]
+        partes = ["Encontré la siguiente información:\n\n"]
 
         # Ordenar columnas para mostrar primero las más importantes
         columnas_ordenadas = []
@@ -651,78 +1040,80 @@ def consulta_a_texto(resultado_consulta: Dict[str, Any]) -> str:
 
         # Añadir primero las columnas prioritarias si existen
         for col in columnas_prioritarias:
-            if col in df.columns:
+            if col in columnas:
                 columnas_ordenadas.append(col)
 
         # Añadir el resto de columnas
-        for col in df.columns:
+        for col in columnas:
             if col not in columnas_ordenadas and col != "id":
                 columnas_ordenadas.append(col)
 
         # Mostrar valores
         for columna in columnas_ordenadas:
-            if pd.notna(registro[columna]) and registro[columna] != "":
+            dato = valor(registro, columna)
+            if dato not in (None, ""):
                 # Formatear nombre de columna
                 nombre_columna = columna.replace('_', ' ').title()
 
-                # Formatear valor según el tipo de columna
-                valor = registro[columna]
-
                 # Formatear fechas
-                if columna in ["fecha_ingreso", "fecha_nacimiento"] and isinstance(valor, str) and len(valor) > 10:
-                    valor = valor[:10]  # Mostrar solo YYYY-MM-DD
+                if columna in ["fecha_ingreso", "fecha_nacimiento"] and isinstance(dato, str) and len(dato) > 10:
+                    dato = dato[:10]  # Mostrar solo YYYY-MM-DD
 
-                texto += f"{nombre_columna}: {valor}\n"
+                partes.append(f"{nombre_columna}: {dato}\n")
     else:
         # Múltiples registros
-        texto = f"Encontré {len(df)} resultados"
+        partes = [f"Encontré {len(registros)} resultados"]
         if descripcion:
-            texto += f" ({descripcion})"
-        texto += ":\n\n"
+            partes.append(f" ({descripcion})")
+        partes.append(":\n\n")
 
         # Determinar columnas a mostrar
-        if "funcion" in df.columns and "nombre_completo" in df.columns:
-            # Agrupar por función para una mejor organización
-            grupos = df.groupby("funcion")
+        if "funcion" in columnas and "nombre_completo" in columnas:
+            # Añadir información adicional (excepto función que ya se muestra en el encabezado),
+            # limitada a 3 columnas para no saturar
+            columnas_adicionales = [col for col in columnas if col not in ["nombre_completo", "funcion", "id"]][:3]
+            titulos = {col: col.replace('_', ' ').title() for col in columnas_adicionales}
 
-            for funcion, grupo in grupos:
-                texto += f"--- {funcion} ({len(grupo)} personas) ---\n"
-
-                for i, fila in grupo.iterrows():
-                    texto += f"{i+1}. {fila['nombre_completo']}"
+            # Agrupar por función para una mejor organización
+            def funcion(elemento):
+                return valor(elemento[1], "funcion") or ""
 
-                    # Añadir información adicional (excepto función que ya se muestra en el encabezado)
-                    columnas_adicionales = [col for col in df.columns if col not in ["nombre_completo", "funcion", "id"]]
+            for nombre_funcion, grupo in groupby(sorted(registros, key=funcion), key=funcion):
+                grupo = list(grupo)
+                partes.append(f"--- {nombre_funcion} ({len(grupo)} personas) ---\n")
 
-                    # Limitar a 3 columnas adicionales para no saturar
-                    columnas_adicionales = columnas_adicionales[:3]
+                for i, fila in grupo:
+                    partes.append(f"{i+1}. {valor(fila, 'nombre_completo')}")
 
                     for col in columnas_adicionales:
-                        if col in fila and pd.notna(fila[col]) and fila[col] != "":
-                            texto += f", {col.replace('_', ' ').title()}: {fila[col]}"
+                        dato = valor(fila, col)
+                        if dato not in (None, ""):
+                            partes.append(f", {titulos[col]}: {dato}")
 
-                    texto += "\n"
+                    partes.append("\n")
 
-                texto += "\n"
+                partes.append("\n")
         else:
             # Mostrar solo las columnas más relevantes
             columnas_mostrar = ["nombre_completo"]
-            for col in df.columns:
+            for col in columnas:
                 if col != "nombre_completo" and col != "id":
                     columnas_mostrar.append(col)
 
             # Limitar a 4 columnas para no saturar
             columnas_mostrar = columnas_mostrar[:4]
+            titulos = {col: col.replace('_', ' ').title() for col in columnas_mostrar}
 
             # Crear tabla
-            for i, fila in df.iterrows():
-                texto += f"{i+1}. {fila['nombre_completo']}"
+            for i, fila in registros:
+                partes.append(f"{i+1}. {valor(fila, 'nombre_completo')}")
 
                 # Añadir información adicional
                 for col in columnas_mostrar[1:]:
-                    if col in fila and pd.notna(fila[col]) and fila[col] != "":
-                        texto += f", {col.replace('_', ' ').title()}: {fila[col]}"
+                    dato = valor(fila, col)
+                    if dato not in (None, ""):
+                        partes.append(f", {titulos[col]}: {dato}")
 
-                texto += "\n"
+                partes.append("\n")
 
-    return texto
+    return "".join(partes)
@@ -13,7 +13,7 @@ import argparse
 import json
 import logging
 from colorama import init, Fore, Style
-from helpers.llm_search import procesar_consulta_completa
+from helpers.llm_search import procesar_consulta_completa, filas_a_registros
 from helpers.error_handler import ErrorHandler, LLMError, SQLError, ConsultaError, DatosError
 from helpers.logger import Logger, log_consulta, log_respuesta, log_metrica, log_error
 from helpers.semantic_cache import semantic_cache
@@ -27,7 +27,7 @@ init()
 limpiar_cache_normalizacion()
 
 # Limpiar caché semántico
-semantic_cache.cache = {}
+semantic_cache.cache.clear()
 
 # Mostrar mensaje de limpieza de caché
 print(f"{Fore.GREEN}✅ Caché de normalización y caché semántico limpiados para aplicar nuevos cambios{Style.RESET_ALL}")
@@ -105,7 +105,7 @@ def ejecutar_consulta(consulta, contexto=None, mostrar_tiempos=False, escenario=
 
         # Extraer componentes del resultado
         estrategia = resultado_procesamiento.get("estrategia", {})
-        resultado_sql = resultado_procesamiento.get("resultado_sql", {"total": 0, "registros": []})
+        resultado_sql = resultado_procesamiento.get("resultado_sql", {"total": 0, "columnas": [], "filas": []})
         respuesta_texto = resultado_procesamiento["respuesta"]
         error = resultado_procesamiento.get("error")
 
@@ -150,7 +150,7 @@ def ejecutar_consulta(consulta, contexto=None, mostrar_tiempos=False, escenario=
         contexto_siguiente = {
             "consulta_anterior": consulta,
             "estrategia_anterior": estrategia,
-            "resultados_anteriores": resultado_sql.get("registros", []) if resultado_sql.get("total", 0) > 0 else [],
+            "resultados_anteriores": filas_a_registros(resultado_sql),
             "respuesta_anterior": respuesta_texto,
             "historial_consultas": contexto.get("historial_consultas", []) + [consulta] if contexto else [consulta],
             "historial_respuestas": contexto.get("historial_respuestas", []) + [respuesta_texto] if contexto else [respuesta_texto]